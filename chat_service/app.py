@@ -7,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from interface.routes import router as chat_router
 from interface.ws import router as ws_router
+from interface.admin import router as admin_router
 
 load_dotenv()
 
@@ -31,3 +32,4 @@ app.add_middleware(
 
 app.include_router(chat_router, prefix="/chat")
 app.include_router(ws_router)
+app.include_router(admin_router, prefix="/admin")
@@ -0,0 +1,16 @@
+# config.py - chat_service settings, overridable through the environment
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# drain mode (POST /admin/drain): clients are told to reconnect to
+# DRAIN_RECONNECT_URL (e.g. ws://chat-2:8003; unset = the same address, for a load
+# balancer to route elsewhere), and whoever is still connected after DRAIN_DEADLINE
+# seconds is closed with 1012
+DRAIN_DEADLINE = float(os.getenv("CHAT_DRAIN_DEADLINE", "30.0"))
+DRAIN_RECONNECT_URL = os.getenv("CHAT_DRAIN_RECONNECT_URL")
+
+# required in the X-Admin-Token header of /admin/* requests; while unset every admin
+# request is refused
+ADMIN_TOKEN = os.getenv("CHAT_ADMIN_TOKEN")
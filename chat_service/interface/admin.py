@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+
+from config import ADMIN_TOKEN, DRAIN_DEADLINE, DRAIN_RECONNECT_URL
+from interface.ws import count_connections, drain
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    # fail closed: without a configured token nobody gets in
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+class DrainInput(BaseModel):
+    url: str | None = None
+    deadline: float | None = None
+
+
+def drain_status() -> dict:
+    return {
+        "draining": drain.active,
+        "done": drain.done,
+        "url": drain.url,
+        "connections": count_connections(),
+        "in_flight": drain.in_flight,
+        "closed": drain.closed,
+    }
+
+
+@router.post("/drain", status_code=202)
+async def start_drain(body: DrainInput | None = None):
+    body = body or DrainInput()
+    deadline = body.deadline if body.deadline is not None else DRAIN_DEADLINE
+    if not drain.start(body.url or DRAIN_RECONNECT_URL, deadline):
+        raise HTTPException(status_code=409, detail="already draining")
+    return drain_status()
+
+
+@router.get("/drain")
+async def get_drain():
+    return drain_status()
+
+
+@router.delete("/drain")
+async def cancel_drain():
+    """Leave drain mode, e.g. after an aborted restart."""
+    if not drain.cancel():
+        raise HTTPException(status_code=409, detail="not draining")
+    return drain_status()
@@ -1,3 +1,6 @@
+import asyncio
+import logging
+
 from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, Depends
 from application.use_cases.send_message import SendMessageUseCase
 from application.use_cases.get_or_create_chat import GetOrCreateChatUseCase
@@ -11,11 +14,93 @@ from infrastructure.repositories.sqlalchemy_message import (
 )
 from infrastructure.db_session import get_db
 
+logger = logging.getLogger(__name__)
+
 connections: dict[int, set[WebSocket]] = {}
 
+# "service restart", for sockets still open when a drain reaches its deadline
+RESTART_CLOSE_CODE = 1012
+
+
+class Drain:
+    """Drain mode state (see interface/admin.py): refuse new sockets, move the rest."""
+
+    def __init__(self):
+        self.active = False
+        self.done = False
+        self.url: str | None = None
+        # broadcasts currently being written, waited for before closing sockets
+        self.in_flight = 0
+        self.closed = 0
+        self.task: asyncio.Task | None = None
+
+    def hint(self) -> dict:
+        return {"type": "reconnect", "url": self.url}
+
+    def start(self, url: str | None, deadline: float) -> bool:
+        """Enter drain mode. Returns False if a drain is already running."""
+        if self.active:
+            return False
+        self.active, self.done, self.url = True, False, url
+        self.task = asyncio.create_task(drain_connections(url, deadline))
+        logger.warning(f"draining chat sockets: {count_connections()}, {deadline}s deadline")
+        return True
+
+    def cancel(self) -> bool:
+        """Accept sockets again; clients already told to move keep moving."""
+        if not self.active:
+            return False
+        self.active = False
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        logger.warning("drain cancelled")
+        return True
+
+
+drain = Drain()
+
+
+def count_connections() -> int:
+    return sum(len(sockets) for sockets in connections.values())
+
 router = APIRouter()
 
 
+async def drain_connections(url: str | None, deadline: float, poll: float = 0.1) -> None:
+    """Tell every chat socket to reconnect elsewhere, then close what's left.
+
+    Waits until the clients are gone or `deadline` seconds pass, and for in-flight
+    broadcasts to finish (at most 5 more seconds) before closing with 1012. Started
+    by Drain.start; Drain.cancel stops it and accepts sockets again.
+    """
+    for sockets in list(connections.values()):
+        for ws in list(sockets):
+            try:
+                await ws.send_json(drain.hint())
+            except Exception as e:
+                logger.warning(f"failed to send the reconnect hint: {e}")
+
+    loop = asyncio.get_running_loop()
+    until = loop.time() + deadline
+    while any(connections.values()) and loop.time() < until:
+        await asyncio.sleep(poll)
+    until = loop.time() + 5.0
+    while drain.in_flight and loop.time() < until:
+        await asyncio.sleep(poll / 10)
+
+    for sockets in list(connections.values()):
+        for ws in list(sockets):
+            drain.closed += 1
+            try:
+                await ws.close(code=RESTART_CLOSE_CODE)
+            except Exception as e:
+                logger.warning(f"failed to close a socket at the drain deadline: {e}")
+            sockets.discard(ws)
+    drain.done = True
+    logger.warning(f"drain done: {drain.closed} closed")
+
+
 @router.websocket("/ws/chat/{chat_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -25,6 +110,12 @@ async def websocket_endpoint(
 ):
     await websocket.accept()
 
+    # draining for a restart: point the client at another instance instead
+    if drain.active:
+        await websocket.send_json(drain.hint())
+        await websocket.close(code=RESTART_CLOSE_CODE)
+        return
+
     chat_id = int(chat_id)
     connections.setdefault(chat_id, set()).add(websocket)
 
@@ -39,14 +130,18 @@ async def websocket_endpoint(
             message = await use_case.execute(chat_id, user_id, content)
 
             # Broadcast to everyone in the chat
-            for conn in connections[chat_id]:
-                await conn.send_json(
-                    {
-                        "id": message.id,
-                        "sender_id": message.sender_id,
-                        "content": message.content,
-                        "timestamp": message.timestamp.isoformat(),
-                    }
-                )
+            drain.in_flight += 1
+            try:
+                for conn in list(connections[chat_id]):
+                    await conn.send_json(
+                        {
+                            "id": message.id,
+                            "sender_id": message.sender_id,
+                            "content": message.content,
+                            "timestamp": message.timestamp.isoformat(),
+                        }
+                    )
+            finally:
+                drain.in_flight -= 1
     except WebSocketDisconnect:
-        connections[chat_id].remove(websocket)
+        connections[chat_id].discard(websocket)
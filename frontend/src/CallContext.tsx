@@ -15,11 +15,20 @@ export type IncomingCall = {
   callId: string;
 };
 
+// the user's notification socket (/ws/notifications/{user_id}), shared by the
+// incoming-call listener and whoever sends invites
+export type NotificationChannel = {
+  send: (message: object) => boolean;
+  subscribe: (listener: (message: any) => void) => () => void;
+};
+
 type AppContextType = {
   incomingCall: IncomingCall | null;
   setIncomingCall: Dispatch<SetStateAction<IncomingCall | null>>;
   modalHandlers: { accept: () => void, decline: () => void } | null
   setModalHandlers: Dispatch<SetStateAction<{ accept: () => void, decline: () => void } | null>>
+  notifications: NotificationChannel | null;
+  setNotifications: Dispatch<SetStateAction<NotificationChannel | null>>;
 };
 
 const CallContext = createContext<AppContextType | undefined>(undefined);
@@ -27,9 +36,10 @@ const CallContext = createContext<AppContextType | undefined>(undefined);
 export const CallProvider = ({ children }: { children: ReactNode }) => {
     const [incomingCall, setIncomingCall] = useState<IncomingCall | null>(null)
     const [modalHandlers, setModalHandlers] = useState<{ accept: () => void, decline: () => void } | null>(null)
+    const [notifications, setNotifications] = useState<NotificationChannel | null>(null)
   
     return (
-      <CallContext.Provider value={{ incomingCall, setIncomingCall, modalHandlers, setModalHandlers }}>
+      <CallContext.Provider value={{ incomingCall, setIncomingCall, modalHandlers, setModalHandlers, notifications, setNotifications }}>
         {children}
         {incomingCall && modalHandlers && (
           <IncomingCallModal
@@ -27,6 +27,7 @@ export const ChatComponent = ({ chatId }: ChatProps) => {
   const retryCount = useRef(0);
   const maxRetries = 5;
   const connectionLock = useRef(false);
+  const chatUrl = useRef("ws://localhost:8003");
 
   // WebSocket connection management
   useEffect(() => {
@@ -50,7 +51,7 @@ export const ChatComponent = ({ chatId }: ChatProps) => {
       if (!isMounted) return;
   
       setConnectionError(null);
-      const socketUrl = `ws://localhost:8003/ws/chat/${chatId}?user_id=${user.id}`;
+      const socketUrl = `${chatUrl.current}/ws/chat/${chatId}?user_id=${user.id}`;
       const socket = new WebSocket(socketUrl);
   
       socket.onopen = () => {
@@ -68,6 +69,17 @@ export const ChatComponent = ({ chatId }: ChatProps) => {
       socket.onmessage = (event) => {
         if (!isMounted) return;
         const msg = JSON.parse(event.data);
+        if (msg.type === "reconnect") {
+          // chat service instance is draining: move to the one it points at
+          if (msg.url) chatUrl.current = msg.url;
+          socket.onclose = null;
+          socket.close();
+          setIsConnected(false);
+          reconnectTimeoutId = setTimeout(() => {
+            if (isMounted) connectWebSocket();
+          }, 500);
+          return;
+        }
         setMessages((prev) => [...prev, msg]);
       };
   
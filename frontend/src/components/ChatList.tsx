@@ -2,6 +2,7 @@
 
 "use client";
 import { useAuth } from "@/AuthContext";
+import { useCallContext } from "@/CallContext";
 import { useEffect, useState } from "react";
 import { api } from "@/api";
 import { Chat } from "@/types";
@@ -15,6 +16,7 @@ type Props = {
 
 export const ChatsList = ({ onSelectChat, selectedChat }: Props) => {
   const { user } = useAuth();
+  const { notifications } = useCallContext();
   const [chats, setChats] = useState<Chat[]>([]);
   const [pendingCalls, setPendingCalls] = useState<Record<number, boolean>>({});
 
@@ -27,68 +29,52 @@ export const ChatsList = ({ onSelectChat, selectedChat }: Props) => {
 
   const sendCallInvite = async (chatId: number) => {
     if (!user) return;
-    
-    setPendingCalls(prev => ({ ...prev, [chatId]: true }));
-    
+    if (!notifications) {
+      alert("Not connected, try again in a moment");
+      return;
+    }
+
     const myId = Number(user.id);
-    const ws = new WebSocket(`ws://localhost:8000/ws/signaling/${chatId}/${myId}`);
-    
-    ws.addEventListener("open", () => {
-      try {
-        const msg = {
-          type: "call-invite",
-          callId: String(chatId),
-          from: myId,
-        };
-        ws.send(JSON.stringify(msg));
-        
-        // Wait for response with timeout
-        const responseHandler = (event: MessageEvent) => {
-          try {
-            const message = JSON.parse(event.data);
-            
-            if (message.type === "call-accept" && message.from !== myId) {
-              // Call accepted - open call window
-              window.open(`/video/call/${chatId}`, "_blank", "noopener,noreferrer");
-              ws.removeEventListener("message", responseHandler);
-              ws.close();
-              setPendingCalls(prev => ({ ...prev, [chatId]: false }));
-            } else if (message.type === "call-decline" && message.from !== myId) {
-              // Call declined - show notification
-              alert("Call was declined");
-              ws.removeEventListener("message", responseHandler);
-              ws.close();
-              setPendingCalls(prev => ({ ...prev, [chatId]: false }));
-            }
-          } catch (error) {
-            console.error("Error parsing response:", error);
-          }
-        };
-        
-        ws.addEventListener("message", responseHandler);
-        
-        // Timeout after 30 seconds
-        setTimeout(() => {
-          ws.removeEventListener("message", responseHandler);
-          if (ws.readyState === WebSocket.OPEN) {
-            ws.close();
-          }
-          setPendingCalls(prev => ({ ...prev, [chatId]: false }));
-          alert("No response from user");
-        }, 30000);
-        
-      } catch (err) {
-        console.error("Failed to send call-invite:", err);
-        try { ws.close(); } catch {}
-        setPendingCalls(prev => ({ ...prev, [chatId]: false }));
+    const callId = String(chatId);
+    const chat = chats.find(c => c.id === chatId);
+    const targets = (chat?.members ?? [])
+      .map(m => m.user.id)
+      .filter(id => id !== myId);
+
+    setPendingCalls(prev => ({ ...prev, [chatId]: true }));
+
+    // answers come back on the same notification socket
+    let timeout: ReturnType<typeof setTimeout> | null = null;
+    const unsubscribe = notifications.subscribe((message) => {
+      if (message.callId !== callId || message.from === myId) return;
+      if (message.type === "call-accept") {
+        // Call accepted - open call window
+        window.open(`/video/call/${chatId}`, "_blank", "noopener,noreferrer");
+      } else if (message.type === "call-decline") {
+        // Call declined - show notification
+        alert("Call was declined");
+      } else {
+        return;
       }
+      finish();
     });
-    
-    ws.addEventListener("error", (error) => {
-      console.error("Signaling WS error:", error);
-      try { ws.close(); } catch {}
+    const finish = () => {
+      unsubscribe();
+      if (timeout) clearTimeout(timeout);
       setPendingCalls(prev => ({ ...prev, [chatId]: false }));
-    });
+    };
+
+    if (!notifications.send({ type: "call-invite", callId, targets })) {
+      console.error("Failed to send call-invite: notification socket not open");
+      finish();
+      return;
+    }
+
+    // Timeout after 30 seconds
+    timeout = setTimeout(() => {
+      finish();
+      alert("No response from user");
+    }, 30000);
   };
 
   const handleStartCall = (chatId: number) => {
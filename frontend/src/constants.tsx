@@ -1,5 +1,7 @@
 export const apiUrl: string = "http://localhost:8002";
 
+export const SIGNALING_URL: string = "ws://127.0.0.1:8000";
+
 
 export const STUN_SERVERS: RTCIceServer[] = [
     { urls: 'stun:stun.l.google.com:19302' },
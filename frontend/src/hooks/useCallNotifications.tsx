@@ -2,136 +2,121 @@
 
 import { useAuth } from "@/AuthContext";
 import { useCallContext } from "@/CallContext";
-import { useEffect, useRef, useState } from "react";
-import { api } from "@/api";
+import { SIGNALING_URL } from "@/constants";
+import { useEffect, useRef } from "react";
 
+const RECONNECT_DELAY_MS = 2000;
+
+// One notification socket per user (per tab) instead of a signaling socket per chat:
+// the server routes call-invite / call-accept / call-decline to us by user id.
 export const useCallNotifications = () => {
   const { user } = useAuth();
-  const { setIncomingCall, setModalHandlers } = useCallContext();
-  const wsConnections = useRef<Record<number, WebSocket>>({});
-  const [hasSetup, setHasSetup] = useState(false);
+  const { setIncomingCall, setModalHandlers, setNotifications } = useCallContext();
+  const wsRef = useRef<WebSocket | null>(null);
+  const listeners = useRef(new Set<(message: any) => void>());
 
   useEffect(() => {
-    if (!user || hasSetup) return;
-
-    // Fetch user's chats using your existing API utility
-    const setupCallListeners = async () => {
-      try {
-        //console.log("Setting up call listeners for user:", user.id);
-        
-        // Use your existing API function instead of fetch
-        const response = await api.getChats({ user_id: user.id });
-        const chats = response.chats || [];
-        
-        //console.log("Found chats:", chats.length);
-        
-        chats.forEach((chat: any) => {
-          setupChatWebSocket(chat.id);
-        });
-        
-        setHasSetup(true);
-      } catch (error) {
-        //console.error("Failed to fetch chats:", error);
-        // Set hasSetup to true even on error to prevent infinite retries
-        setHasSetup(true);
-      }
-    };
-
-    setupCallListeners();
-
-    return () => {
-      // Clean up all WebSocket connections
-      Object.values(wsConnections.current).forEach(ws => {
-        try { ws.close(); } catch {}
-      });
-      wsConnections.current = {};
-      // DON'T reset hasSetup here - that causes the infinite loop
-    };
-  }, [user]); // Removed hasSetup from dependencies
-
-  const setupChatWebSocket = (chatId: number) => {
-    if (!user || wsConnections.current[chatId]) {
-      //log("Skipping WebSocket setup for chat", chatId);
-      return;
-    }
+    if (!user) return;
 
     const myId = Number(user.id);
-    //console.log("Setting up WebSocket for chat:", chatId, "user:", myId);
-    
-    try {
-      const ws = new WebSocket(`ws://localhost:8000/ws/signaling/${chatId}/${myId}`);
-
-      ws.addEventListener("open", () => {
-        //console.log(`WebSocket connected for chat ${chatId}`);
-        // Send a join message to register with the server
-        ws.send(JSON.stringify({
-          type: "join",
-          userId: myId,
-          chatId: chatId
-        }));
-      });
+    let closed = false;
+    let retry: ReturnType<typeof setTimeout> | null = null;
+    let baseUrl = SIGNALING_URL;
+
+    const open = () => {
+      const ws = new WebSocket(`${baseUrl}/ws/notifications/${myId}`);
+      wsRef.current = ws;
 
       ws.addEventListener("message", (event) => {
         try {
           const message = JSON.parse(event.data);
-          //console.log("Received message:", message);
-          
+
+          if (message.type === "ping") {
+            ws.send(JSON.stringify({ type: "pong" }));
+            return;
+          }
+
+          if (message.type === "reconnect") {
+            // node is draining: the close handler reopens on the node it points at
+            if (message.url) baseUrl = message.url;
+            ws.close();
+            return;
+          }
+
           if (message.type === "call-invite" && message.from !== myId) {
             console.log("Incoming call detected:", message);
             handleIncomingCall(message.callId, message.from);
           }
+
+          listeners.current.forEach(listener => listener(message));
         } catch (error) {
           //console.error("Error parsing message:", error, "Raw data:", event.data);
         }
       });
 
       ws.addEventListener("error", (error) => {
-        console.error("WebSocket error for chat", chatId, ":", error);
-        // Remove from connections to allow reconnection
-        delete wsConnections.current[chatId];
+        console.error("Notification WS error:", error);
       });
 
-      ws.addEventListener("close", (event) => {
-        //console.log("WebSocket closed for chat", chatId, "code:", event.code);
-        delete wsConnections.current[chatId];
+      ws.addEventListener("close", () => {
+        if (wsRef.current === ws) wsRef.current = null;
+        // server restart / network blip: come back so invites keep arriving
+        if (!closed) retry = setTimeout(open, RECONNECT_DELAY_MS);
       });
+    };
 
-      wsConnections.current[chatId] = ws;
-    } catch (error) {
-      console.error("Failed to create WebSocket for chat", chatId, ":", error);
+    open();
+
+    setNotifications({
+      send: (message: object) => {
+        const ws = wsRef.current;
+        if (!ws || ws.readyState !== WebSocket.OPEN) return false;
+        ws.send(JSON.stringify(message));
+        return true;
+      },
+      subscribe: (listener: (message: any) => void) => {
+        listeners.current.add(listener);
+        return () => { listeners.current.delete(listener); };
+      },
+    });
+
+    return () => {
+      closed = true;
+      if (retry) clearTimeout(retry);
+      setNotifications(null);
+      try { wsRef.current?.close(1000); } catch {}
+      wsRef.current = null;
+    };
+  }, [user]);
+
+  const sendToCaller = (type: "call-accept" | "call-decline", callId: string, fromUserId: number) => {
+    const ws = wsRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type, callId, target: fromUserId }));
     }
   };
 
   const handleIncomingCall = (callId: string, fromUserId: number) => {
     console.log("Handling incoming call:", callId, "from:", fromUserId);
-    
+
     // Set up modal handlers
     setModalHandlers({
       accept: () => acceptCall(callId, fromUserId),
       decline: () => declineCall(callId, fromUserId),
     });
-    
+
     // Show the modal
     setIncomingCall({ from: fromUserId, callId });
   };
 
   const acceptCall = (callId: string, fromUserId: number) => {
-    //console.log("Accepting call:", callId);
-    
     // Notify the caller that we accepted
-    const ws = wsConnections.current[Number(callId)];
-    if (ws && ws.readyState === WebSocket.OPEN) {
-      ws.send(JSON.stringify({
-        type: "call-accept",
-        callId,
-        from: user?.id
-      }));
-    }
-    
+    sendToCaller("call-accept", callId, fromUserId);
+
     // Open the call window with context in URL
     const callUrl = `/video/call/${callId}?accepted=true&from=${fromUserId}`;
     window.open(callUrl, "_blank", "noopener,noreferrer");
-    
+
     // Close the modal
     setIncomingCall(null);
     setModalHandlers(null);
@@ -139,21 +124,12 @@ export const useCallNotifications = () => {
 
   const declineCall = (callId: string, fromUserId: number) => {
     console.log("Declining call:", callId);
-    
+
     // Notify the caller that we declined
-    const ws = wsConnections.current[Number(callId)];
-    if (ws && ws.readyState === WebSocket.OPEN) {
-      ws.send(JSON.stringify({
-        type: "call-decline",
-        callId,
-        from: user?.id
-      }));
-    }
-    
+    sendToCaller("call-decline", callId, fromUserId);
+
     // Close the modal
     setIncomingCall(null);
     setModalHandlers(null);
   };
-
-  return { setupChatWebSocket };
-};
\ No newline at end of file
+};
@@ -1,10 +1,43 @@
 "use client"
-import { STUN_SERVERS } from "@/constants"
+import { SIGNALING_URL, STUN_SERVERS } from "@/constants"
 import { RemoteStream, SignalMessage, User } from "@/types"
 import { useRef, useState, useCallback, useEffect } from "react"
 
 type MediaStreamRef = ReturnType<typeof useRef<MediaStream | null>>
 
+const RESUME_DELAY_MS = 1000
+// sent on the old socket once we're connected to the node a drain sent us to
+const MIGRATED_CLOSE_CODE = 4001
+// the node turned our join away while saturated ("try again later")
+const OVERLOADED_CLOSE_CODE = 1013
+// retransmission / redundancy entries of getCapabilities(), not codecs of their own
+const AUXILIARY_CODECS = ["rtx", "red", "ulpfec", "flexfec-03"]
+
+type CodecOrder = { audio: string[]; video: string[] }
+
+const codecName = (codec: RTCRtpCodec) => codec.mimeType.split("/")[1].toLowerCase()
+
+/** Codecs this browser can send, most preferred first ("opus", "vp9", ...) */
+function localCodecs(kind: "audio" | "video"): string[] {
+  const codecs = RTCRtpSender.getCapabilities?.(kind)?.codecs ?? []
+  return [...new Set(codecs.map(codecName).filter(name => !AUXILIARY_CODECS.includes(name)))]
+}
+
+/** Put the codecs every member of the call has first, so the first offer is one everyone can take */
+function preferCodecs(transceiver: RTCRtpTransceiver, order: CodecOrder) {
+  const kind = transceiver.sender.track?.kind as "audio" | "video" | undefined
+  const shared = kind ? order[kind] : []
+  if (!kind || !shared.length || !transceiver.setCodecPreferences) return
+  const codecs = RTCRtpReceiver.getCapabilities(kind)?.codecs ?? []
+  // shared codecs in the call's order, then rtx/red/fec, then the rest as a fallback
+  const rank = (codec: RTCRtpCodec) => {
+    const index = shared.indexOf(codecName(codec))
+    if (index >= 0) return index
+    return shared.length + (AUXILIARY_CODECS.includes(codecName(codec)) ? 0 : 1)
+  }
+  transceiver.setCodecPreferences([...codecs].sort((a, b) => rank(a) - rank(b)))
+}
+
 export const useCallSession = ({
   currentUser,
   myId,
@@ -27,6 +60,18 @@ export const useCallSession = ({
   const pcs = useRef<Record<number, RTCPeerConnection>>({})
   const senders = useRef<Record<number, { audio?: RTCRtpSender; video?: RTCRtpSender }>>({})
   const ws = useRef<WebSocket | null>(null)
+  // lets a dropped socket reattach to its server-side slot (see signaling "resume")
+  const resumeToken = useRef<string | null>(null)
+  // peer-delta: join version of every peer we know, to tell a rejoin from a repeat
+  const peerVersions = useRef<Record<number, number>>({})
+  // drain mode: node we're on, and whether the current socket took over from a draining one
+  const signalingUrl = useRef(SIGNALING_URL)
+  const migrating = useRef(false)
+  const migrate = useRef<((url: string | null) => void) | null>(null)
+  // seconds an overloaded node asked us to wait before joining again
+  const retryAfter = useRef(0)
+  // codecs every member of the call published (see signaling "capabilities")
+  const codecOrder = useRef<CodecOrder>({ audio: [], video: [] })
 
   const [peers, setPeers] = useState<number[]>([])
   const [remotes, setRemotes] = useState<Record<number, RemoteStream>>({})
@@ -66,6 +111,7 @@ export const useCallSession = ({
         if (track.kind === "audio") senders.current[peerId].audio = sender
         if (track.kind === "video") senders.current[peerId].video = sender
       })
+      pc.getTransceivers().forEach(transceiver => preferCodecs(transceiver, codecOrder.current))
     }
 
     pc.onicecandidate = ev => {
@@ -174,6 +220,20 @@ export const useCallSession = ({
         }
         break
       case "peer-list":
+        resumeToken.current = msg.resumeToken ?? null
+        if (migrating.current) {
+          // same call on another node: keep what still matches (peer-delta reconciles later)
+          if (msg.version !== undefined) break
+          migrating.current = false
+          Object.keys(pcs.current).map(Number).filter(pid => !msg.peers.includes(pid)).forEach(removePeer)
+          for (const pid of msg.peers) {
+            if (pid !== myId && !pcs.current[pid]) await initiateCall(pid)
+          }
+          break
+        }
+        // a fresh session: any peer connections from a session we failed to resume are stale
+        Object.keys(pcs.current).forEach(pid => removePeer(Number(pid)))
+        peerVersions.current = {}
         for (const pid of msg.peers) {
           if (pid !== myId) await initiateCall(pid)
         }
@@ -187,9 +247,53 @@ export const useCallSession = ({
       case "ice-candidate":
         await handleIce(msg.from, msg.candidate)
         break
+      case "ice-candidates":
+        for (const candidate of msg.candidates) await handleIce(msg.from, candidate)
+        break
+      case "peer-delta": {
+        let known = peerVersions.current
+        if (migrating.current && msg.reset) {
+          // join versions are per node; peers we still have connections to are not rejoins
+          migrating.current = false
+          known = Object.fromEntries(
+            msg.added.filter(([pid]) => pcs.current[pid]).map(([pid, version]) => [pid, version])
+          )
+          Object.keys(pcs.current).map(Number).filter(pid => !(pid in known)).forEach(removePeer)
+        }
+        const next: Record<number, number> = msg.reset ? {} : { ...known }
+        for (const pid of msg.removed) delete next[pid]
+        for (const [pid, version] of msg.added) {
+          if (pid !== myId) next[pid] = version
+        }
+        peerVersions.current = next
+        for (const pid of Object.keys(known).map(Number)) {
+          if (!(pid in next) || next[pid] !== known[pid]) removePeer(pid)
+        }
+        for (const pid of Object.keys(next).map(Number)) {
+          if (known[pid] !== next[pid]) await initiateCall(pid)
+        }
+        ws.current?.send(JSON.stringify({ type: "peer-ack", version: msg.version }))
+        break
+      }
+      case "codec-intersection":
+        // applies to peer connections created from now on, existing ones keep their codecs
+        codecOrder.current = { audio: msg.audio, video: msg.video }
+        break
+      case "session-resumed":
+        resumeToken.current = msg.resumeToken
+        break
       case "peer-disconnected":
         removePeer(msg.peerId)
         break
+      case "reconnect":
+        // the node is draining: move to the one it points at without dropping peers
+        migrate.current?.(msg.url)
+        break
+      case "overloaded":
+        // followed by a 1013 close; the close handler retries after the delay
+        retryAfter.current = msg.retryAfter
+        if (msg.url) signalingUrl.current = msg.url
+        break
     }
   }, [myId, initiateCall, handleOffer, handleAnswer, handleIce, removePeer])
 
@@ -198,21 +302,77 @@ export const useCallSession = ({
     if (!myId || !callId) return
     if (ws.current && ws.current.readyState <= 1) return
 
-    ws.current = new WebSocket(`ws://127.0.0.1:8000/ws/signaling/${callId}/${myId}`)
+    const open = (resume?: string, previous?: WebSocket) => {
+      // ice-batch: let the server coalesce trickle ICE into "ice-candidates" frames;
+      // peer-delta: membership as collapsed, versioned deltas instead of new-peer/peer-disconnected;
+      // capabilities: publish our codecs, get the call's common ones before any offer
+      let url = `${signalingUrl.current}/ws/signaling/${callId}/${myId}?features=ice-batch,peer-delta,capabilities`
+      if (resume) url += `&resume=${encodeURIComponent(resume)}`
+      // moving off a draining node: join without peers being told about a "new" peer
+      if (previous) url += "&migrate=1"
+      const socket = new WebSocket(url)
+      if (!previous) ws.current = socket
+
+      socket.onopen = () => {
+        setWsConnected(true)
+        // first message: peers hear about us once the node has our codecs
+        socket.send(JSON.stringify({
+          type: "capabilities",
+          audio: localCodecs("audio"),
+          video: localCodecs("video"),
+        }))
+        if (previous) {
+          // keep talking on the old socket until this one is usable
+          ws.current = socket
+          previous.close(MIGRATED_CLOSE_CODE)
+          return
+        }
+        if (resume) return
+        socket.send(JSON.stringify({
+          type: "join-call",
+          userId: myId,
+          from: myId,
+          userData: {userId: myId, username: currentUser?.username}
+        }))
+      }
+
+      socket.onclose = (ev) => {
+        if (previous && ws.current !== socket) {
+          // the target was draining too (or down): try again shortly
+          migrating.current = false
+          setTimeout(() => migrate.current?.(null), RESUME_DELAY_MS)
+          return
+        }
+        setWsConnected(false)
+        if (ws.current === socket && ev.code === OVERLOADED_CLOSE_CODE) {
+          // spread the retries out so shed clients don't all come back at once
+          const delay = (retryAfter.current || 5) * 1000 * (1 + Math.random())
+          setTimeout(() => {
+            if (ws.current === socket) open()
+          }, delay)
+          return
+        }
+        // dropped rather than closed by us (network switch): reattach within the
+        // server's grace window so peers keep their connections
+        if (ws.current === socket && ev.code !== 1000 && resumeToken.current && !migrating.current) {
+          setTimeout(() => {
+            if (ws.current === socket) open(resumeToken.current ?? undefined)
+          }, RESUME_DELAY_MS)
+        }
+      }
+      socket.onerror = () => setWsConnected(false)
+      socket.onmessage = handleSignal
+    }
 
-    ws.current.onopen = () => {
-      setWsConnected(true)
-      ws.current?.send(JSON.stringify({
-        type: "join-call",
-        userId: myId,
-        from: myId,
-        userData: {userId: myId, username: currentUser?.username}
-      }))
+    migrate.current = (target: string | null) => {
+      const previous = ws.current
+      if (!previous || migrating.current) return
+      if (target) signalingUrl.current = target
+      migrating.current = true
+      open(undefined, previous)
     }
 
-    ws.current.onclose = () => setWsConnected(false)
-    ws.current.onerror = () => setWsConnected(false)
-    ws.current.onmessage = handleSignal
+    open()
   }, [myId, callId, handleSignal, currentUser])
 
   /** Replace tracks when localStream changes */
@@ -265,8 +425,12 @@ export const useCallSession = ({
     cameraStream.current?.getTracks().forEach(t => t.stop()); cameraStream.current = null
     screenStream.current?.getTracks().forEach(t => t.stop()); screenStream.current = null
     localStream.current?.getTracks().forEach(t => t.stop()); localStream.current = null
-    ws.current?.close()
+    const socket = ws.current
     ws.current = null
+    resumeToken.current = null
+    migrate.current = null
+    migrating.current = false
+    socket?.close(1000)
 
     setWsConnected(false)
     setPeers([])
@@ -49,11 +49,21 @@ export type SignalMessage =
   | { type: 'join-call'; userId: number; from:
     number, userData?: { userId: number;username?: string;}}
   | { type: 'new-peer'; peerId: number; from: number, userData?: {userId: number;username?: string;} }
-  | { type: 'peer-list'; peers: number[]; from: number }
+  | { type: 'peer-list'; peers: number[]; version?: number; resumeToken?: string; from: number }
+  // ?features=peer-delta: membership since `base`, added as [peerId, joinVersion]
+  | { type: 'peer-delta'; base: number; version: number; reset: boolean; added: [number, number][]; removed: number[]; from: string }
+  | { type: 'session-resumed'; peers: number[]; resumeToken: string; from: number }
+  // ?features=capabilities: codecs every member published, in the call's preference order
+  | { type: 'codec-intersection'; audio: string[]; video: string[]; publishers: number; version: number; from: string }
+  // the node is draining: reconnect to `url` (null: same address) with ?migrate=1
+  | { type: 'reconnect'; url: string | null; from: string }
+  // the node is saturated: join again after `retryAfter` seconds (at `url` if given)
+  | { type: 'overloaded'; reason: string; retryAfter: number; url: string | null; from: string }
   | { type: 'offer'; sdp: string; target: number; from: number, userData: User}
   | { type: 'answer'; sdp: string; target: number; from: number, userData?: {userId: number; username?: string}}
   | { type: 'ice-candidate'; candidate: RTCIceCandidateInit; 
    target: number; from: number,  userData?: {userId: number;username?: string;}}
+  | { type: 'ice-candidates'; candidates: RTCIceCandidateInit[]; target: number; from: number }
   | { type: 'peer-disconnected'; peerId: number; from: number }
   | { type: 'call-invite'; callId: string; from: number }
   | { type: 'call-accept'; callId: string; from: number }  
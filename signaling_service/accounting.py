@@ -0,0 +1,120 @@
+# accounting.py - approximate memory footprint of calls and connections
+#
+# Estimates, not measurements: sys.getsizeof of the objects a call keeps alive
+# (connection, queues, queued frames, zlib context, membership log, rate-limit
+# buckets), cheap enough to walk every call on a scrape or an admin request.
+# A frame shared by several connections of a call is counted once per call.
+import sys
+import time
+from typing import Dict, Optional, Set
+
+from codec import Frame
+from outbound import EMPTY_LANE, PeerConnection
+
+# one (version, user, joined) entry of a MembershipLog, tuple plus its ints
+_MEMBERSHIP_ENTRY_BYTES = sys.getsizeof((0, 0, False)) + 2 * sys.getsizeof(1 << 20)
+# one flight recorder event: a 6-tuple, its float and two ints (strings are interned)
+_FLIGHT_EVENT_BYTES = (
+    sys.getsizeof((0.0, "", "", 0, 0, 0)) + sys.getsizeof(0.0) + 2 * sys.getsizeof(1 << 20)
+)
+
+
+def frame_bytes(frame: Frame) -> int:
+    """The frame object plus its encodings, or a shallow size of the dict if unencoded."""
+    size = sys.getsizeof(frame)
+    encoded = frame._encoded
+    if encoded:
+        return size + sum(sys.getsizeof(payload) for payload in encoded.values())
+    message = frame.message
+    return (
+        size
+        + sys.getsizeof(message)
+        + sum(sys.getsizeof(value) for value in message.values())
+    )
+
+
+def connection_bytes(connection: PeerConnection, seen: Optional[Set[int]] = None) -> int:
+    """Bytes held by one connection: the object, its queues and its deflate context.
+
+    Pass the same `seen` set for every connection of a call to count shared frames
+    (broadcasts) once.
+    """
+    size = sys.getsizeof(connection)
+    for lane in (connection.control, connection.data):
+        if lane is EMPTY_LANE:
+            # shared by every idle connection
+            continue
+        size += sys.getsizeof(lane)
+        for frame in lane:
+            if seen is not None:
+                if id(frame) in seen:
+                    continue
+                seen.add(id(frame))
+            size += frame_bytes(frame)
+    if connection.deflate_context is not None:
+        size += connection.deflater.policy.context_bytes
+    return size
+
+
+def call_footprint(manager, call_id: str, now: Optional[float] = None) -> Dict:
+    """Size, age and activity of one call on this node."""
+    now = time.monotonic() if now is None else now
+    peers = manager.active_calls.get(call_id, {})
+    seen: Set[int] = set()
+    connections = sum(connection_bytes(c, seen) for c in peers.values())
+    size = connections + sys.getsizeof(peers)
+
+    log = manager.memberships.get(call_id)
+    if log is not None:
+        size += (
+            sys.getsizeof(log.members)
+            + sys.getsizeof(log.entries)
+            + len(log.entries) * _MEMBERSHIP_ENTRY_BYTES
+        )
+    buckets = manager.call_limits.get(call_id)
+    if buckets is not None:
+        size += sys.getsizeof(buckets.buckets) + sum(
+            sys.getsizeof(bucket) for bucket in buckets.buckets.values()
+        )
+    remote = manager.remote_peers.get(call_id)
+    if remote:
+        size += sys.getsizeof(remote)
+    recorder = manager.recorders.get(call_id)
+    if recorder is not None:
+        size += sys.getsizeof(recorder.events) + len(recorder.events) * _FLIGHT_EVENT_BYTES
+    capabilities = manager.capabilities.get(call_id)
+    if capabilities is not None:
+        size += sys.getsizeof(capabilities.members) + sys.getsizeof(capabilities.offered)
+    stats = manager.call_stats.get(call_id)
+
+    started = manager.call_started.get(call_id, now)
+    last_seen = max((c.last_seen for c in peers.values()), default=started)
+    return {
+        "callId": call_id,
+        "peers": len(peers),
+        "remotePeers": len(remote or ()),
+        "parked": sum(1 for c in peers.values() if c.parked is not None),
+        "queued": sum(len(c.control) + len(c.data) for c in peers.values()),
+        "membershipEntries": len(log.entries) if log is not None else 0,
+        "codecPublishers": len(capabilities.members) if capabilities is not None else 0,
+        "renegotiations": stats.renegotiations if stats is not None else 0,
+        "bytes": size,
+        "connectionBytes": connections,
+        "age_s": round(now - started, 3),
+        "idle_s": round(now - last_seen, 3),
+    }
+
+
+def connection_footprint(connection: PeerConnection, now: Optional[float] = None) -> Dict:
+    now = time.monotonic() if now is None else now
+    return {
+        "userId": connection.user_id,
+        "bytes": connection_bytes(connection),
+        "queue": connection.queue_depth,
+        "dropped": connection.dropped,
+        "features": sorted(connection.features),
+        "codec": connection.codec.name,
+        "deflate": connection.deflate_context is not None,
+        "parked": connection.parked is not None,
+        "idle_s": round(now - connection.last_seen, 3),
+    }
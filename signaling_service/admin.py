@@ -0,0 +1,126 @@
+# admin.py - operator endpoints of a signaling node
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from pydantic import BaseModel
+
+from accounting import call_footprint, connection_footprint
+from config import ADMIN_TOKEN, DRAIN_DEADLINE, DRAIN_RECONNECT_URL
+from signaling import drain, manager, shedder
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    # fail closed: without a configured token nobody gets in
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+class DrainInput(BaseModel):
+    # where clients should reconnect, e.g. ws://signaling-2:8000
+    url: Optional[str] = None
+    # seconds before the remaining connections are closed
+    deadline: Optional[float] = None
+
+
+@router.post("/drain", status_code=202)
+async def start_drain(body: Optional[DrainInput] = None):
+    """Stop accepting calls and move clients elsewhere before a restart."""
+    body = body or DrainInput()
+    url = body.url or DRAIN_RECONNECT_URL
+    if not drain.start(url, body.deadline if body.deadline is not None else DRAIN_DEADLINE):
+        raise HTTPException(status_code=409, detail="already draining")
+    return drain.status()
+
+
+@router.get("/drain")
+async def drain_status():
+    """Progress of the drain: connections left, queued frames, migrated/closed counts."""
+    return drain.status()
+
+
+@router.delete("/drain")
+async def cancel_drain():
+    if not drain.cancel():
+        raise HTTPException(status_code=409, detail="not draining")
+    return drain.status()
+
+
+@router.get("/calls")
+async def list_calls(limit: int = Query(default=20, ge=1, le=1000)):
+    """Node totals plus the largest and the oldest calls, for spotting leaks."""
+    now = time.monotonic()
+    calls = [call_footprint(manager, call_id, now) for call_id in list(manager.active_calls)]
+    return {
+        "calls": len(calls),
+        "connections": sum(c["peers"] for c in calls),
+        "bytes": sum(c["bytes"] for c in calls),
+        "sessions": len(manager.sessions),
+        # per-call state kept for calls without local peers should stay at 0
+        "orphans": {
+            "stats": sum(1 for c in manager.call_stats if c not in manager.active_calls),
+            "limits": sum(1 for c in manager.call_limits if c not in manager.active_calls),
+            "memberships": sum(
+                1 for c in manager.memberships if c not in manager.active_calls
+            ),
+            "capabilities": sum(
+                1 for c in manager.capabilities if c not in manager.active_calls
+            ),
+        },
+        "largest": sorted(calls, key=lambda c: c["bytes"], reverse=True)[:limit],
+        "oldest": sorted(calls, key=lambda c: c["age_s"], reverse=True)[:limit],
+        "idlest": sorted(calls, key=lambda c: c["idle_s"], reverse=True)[:limit],
+        "reaper": manager.reaper.status(),
+    }
+
+
+@router.get("/calls/{call_id}")
+async def call_detail(call_id: str):
+    """Footprint of one call and each of its local connections."""
+    peers = manager.active_calls.get(call_id)
+    if not peers:
+        raise HTTPException(status_code=404, detail="no local peers in this call")
+    now = time.monotonic()
+    detail = call_footprint(manager, call_id, now)
+    detail["connections"] = [connection_footprint(c, now) for c in peers.values()]
+    return detail
+
+
+@router.post("/calls/reap")
+async def reap_calls():
+    """Run an idle-call sweep now instead of waiting for the next one."""
+    if not manager.reaper.enabled:
+        raise HTTPException(status_code=409, detail="idle call reaping is disabled")
+    reaped = await manager.reaper.sweep()
+    return {"reaped": reaped, **manager.reaper.status()}
+
+
+@router.get("/calls/{call_id}/flight")
+async def call_flight(call_id: str):
+    """The call's flight recording: its last events, oldest first, without payloads."""
+    dump = manager.flight_dump(call_id)
+    if dump is None:
+        raise HTTPException(status_code=404, detail="no recording for this call")
+    return dump
+
+
+@router.get("/flight")
+async def flight_captures(limit: int = Query(default=10, ge=1, le=1000)):
+    """Recordings of the most recent calls that ended with errors, newest first."""
+    captures = list(manager.flight_captures)[::-1][:limit]
+    return {"captured": len(manager.flight_captures), "calls": captures}
+
+
+@router.get("/load")
+async def load_status():
+    """Admission control: loop lag, queued frames, whether new joins are being shed."""
+    return shedder.status()
+
+
+@router.get("/snapshot")
+async def snapshot_status():
+    """Registry snapshot: file size in lines, writes, and what the last start restored."""
+    return manager.snapshot.status()
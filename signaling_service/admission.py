@@ -0,0 +1,170 @@
+# admission.py - turn new calls away while the node is saturated
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import WebSocket
+
+import metrics
+from codec import JSON, Codec
+
+logger = logging.getLogger(__name__)
+
+# "try again later": what a shed join is closed with
+OVERLOADED_CLOSE_CODE = 1013
+
+# event loop lag samples, seconds
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    # shed new joins while the smoothed event loop lag is above this many seconds;
+    # 0 ignores lag
+    max_lag: float = 0.1
+    # ... or while this many frames wait in outbound queues node-wide; 0 ignores them
+    max_queued: int = 20000
+    # seconds a shed client is told to wait before trying again
+    retry_after: float = 5.0
+    # where shed clients should try instead (None: retry here, or let the load
+    # balancer pick another node while /ready reports the overload)
+    redirect_url: Optional[str] = None
+    # lag probe period; queues are summed every queue_every probes
+    interval: float = 0.05
+    queue_every: int = 10
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_lag > 0 or self.max_queued > 0
+
+
+class LoadShedder:
+    """Admission control for new joins, driven by event loop lag and queue depth.
+
+    A probe task sleeps `interval` and measures how late it wakes up: everything
+    the loop does (relaying, writers, heartbeats) shows up as lag before it shows
+    up as latency in calls. The lag is smoothed with a fast attack (a spike counts
+    at once) and a slow decay. Past max_lag, or past max_queued outbound frames,
+    the node sheds fresh joins with OVERLOADED_CLOSE_CODE until both fall below
+    half their threshold. Resumes and migrations are members of calls already
+    here and are always admitted.
+    """
+
+    def __init__(self, manager, policy: Optional[AdmissionPolicy] = None):
+        self.manager = manager
+        self.policy = policy or AdmissionPolicy()
+        self.lag = 0.0
+        self.queued = 0
+        self.shedding: Optional[str] = None
+        self.since = 0.0
+        self.admitted = 0
+        self.shed: Counter = Counter()
+        self.lag_samples = metrics.EventHistogram(LOOP_LAG_BUCKETS)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start probing unless disabled or already running; cheap to call per join."""
+        if self.policy.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._probe())
+
+    def admit(self) -> Optional[str]:
+        """None to let a join in, else why it is shed ("lag" or "queue")."""
+        reason = self.shedding
+        if reason is None:
+            self.admitted += 1
+        else:
+            self.shed[reason] += 1
+        return reason
+
+    def retry_after(self) -> int:
+        return max(1, round(self.policy.retry_after))
+
+    def status(self) -> dict:
+        policy = self.policy
+        return {
+            "shedding": self.shedding,
+            "shedding_s": round(time.monotonic() - self.since, 3) if self.shedding else 0.0,
+            "lag_ms": round(self.lag * 1000, 3),
+            "queued": self.queued,
+            "max_lag_ms": policy.max_lag * 1000,
+            "max_queued": policy.max_queued,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+    async def refuse(
+        self,
+        websocket: WebSocket,
+        reason: str,
+        codec: Codec = JSON,
+        subprotocol: Optional[str] = None,
+    ) -> None:
+        """Turn a join away: an "overloaded" hint, then a 1013 close with the retry delay."""
+        retry_after = self.retry_after()
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+            payload = codec.encode(
+                {
+                    "type": "overloaded",
+                    "reason": reason,
+                    "retryAfter": retry_after,
+                    "url": self.policy.redirect_url,
+                    "from": "system",
+                }
+            )
+            if codec.binary:
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+            await websocket.close(
+                code=OVERLOADED_CLOSE_CODE, reason=f"retry after {retry_after}s"
+            )
+        except Exception as e:
+            logger.debug(f"refusing socket under load: {e}")
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        ticks = 0
+        while True:
+            # read per tick so a policy swapped at runtime takes effect
+            policy = self.policy
+            started = loop.time()
+            await asyncio.sleep(policy.interval)
+            lag = max(0.0, loop.time() - started - policy.interval)
+            self.lag_samples.observe(lag)
+            # fast attack, slow decay
+            self.lag = lag if lag > self.lag else self.lag * 0.9 + lag * 0.1
+            ticks += 1
+            if policy.max_queued > 0 and ticks % policy.queue_every == 0:
+                self.queued = sum(
+                    len(c.control) + len(c.data)
+                    for call in self.manager.active_calls.values()
+                    for c in call.values()
+                )
+            self._decide()
+
+    def _decide(self) -> None:
+        policy = self.policy
+        lagging = policy.max_lag > 0 and self.lag > policy.max_lag
+        backlogged = policy.max_queued > 0 and self.queued > policy.max_queued
+        if self.shedding is None:
+            if lagging or backlogged:
+                self.shedding = "lag" if lagging else "queue"
+                self.since = time.monotonic()
+                logger.warning(
+                    f"shedding new joins: loop lag {self.lag * 1000:.1f}ms, "
+                    f"{self.queued} frames queued"
+                )
+        elif (policy.max_lag <= 0 or self.lag < policy.max_lag / 2) and (
+            policy.max_queued <= 0 or self.queued < policy.max_queued / 2
+        ):
+            logger.warning(
+                f"admitting joins again after {time.monotonic() - self.since:.1f}s"
+            )
+            self.shedding = None
+        elif lagging or backlogged:
+            # report whichever is the problem now
+            self.shedding = "lag" if lagging else "queue"
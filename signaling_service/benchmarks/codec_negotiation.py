@@ -0,0 +1,169 @@
+# codec_negotiation.py - renegotiations in heterogeneous calls, with and without capabilities
+#
+#   cd signaling_service && python -m benchmarks.codec_negotiation --calls 200 --peers 6
+#
+# Virtual clients (loadgen's, talking to main.app in-process) join group calls one
+# after another. Each is a random device class with its own video codecs in its own
+# preference order (e.g. a hardware-only phone that can just do H264) and offers
+# a single codec, the way a client that pins one encoder does. Peers already in the
+# call offer to every newcomer; an answerer that can't decode the offered codec
+# rejects it with the codecs it has, and the offerer renegotiates with a common one.
+#
+#   off   clients offer their own first choice
+#   on    clients negotiate ?features=capabilities, publish their codecs on join and
+#         offer the first codec of the pushed codec-intersection they can encode
+#
+# Reported per mode: offers, renegotiations (the node's own counter) per call,
+# codec-intersection frames and the time until every pair agreed on a codec.
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.common import admit_everyone, emit
+from benchmarks.loadgen import Recorder, VirtualPeer
+
+# video codecs per device class, most preferred first; every class can do H264
+DEVICE_CLASSES: Dict[str, List[str]] = {
+    "chrome": ["vp9", "vp8", "h264", "av1"],
+    "chrome-av1": ["av1", "vp9", "vp8", "h264"],
+    "firefox": ["vp8", "vp9", "h264"],
+    "safari": ["h264", "vp8"],
+    "hardware-phone": ["h264"],
+}
+
+
+class NegotiatingPeer(VirtualPeer):
+    """A client that offers one video codec and rejects offers it can't decode."""
+
+    def __init__(self, *args, codecs: List[str], publish: bool, stats: dict, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.codecs = codecs
+        self.publish = publish
+        self.stats = stats
+        self.intersection: List[str] = []
+
+    async def connect(self) -> None:
+        if self.publish:
+            # first message on the socket, before anything else is read
+            self.inbox.put_nowait({"type": "websocket.connect"})
+            self.send({"type": "capabilities", "video": self.codecs})
+            self.connect_started = time.perf_counter()
+            self.task = asyncio.create_task(self.app(self._scope(), self.inbox.get, self._send))
+            await self.joined.wait()
+        else:
+            await super().connect()
+
+    def _choice(self, acceptable: List[str]) -> str:
+        return next((c for c in self.codecs if c in acceptable), self.codecs[0])
+
+    def _on_message(self, message: dict) -> None:
+        kind = message.get("type")
+        self.recorder.received[kind] += 1
+        if kind == "peer-list":
+            self.joined.set()
+        elif kind == "ping":
+            self.send({"type": "pong"})
+        elif kind == "codec-intersection":
+            self.intersection = message["video"]
+        elif kind == "new-peer":
+            codec = self._choice(self.intersection) if self.intersection else self.codecs[0]
+            self.send({"type": "offer", "sdp": f"video:{codec}", "target": message["peerId"]})
+        elif kind == "offer":
+            codec = message["sdp"].split(":", 1)[1]
+            if codec in self.codecs:
+                self.send({"type": "answer", "sdp": f"video:{codec}", "target": message["from"]})
+            else:
+                self.send(
+                    {
+                        "type": "answer",
+                        "sdp": "reject:" + ",".join(self.codecs),
+                        "target": message["from"],
+                    }
+                )
+        elif kind == "answer":
+            sdp = message["sdp"]
+            if sdp.startswith("reject:"):
+                codec = self._choice(sdp[7:].split(","))
+                self.send({"type": "offer", "sdp": f"video:{codec}", "target": message["from"]})
+            else:
+                self.stats["agreed"] += 1
+
+
+async def _measure(app, manager, publish: bool, args) -> dict:
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    stats = {"agreed": 0}
+    offers, renegotiations = manager.offers, manager.renegotiations
+    sent = manager.intersections_sent
+    mode = "on" if publish else "off"
+    calls = [
+        [
+            NegotiatingPeer(
+                app,
+                f"codec-{mode}-{c}",
+                c * args.peers + p + 1,
+                recorder,
+                features="capabilities" if publish else "",
+                codecs=DEVICE_CLASSES[rng.choice(sorted(DEVICE_CLASSES))],
+                publish=publish,
+                stats=stats,
+            )
+            for p in range(args.peers)
+        ]
+        for c in range(args.calls)
+    ]
+    pairs = args.calls * args.peers * (args.peers - 1) // 2
+
+    async def join(call: List[NegotiatingPeer]) -> None:
+        for peer in call:
+            await peer.connect()
+            await asyncio.sleep(args.stagger)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(join(call) for call in calls))
+    deadline = time.perf_counter() + args.timeout
+    while stats["agreed"] < pairs and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    renegotiated = manager.renegotiations - renegotiations
+    for call in calls:
+        for peer in call:
+            await peer.leave()
+    return {
+        "pairs": pairs,
+        "agreed": stats["agreed"],
+        "offers": manager.offers - offers,
+        "renegotiations": renegotiated,
+        "renegotiations_per_call": round(renegotiated / args.calls, 3),
+        "intersections_sent": manager.intersections_sent - sent,
+        "settle_s": round(elapsed, 3),
+    }
+
+
+async def run(args) -> dict:
+    from main import app
+    from signaling import manager
+
+    admit_everyone()
+    results = {"params": vars(args)}
+    for mode in args.modes.split(","):
+        results[mode] = await _measure(app, manager, mode == "on", args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="renegotiations with and without capabilities")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--peers", type=int, default=6, help="peers per call")
+    parser.add_argument("--stagger", type=float, default=0.005, help="seconds between joins")
+    parser.add_argument("--modes", default="off,on")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    emit("codec_negotiation", asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
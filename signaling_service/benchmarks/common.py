@@ -0,0 +1,95 @@
+# common.py - shared helpers for the signaling benchmarks
+import asyncio
+import dataclasses
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+
+class FakeWebSocket:
+    """In-memory stand-in for a starlette WebSocket.
+
+    accept/send cost is simulated with asyncio.sleep so lock hold times look like
+    a real handshake / socket write. Messages carrying a "ts" field record their
+    delivery latency into `latencies`.
+    """
+
+    def __init__(
+        self,
+        latencies: Optional[List[float]] = None,
+        accept_delay: float = 0.0,
+        send_delay: float = 0.0,
+    ):
+        self.latencies = latencies if latencies is not None else []
+        self.accept_delay = accept_delay
+        self.send_delay = send_delay
+        self.sent = 0
+        self.closed = False
+        self.client_state = None
+
+    async def accept(self, subprotocol: Optional[str] = None) -> None:
+        await asyncio.sleep(self.accept_delay)
+
+    async def send_json(self, message: dict) -> None:
+        await self._send(message.get("ts") if isinstance(message, dict) else None)
+
+    async def send_text(self, data: str) -> None:
+        await self._send(json.loads(data).get("ts") if '"ts"' in data else None)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._send(None)
+
+    async def _send(self, ts: Optional[float]) -> None:
+        if self.closed:
+            raise RuntimeError("socket closed")
+        await asyncio.sleep(self.send_delay)
+        self.sent += 1
+        if ts is not None:
+            self.latencies.append(time.perf_counter() - ts)
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None) -> None:
+        self.closed = True
+
+
+def admit_everyone() -> None:
+    """Turn off the node's admission control (admission.LoadShedder).
+
+    A benchmark's connect burst lags the loop like a real join storm and would get
+    its own clients shed; load_shedding measures that on purpose.
+    """
+    from signaling import shedder
+
+    shedder.policy = dataclasses.replace(shedder.policy, max_lag=0.0, max_queued=0)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (Linux), 0 where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """p50/p99/max in milliseconds."""
+    return {
+        "samples": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def emit(name: str, results: dict) -> None:
+    """Print machine-readable results (one JSON document per benchmark run)."""
+    print(json.dumps({"benchmark": name, "results": results}, indent=2))
@@ -0,0 +1,75 @@
+# deflate_policy.py - bandwidth vs CPU of the deflate feature across thresholds
+#
+#   cd signaling_service && python -m benchmarks.deflate_policy --peers 8
+#
+# Replays what one peer of a mesh call receives while connecting (an offer or answer
+# from every other peer plus their trickle ICE) through a Deflater per setting, with
+# and without a per-connection context.
+import argparse
+import json
+
+from benchmarks.common import emit
+from benchmarks.relay_codec import sample_messages
+from codec import JSON
+from compression import DeflatePolicy, Deflater
+
+
+def received_frames(peers: int, ice_per_peer: int) -> list:
+    samples = {name: json.loads(raw) for name, raw in sample_messages().items()}
+    frames = []
+    for sender in range(2, peers + 1):
+        kind = "offer" if sender % 2 else "answer"
+        frames.append(JSON.encode(dict(samples["offer"], type=kind, **{"from": sender})))
+        ice = dict(samples["ice-candidate"], **{"from": sender})
+        frames += [JSON.encode(ice)] * ice_per_peer
+    return frames
+
+
+def run(frames: list, policy: DeflatePolicy, stateful: bool, rounds: int) -> dict:
+    deflater = Deflater(policy)
+    sent = 0
+    for _ in range(rounds):
+        context = deflater.open_context() if stateful else None
+        for payload in frames:
+            compressed = deflater.compress(context, payload)
+            sent += len(compressed) if compressed is not None else len(payload.encode())
+        deflater.release_context(context)
+    stats = deflater.snapshot()
+    return {
+        "wire_bytes": sent // rounds,
+        "ratio": stats["ratio"],
+        "compressed_frames": stats["frames"] // rounds,
+        "cpu_us_per_frame": stats["cpu_us_per_frame"],
+        "cpu_ms_per_connection": round(deflater.stats.cpu_seconds / rounds * 1000, 3),
+        "context_bytes": policy.context_bytes if stateful else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="deflate threshold / memory trade-off")
+    parser.add_argument("--peers", type=int, default=8, help="mesh call size")
+    parser.add_argument("--ice-per-peer", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument(
+        "--thresholds", default="0,256,1024,4096", help="comma-separated min_size values"
+    )
+    args = parser.parse_args()
+
+    frames = received_frames(args.peers, args.ice_per_peer)
+    results = {
+        "params": vars(args),
+        "uncompressed_bytes": sum(len(p.encode()) for p in frames),
+    }
+    for min_size in (int(t) for t in args.thresholds.split(",")):
+        for wbits, mem_level in ((15, 8), (12, 5), (10, 3)):
+            policy = DeflatePolicy(min_size=min_size, wbits=wbits, mem_level=mem_level)
+            key = f"min_size={min_size}/wbits={wbits}/mem_level={mem_level}"
+            results[key] = {
+                "context": run(frames, policy, True, args.rounds),
+                "stateless": run(frames, policy, False, args.rounds),
+            }
+    emit("deflate_policy", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# idle_density.py - memory and tasks per idle signaling connection, against a budget
+#
+#   cd signaling_service && python -m benchmarks.idle_density --connections 20000
+#
+# Clients join calls of --call-size through main.app's websocket route (in-process
+# ASGI, as in loadgen), receive their peer-list and new-peers, then sit idle. The
+# clients hold nothing per connection beyond what uvicorn would allocate anyway (the
+# ASGI scope, the app task and a receive callable), which is counted. First
+# --connections of them join untraced, for RSS growth and asyncio tasks per
+# connection; then --traced more join under tracemalloc, for the Python heap per
+# connection and where it goes. Not included: uvicorn's protocol objects and the
+# kernel's socket buffers. Exits non-zero when a connection's heap exceeds
+# --budget-kb or it keeps a task besides its reader, so a change that fattens idle
+# connections fails the run.
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import admit_everyone, emit, rss_bytes
+
+
+class IdleClients:
+    """ASGI receive/send for many idle clients, sharing one pending future.
+
+    Each connection's receive() yields websocket.connect once, then waits on
+    `hangup`; resolving it disconnects every client at once.
+    """
+
+    def __init__(self):
+        self.hangup = asyncio.get_running_loop().create_future()
+        self.frames = 0
+        self.accepted = 0
+
+    def receiver(self):
+        connected = False
+
+        async def receive():
+            nonlocal connected
+            if not connected:
+                connected = True
+                return {"type": "websocket.connect"}
+            return await self.hangup
+
+        return receive
+
+    async def send(self, event: dict) -> None:
+        kind = event["type"]
+        if kind == "websocket.accept":
+            self.accepted += 1
+        elif kind == "websocket.send":
+            self.frames += 1
+
+
+def _scope(call_id: str, user_id: int) -> dict:
+    path = f"/ws/signaling/{call_id}/{user_id}"
+    return {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "scheme": "ws",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"idle-density")],
+        "client": ("127.0.0.1", 10000 + user_id % 50000),
+        "server": ("idle-density", 80),
+        "subprotocols": [],
+    }
+
+
+async def _settle(clients: IdleClients, expected: int) -> None:
+    while clients.accepted < expected:
+        await asyncio.sleep(0.01)
+    # let the peer-lists and new-peers drain so only idle state is left
+    for _ in range(20):
+        await asyncio.sleep(0.01)
+    gc.collect()
+
+
+async def _join(app, clients: IdleClients, first: int, count: int, call_size: int):
+    readers = []
+    for n in range(first, first + count):
+        call_id = f"idle-{n // call_size}"
+        readers.append(
+            asyncio.create_task(app(_scope(call_id, n), clients.receiver(), clients.send))
+        )
+        if n % 1000 == 999:
+            await asyncio.sleep(0)
+    await _settle(clients, first + count - 1)
+    return readers
+
+
+async def run(args) -> dict:
+    from main import app
+    from signaling import manager, shedder
+
+    admit_everyone()
+    clients = IdleClients()
+    # warm up: imports, lazily built routes and metric families are not per connection
+    warm = asyncio.create_task(app(_scope("warm-up", 1), clients.receiver(), clients.send))
+    await _settle(clients, 1)
+
+    gc.collect()
+    rss_before = rss_bytes()
+    tasks_before = len(asyncio.all_tasks())
+    started = time.perf_counter()
+    readers = await _join(app, clients, 2, args.connections, args.call_size)
+    connect_s = time.perf_counter() - started
+    rss = (rss_bytes() - rss_before) / args.connections
+    tasks = (len(asyncio.all_tasks()) - tasks_before) / args.connections
+
+    # start the traced calls on a fresh call boundary
+    first = 2 + -(-args.connections // args.call_size) * args.call_size
+    gc.collect()
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    readers += await _join(app, clients, first, args.traced, args.call_size)
+    heap = (tracemalloc.get_traced_memory()[0] - heap_before) / args.traced
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    top = [
+        {
+            "where": f"{stat.traceback[0].filename.rsplit('/', 1)[-1]}:{stat.traceback[0].lineno}",
+            "bytes_per_connection": round(stat.size / args.traced, 1),
+        }
+        for stat in snapshot.statistics("lineno")[: args.top]
+    ]
+
+    clients.hangup.set_result({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.gather(*readers, warm)
+    leftover = sum(len(call) for call in manager.active_calls.values())
+
+    return {
+        "params": vars(args),
+        "connect_s": round(connect_s, 3),
+        "rss_per_connection_b": round(rss, 1),
+        "tasks_per_connection": round(tasks, 3),
+        "heap_per_connection_b": round(heap, 1),
+        "projected_heap_mb": round(heap * args.target / 2**20, 1),
+        "projected_rss_mb": round(rss * args.target / 2**20, 1),
+        "budget_b": args.budget_kb * 1024,
+        "within_budget": heap <= args.budget_kb * 1024 and tasks <= 1.0,
+        "refused": shedder.shed.total(),
+        "connections_left_after_hangup": leftover,
+        "top_allocations": top,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memory per idle signaling connection")
+    parser.add_argument("--connections", type=int, default=20000, help="untraced")
+    parser.add_argument("--traced", type=int, default=2000, help="joined under tracemalloc")
+    parser.add_argument("--call-size", type=int, default=4)
+    parser.add_argument("--target", type=int, default=100_000, help="connections per node")
+    parser.add_argument("--budget-kb", type=float, default=15.0, help="heap per connection")
+    parser.add_argument("--top", type=int, default=12, help="largest allocation sites")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    emit("idle_density", results)
+    if not results["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# idle_heartbeat.py - CPU spent keeping idle calls alive
+#
+#   cd signaling_service && python -m benchmarks.idle_heartbeat --connections 10000
+#
+# "per-connection" reproduces the original signaling_ws: every connection runs its
+# own heartbeat task that pings the whole call, plus a reader with its own wait_for
+# timer. "wheel" is the node-wide HeartbeatScheduler with plain readers. Clients
+# answer pings immediately in both modes. Intervals are scaled down so a short
+# run covers several heartbeat periods.
+import argparse
+import asyncio
+import time
+
+from benchmarks.baseline_connection_manager import (
+    CallConnectionManager as BaselineManager,
+)
+from benchmarks.common import FakeWebSocket, emit
+from connection_manager import CallConnectionManager
+
+
+class PongingWebSocket(FakeWebSocket):
+    """Answers every ping by marking its connection as seen."""
+
+    connection = None
+
+    async def send_json(self, message: dict) -> None:
+        await super().send_json(message)
+        if message.get("type") == "ping" and self.connection is not None:
+            self.connection.touch()
+
+
+async def _measure(duration: float) -> dict:
+    await asyncio.sleep(0.5)  # let startup work settle
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.sleep(duration)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {
+        "cpu_s": round(cpu, 3),
+        "cpu_percent": round(100 * cpu / wall, 2),
+        "tasks": len(asyncio.all_tasks()),
+    }
+
+
+async def run_per_connection(args) -> dict:
+    manager = BaselineManager()
+    sockets = []
+    tasks = []
+    never = asyncio.get_running_loop().create_future()
+
+    async def heartbeat(call_id):
+        while True:
+            await asyncio.sleep(args.interval)
+            await manager.cleanup_stale_connections(call_id)
+
+    async def reader():
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(never), timeout=2 * args.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    for n in range(args.connections):
+        call_id = f"call-{n // args.call_size}"
+        ws = FakeWebSocket()
+        sockets.append(ws)
+        await manager.connect(call_id, n, ws)
+        tasks.append(asyncio.create_task(heartbeat(call_id)))
+        tasks.append(asyncio.create_task(reader()))
+
+    result = await _measure(args.duration)
+    result["pings_sent"] = sum(ws.sent for ws in sockets)
+    for task in tasks:
+        task.cancel()
+    return result
+
+
+async def run_wheel(args) -> dict:
+    manager = CallConnectionManager(
+        heartbeat_interval=args.interval,
+        heartbeat_timeout=args.interval,
+        heartbeat_tick=args.interval / 4,
+    )
+    tasks = []
+    never = asyncio.get_running_loop().create_future()
+
+    async def reader():
+        await asyncio.shield(never)
+
+    for n in range(args.connections):
+        ws = PongingWebSocket()
+        ws.connection = await manager.connect(f"call-{n // args.call_size}", n, ws)
+        tasks.append(asyncio.create_task(reader()))
+
+    result = await _measure(args.duration)
+    result["pings_sent"] = manager.heartbeat.pings_sent
+    result["evicted"] = manager.heartbeat.evicted
+    for task in tasks:
+        task.cancel()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="idle heartbeat CPU cost")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--call-size", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    emit(
+        "idle_heartbeat",
+        {
+            "params": vars(args),
+            "per_connection": asyncio.run(run_per_connection(args)),
+            "wheel": asyncio.run(run_wheel(args)),
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# join_storm.py - hundreds of peers joining (and leaving) one call at once
+#
+#   cd signaling_service && python -m benchmarks.join_storm --peers 500
+#
+# Compares the legacy membership messages (a peer-list snapshot per join plus a
+# new-peer / peer-disconnected broadcast per change) with ?features=peer-delta, where
+# changes are collapsed into one versioned peer-delta per interval and clients ack.
+# For each mode: all --peers join concurrently, then --leave-fraction of them leave at
+# once. Reported per storm: time until every client's view of the call is complete,
+# membership frames and bytes delivered, server CPU time, and clients the server cut
+# off because their control lane overflowed (none: membership frames get headroom
+# sized from the call on top of --control-limit). Exits 1 if any storm left a client
+# disconnected or with an incomplete view.
+import argparse
+import asyncio
+import dataclasses
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.common import admit_everyone, emit, latency_summary
+from benchmarks.loadgen import Recorder, VirtualPeer
+from membership import PEER_DELTA_FEATURE
+
+
+class StormPeer(VirtualPeer):
+    """Keeps the client-side view of the call's membership."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.view: Dict[int, int] = {}
+        self.target = 0
+        self.storm_started = 0.0
+        self.converged = False
+
+    async def _send(self, event: dict) -> None:
+        if event["type"] == "websocket.send":
+            payload = event.get("text") or event.get("bytes")
+            self.recorder.received["bytes"] += len(payload)
+        await super()._send(event)
+
+    def expect(self, size: int, started: float) -> None:
+        self.target = size
+        self.storm_started = started
+        self.converged = False
+        self._check()
+
+    def _check(self) -> None:
+        if not self.converged and len(self.view) == self.target:
+            self.converged = True
+            self.recorder.received["converged"] += 1
+            self.recorder.record("converged", self.storm_started, time.perf_counter())
+
+    def _on_message(self, message: dict) -> None:
+        kind = message.get("type")
+        if kind in ("peer-list", "new-peer", "peer-disconnected", "peer-delta"):
+            self.recorder.received["membership"] += 1
+        if kind == "peer-list":
+            self.view = dict.fromkeys(message["peers"], 0)
+            self.joined.set()
+        elif kind == "new-peer":
+            self.view[message["peerId"]] = 0
+        elif kind == "peer-disconnected":
+            self.view.pop(message["peerId"], None)
+        elif kind == "peer-delta":
+            if message["reset"]:
+                self.view = {}
+            for peer_id, version in message["added"]:
+                self.view[peer_id] = version
+            for removed in message["removed"]:
+                self.view.pop(removed, None)
+            self.view.pop(self.user_id, None)
+            self.send({"type": "peer-ack", "version": message["version"]})
+        elif kind == "ping":
+            self.send({"type": "pong"})
+        else:
+            return
+        self._check()
+
+
+async def _storm(app, args, features: str) -> dict:
+    recorder = Recorder()
+    call_id = f"storm-{features or 'legacy'}"
+    peers = [
+        StormPeer(app, call_id, i + 1, recorder, features=features) for i in range(args.peers)
+    ]
+    results = {}
+
+    async def measure(name: str, start, waiting: List[StormPeer]):
+        recorder.received.clear()
+        recorder.latencies.clear()
+        cpu, started = time.process_time(), time.perf_counter()
+        await start(started)
+        deadline = started + args.timeout
+        while not all(peer.converged or peer.closed for peer in waiting):
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "completed": all(peer.converged for peer in waiting),
+            "disconnected": sum(peer.closed for peer in waiting),
+            "duration_s": round(elapsed, 3),
+            "cpu_s": round(time.process_time() - cpu, 3),
+            "membership_frames": recorder.received["membership"],
+            "bytes": recorder.received["bytes"],
+            "converged": latency_summary(recorder.latencies["converged"]),
+        }
+
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def connect(peer: StormPeer):
+        async with gate:
+            await peer.connect()
+
+    async def join(started: float):
+        for peer in peers:
+            peer.expect(args.peers - 1, started)
+        await asyncio.gather(*(connect(peer) for peer in peers))
+
+    await measure("join", join, peers)
+
+    leaving = peers[: int(args.peers * args.leave_fraction)]
+    staying = [peer for peer in peers[len(leaving) :] if not peer.closed]
+
+    async def leave(started: float):
+        for peer in staying:
+            peer.expect(len(staying) - 1, started)
+        await asyncio.gather(*(peer.leave() for peer in leaving))
+
+    await measure("leave", leave, staying)
+    await asyncio.gather(*(peer.leave() for peer in staying))
+    return results
+
+
+async def run(args) -> dict:
+    from main import app
+    from signaling import manager
+
+    admit_everyone()
+    manager.peer_delta_interval = args.interval
+    manager.outbound_policy = dataclasses.replace(
+        manager.outbound_policy, control_limit=args.control_limit
+    )
+    return {
+        "params": vars(args),
+        "legacy": await _storm(app, args, ""),
+        "peer_delta": await _storm(app, args, PEER_DELTA_FEATURE),
+        "deltas_sent": manager.peer_deltas_sent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="join/leave storm in one large call")
+    parser.add_argument("--peers", type=int, default=500)
+    parser.add_argument("--leave-fraction", type=float, default=0.5)
+    parser.add_argument("--interval", type=float, default=0.05, help="peer-delta interval")
+    parser.add_argument(
+        "--control-limit", type=int, default=64, help="control lane size per connection"
+    )
+    parser.add_argument("--concurrency", type=int, default=500, help="joins in flight")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    emit("join_storm", results)
+    # every storm, legacy or peer-delta, must leave each client connected and current
+    if not all(
+        storm["completed"] and not storm["disconnected"]
+        for mode in ("legacy", "peer_delta")
+        for storm in results[mode].values()
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# load_shedding.py - latency of calls already on a node while a join storm hits it
+#
+#   cd signaling_service && python -m benchmarks.load_shedding --calls 50 --storm 2000
+#
+# --calls calls of four peers keep trickling ICE candidates to each other (one per
+# peer every --period seconds) and their relay latency is recorded. Then --storm new
+# peers arrive over --arrival seconds in calls of four, and every one that gets in
+# broadcasts --offers SDP offers to its call. Run once with admission control off and
+# once on (--max-lag): reported per run are the existing calls' relay latency during
+# the storm, the loop lag the shedder saw, and how many joins were admitted or shed.
+# Clients run in the same event loop as the server, so their work counts as lag too.
+import argparse
+import asyncio
+import dataclasses
+import time
+from typing import List
+
+from benchmarks.common import emit, latency_summary
+from benchmarks.loadgen import Recorder, VirtualPeer
+from benchmarks.relay_codec import sample_messages
+
+import orjson
+
+
+class StormPeer(VirtualPeer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shed = False
+
+    def _on_message(self, message: dict) -> None:
+        if message.get("type") == "overloaded":
+            self.shed = True
+            self.recorder.received["overloaded"] += 1
+            return
+        super()._on_message(message)
+
+
+async def _trickle(peer: VirtualPeer, target: int, template: dict, period: float, stop):
+    while not stop.is_set():
+        candidate = dict(template["candidate"], ts=time.perf_counter())
+        peer.send(dict(template, candidate=candidate, target=target))
+        await asyncio.sleep(period)
+
+
+async def _run_mode(app, shedder, args, mode: str, off, policy) -> dict:
+    # the steady calls are members before the storm: never shed them
+    shedder.policy = off
+    shedder.shedding = None
+    samples = {name: orjson.loads(raw) for name, raw in sample_messages().items()}
+    recorder = Recorder()
+    base = 1_000_000 if mode == "shedding" else 0
+
+    calls: List[List[VirtualPeer]] = [
+        [
+            VirtualPeer(app, f"steady-{mode}-{c}", base + c * 4 + p + 1, recorder)
+            for p in range(4)
+        ]
+        for c in range(args.calls)
+    ]
+    for call in calls:
+        for peer in call:
+            await peer.connect()
+
+    stop = asyncio.Event()
+    trickles = [
+        asyncio.create_task(
+            _trickle(
+                peer, call[(i + 1) % 4].user_id, samples["ice-candidate"], args.period, stop
+            )
+        )
+        for call in calls
+        for i, peer in enumerate(call)
+    ]
+    # settle (including the previous run's backlog), then measure only the storm
+    await asyncio.sleep(1.0)
+    while shedder.lag > args.max_lag / 2:
+        await asyncio.sleep(0.1)
+    shedder.policy = policy
+    shedder.admitted = 0
+    shedder.shed.clear()
+    recorder.latencies.clear()
+    max_lag = 0.0
+
+    async def watch_lag():
+        nonlocal max_lag
+        while not stop.is_set():
+            max_lag = max(max_lag, shedder.lag)
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.create_task(watch_lag())
+    storm: List[StormPeer] = []
+    offer = samples["offer"]
+
+    async def arrive(peer: StormPeer):
+        await peer.connect()
+        if peer.closed or peer.shed:
+            return
+        for _ in range(args.offers):
+            peer.send(dict(offer, target=None, ts=time.perf_counter()))
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    arrivals = []
+    gap = args.arrival / max(1, args.storm)
+    for i in range(args.storm):
+        peer = StormPeer(app, f"storm-{mode}-{i // 4}", base + 500_000 + i, recorder)
+        storm.append(peer)
+        arrivals.append(asyncio.create_task(arrive(peer)))
+        await asyncio.sleep(gap)
+    await asyncio.gather(*arrivals)
+    # let the backlog drain while still measuring
+    await asyncio.sleep(args.tail)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*trickles, watcher)
+    status = shedder.status()
+    result = {
+        "storm_s": round(elapsed, 3),
+        "existing_relay_latency": latency_summary(recorder.latencies["ice-candidate"]),
+        "admitted": status["admitted"],
+        "shed": sum(status["shed"].values()),
+        "shed_by_reason": status["shed"],
+        "max_smoothed_lag_ms": round(max_lag * 1000, 1),
+    }
+    shedder.policy = off
+    for peer in storm:
+        if not peer.closed:
+            await peer.leave()
+    for call in calls:
+        for peer in call:
+            await peer.leave()
+    return result
+
+
+async def run(args) -> dict:
+    from main import app
+    from signaling import shedder
+
+    # thresholds out of reach rather than 0, so the probe keeps measuring lag
+    off = dataclasses.replace(shedder.policy, max_lag=3600.0, max_queued=0)
+    on = dataclasses.replace(off, max_lag=args.max_lag, max_queued=args.max_queued)
+    shedder.policy = off
+    shedder.start()
+    return {
+        "params": vars(args),
+        "no_shedding": await _run_mode(app, shedder, args, "off", off, off),
+        "shedding": await _run_mode(app, shedder, args, "shedding", off, on),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="existing call latency under a join storm")
+    parser.add_argument("--calls", type=int, default=50, help="calls already running")
+    parser.add_argument("--period", type=float, default=0.05, help="ICE interval per peer")
+    parser.add_argument("--storm", type=int, default=2000, help="peers trying to join")
+    parser.add_argument("--arrival", type=float, default=2.0, help="seconds they arrive over")
+    parser.add_argument("--offers", type=int, default=4, help="offers each joiner broadcasts")
+    parser.add_argument("--tail", type=float, default=2.0, help="seconds measured after")
+    parser.add_argument("--max-lag", type=float, default=0.05)
+    parser.add_argument("--max-queued", type=int, default=20000)
+    args = parser.parse_args()
+    emit("load_shedding", asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
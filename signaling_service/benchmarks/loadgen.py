@@ -0,0 +1,305 @@
+# loadgen.py - drive the real signaling app with thousands of simulated peers
+#
+#   cd signaling_service && python -m benchmarks.loadgen --calls 500 --peers 4
+#
+# Peers talk to main.app through its ASGI websocket interface directly: no sockets,
+# no server, no thread per connection (unlike starlette's TestClient), so one process
+# holds thousands of them. Latencies are therefore server work plus event loop
+# scheduling, which is what changes between releases. The app's lifespan is not run,
+# so the node stays standalone even if SIGNALING_BUS_URL is set.
+#
+# Scenarios run in order over every call, each waiting for all its deliveries:
+#   join        peers connect, latency = connect until peer-list arrives
+#   offer       every pair exchanges an offer and an auto-answer (relay latency)
+#   ice-burst   every peer trickles --ice candidates to every other peer
+#   call-invite the first peer of each call invites the rest
+#   leave       peers leave one by one, latency = leave until peer-disconnected
+import argparse
+import asyncio
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+from benchmarks.common import admit_everyone, emit, latency_summary, rss_bytes
+from benchmarks.relay_codec import sample_messages
+from codec import JSON, SUBPROTOCOLS, Codec, negotiate
+from compression import DEFLATE_MARKER
+
+
+class Recorder:
+    """Delivery counts and latencies shared by every virtual peer."""
+
+    def __init__(self):
+        self.received: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        # started-at times for messages the server rewrites (no "ts" survives)
+        self.invites: Dict[str, float] = {}
+        self.leaves: Dict[Tuple[str, int], float] = {}
+
+    def record(self, kind: str, started: Optional[float], now: float) -> None:
+        if started is not None:
+            self.latencies[kind].append(now - started)
+
+    async def wait(self, kind: str, expected: int, timeout: float) -> bool:
+        deadline = time.perf_counter() + timeout
+        while self.received[kind] < expected:
+            if time.perf_counter() > deadline:
+                return False
+            await asyncio.sleep(0.005)
+        return True
+
+
+class VirtualPeer:
+    """One simulated client, connected to the ASGI app in-process."""
+
+    def __init__(
+        self,
+        app,
+        call_id: str,
+        user_id: int,
+        recorder: Recorder,
+        subprotocol: Optional[str] = None,
+        features: str = "",
+    ):
+        self.app = app
+        self.call_id = call_id
+        self.user_id = user_id
+        self.recorder = recorder
+        self.subprotocol = subprotocol
+        self.codec: Codec = negotiate([subprotocol] if subprotocol else [])[0]
+        self.features = features
+        self.inflater = zlib.decompressobj(-15)
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.joined = asyncio.Event()
+        self.accepted = asyncio.Event()
+        self.closed = False
+        self.connect_started = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def _scope(self) -> dict:
+        path = f"/ws/signaling/{self.call_id}/{self.user_id}"
+        query = f"features={self.features}" if self.features else ""
+        return {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"loadgen")],
+            "client": ("127.0.0.1", 10000 + self.user_id % 50000),
+            "server": ("loadgen", 80),
+            "subprotocols": [self.subprotocol] if self.subprotocol else [],
+        }
+
+    async def connect(self) -> None:
+        self.connect_started = time.perf_counter()
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(self.app(self._scope(), self.inbox.get, self._send))
+        await self.joined.wait()
+
+    async def leave(self) -> None:
+        self.recorder.leaves[(self.call_id, self.user_id)] = time.perf_counter()
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+    def send(self, message: dict) -> None:
+        payload = self.codec.encode(message)
+        key = "bytes" if isinstance(payload, bytes) else "text"
+        self.inbox.put_nowait({"type": "websocket.receive", key: payload})
+
+    async def _send(self, event: dict) -> None:
+        kind = event["type"]
+        if kind == "websocket.accept":
+            self.accepted.set()
+        elif kind == "websocket.close":
+            self.closed = True
+            self.joined.set()
+        elif kind == "websocket.send":
+            payload = event.get("bytes")
+            if payload is None:
+                payload = event["text"]
+            elif payload[:1] == DEFLATE_MARKER:
+                payload = self.inflater.decompress(payload[1:])
+                if not self.codec.binary:
+                    payload = payload.decode()
+            self._on_message(self.codec.decode(payload))
+
+    def _on_message(self, message: dict) -> None:
+        now = time.perf_counter()
+        kind = message.get("type")
+        recorder = self.recorder
+        recorder.received[kind] += 1
+        if kind == "peer-list":
+            recorder.record("join", self.connect_started, now)
+            self.joined.set()
+        elif kind == "ping":
+            self.send({"type": "pong"})
+        elif kind == "offer":
+            recorder.record(kind, message.get("ts"), now)
+            self.send(
+                {
+                    "type": "answer",
+                    "sdp": message["sdp"],
+                    "target": message["from"],
+                    "ts": time.perf_counter(),
+                }
+            )
+        elif kind == "answer":
+            recorder.record(kind, message.get("ts"), now)
+        elif kind == "ice-candidate":
+            recorder.received["candidates"] += 1
+            recorder.record(kind, message["candidate"].get("ts"), now)
+        elif kind == "ice-candidates":
+            for candidate in message["candidates"]:
+                recorder.received["candidates"] += 1
+                recorder.record("ice-candidate", candidate.get("ts"), now)
+        elif kind == "call-invite":
+            recorder.record(kind, recorder.invites.get(message.get("callId")), now)
+        elif kind == "peer-disconnected":
+            started = recorder.leaves.get((self.call_id, message.get("peerId")))
+            recorder.record(kind, started, now)
+
+
+async def run(args) -> dict:
+    from main import app  # builds the module-level manager, import after arg parsing
+    from signaling import manager
+
+    admit_everyone()
+    samples = {name: orjson.loads(raw) for name, raw in sample_messages().items()}
+    subprotocol = next(
+        (name for name, codec in SUBPROTOCOLS.items() if codec.name == args.codec), None
+    )
+    if args.codec != JSON.name and subprotocol is None:
+        raise SystemExit(f"unknown codec {args.codec}")
+    recorder = Recorder()
+    calls = [
+        [
+            VirtualPeer(
+                app,
+                f"load-{c}",
+                c * args.peers + p + 1,
+                recorder,
+                subprotocol if args.codec != JSON.name else None,
+                args.features,
+            )
+            for p in range(args.peers)
+        ]
+        for c in range(args.calls)
+    ]
+    peers = [peer for call in calls for peer in call]
+    pairs = args.calls * args.peers * (args.peers - 1) // 2
+    results: dict = {"params": vars(args), "connections": len(peers)}
+
+    async def phase(name: str, start, kind: str, expected: int, count_as: str = None):
+        started = time.perf_counter()
+        await start()
+        completed = await recorder.wait(kind, expected, args.timeout)
+        elapsed = time.perf_counter() - started
+        delivered = recorder.received[kind]
+        results[name] = {
+            "completed": completed,
+            "delivered": delivered,
+            "expected": expected,
+            "duration_s": round(elapsed, 3),
+            "msgs_per_s": round(delivered / elapsed, 1) if elapsed else 0.0,
+            "latency": latency_summary(recorder.latencies[count_as or kind]),
+        }
+
+    # join: connect with bounded concurrency, like clients arriving in a burst
+    rss_before = rss_bytes()
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def connect(peer: VirtualPeer):
+        async with gate:
+            await peer.connect()
+
+    async def join():
+        await asyncio.gather(*(connect(peer) for peer in peers))
+
+    await phase("join", join, "new-peer", pairs)
+    results["join"]["latency"] = latency_summary(recorder.latencies["join"])
+    rss_joined = rss_bytes()
+    results["rss"] = {
+        "before_mb": round(rss_before / 2**20, 1),
+        "joined_mb": round(rss_joined / 2**20, 1),
+        "per_connection_kb": round((rss_joined - rss_before) / len(peers) / 1024, 2),
+    }
+
+    async def offers():
+        for call in calls:
+            for i, sender in enumerate(call):
+                for target in call[i + 1 :]:
+                    sender.send(
+                        dict(samples["offer"], target=target.user_id, ts=time.perf_counter())
+                    )
+
+    await phase("offer", offers, "offer", pairs)
+    await recorder.wait("answer", pairs, args.timeout)
+    results["answer"] = {
+        "delivered": recorder.received["answer"],
+        "latency": latency_summary(recorder.latencies["answer"]),
+    }
+
+    async def ice_burst():
+        template = samples["ice-candidate"]
+        for call in calls:
+            for sender in call:
+                for target in call:
+                    if target is sender:
+                        continue
+                    for _ in range(args.ice):
+                        candidate = dict(template["candidate"], ts=time.perf_counter())
+                        sender.send(
+                            dict(template, candidate=candidate, target=target.user_id)
+                        )
+
+    await phase(
+        "ice-burst", ice_burst, "candidates", pairs * 2 * args.ice, count_as="ice-candidate"
+    )
+    results["ice-burst"]["frames"] = (
+        recorder.received["ice-candidate"] + recorder.received["ice-candidates"]
+    )
+
+    async def invites():
+        for call in calls:
+            recorder.invites[call[0].call_id] = time.perf_counter()
+            call[0].send({"type": "call-invite", "callId": call[0].call_id})
+
+    await phase("call-invite", invites, "call-invite", args.calls * (args.peers - 1))
+
+    async def leave_call(call: List[VirtualPeer]):
+        for peer in call:
+            await peer.leave()
+
+    async def leave():
+        await asyncio.gather(*(leave_call(call) for call in calls))
+
+    await phase("leave", leave, "peer-disconnected", pairs)
+    results["leave"]["calls_left"] = len(manager.active_calls)
+    results["send_failures"] = {
+        call_id: vars(stats) for call_id, stats in manager.call_stats.items()
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="signaling node load generator")
+    parser.add_argument("--calls", type=int, default=250)
+    parser.add_argument("--peers", type=int, default=4, help="peers per call")
+    parser.add_argument("--ice", type=int, default=8, help="candidates per peer pair")
+    parser.add_argument("--concurrency", type=int, default=500, help="joins in flight")
+    parser.add_argument("--codec", default="json", help="json or msgpack")
+    parser.add_argument("--features", default="", help="e.g. ice-batch,deflate")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per scenario")
+    args = parser.parse_args()
+    emit("loadgen", asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
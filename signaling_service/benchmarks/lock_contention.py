@@ -0,0 +1,82 @@
+# lock_contention.py - relay latency under join/leave churn across many calls
+#
+#   cd signaling_service && python -m benchmarks.lock_contention --calls 2000
+#
+# Every call runs an ICE relay loop between two resident peers while extra peers keep
+# joining and leaving the same and other calls. With the baseline manager each join
+# holds the global lock for the whole websocket handshake, so relays in unrelated
+# calls queue up behind it. The current manager takes no lock at all: the handshake
+# runs before the join, and the join itself is one await-free dict swap.
+import argparse
+import asyncio
+import time
+
+from benchmarks.baseline_connection_manager import (
+    CallConnectionManager as BaselineManager,
+)
+from benchmarks.common import FakeWebSocket, emit, latency_summary
+from connection_manager import CallConnectionManager
+
+
+async def _relay_loop(manager, call_id: str, messages: int, interval: float):
+    for _ in range(messages):
+        await manager.send_to_peer(
+            call_id, 2, {"type": "ice-candidate", "from": 1, "ts": time.perf_counter()}
+        )
+        await asyncio.sleep(interval)
+
+
+async def _churn_loop(manager, call_id: str, rounds: int, accept_delay: float):
+    for n in range(rounds):
+        user_id = 1000 + n
+        await manager.connect(call_id, user_id, FakeWebSocket(accept_delay=accept_delay))
+        await asyncio.sleep(0)
+        await manager.disconnect(call_id, user_id)
+
+
+async def run(manager_cls, args) -> dict:
+    manager = manager_cls()
+    latencies = []
+    call_ids = [f"call-{i}" for i in range(args.calls)]
+    for call_id in call_ids:
+        await manager.connect(call_id, 1, FakeWebSocket(latencies))
+        await manager.connect(call_id, 2, FakeWebSocket(latencies))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(_relay_loop(manager, c, args.messages, args.interval) for c in call_ids),
+        *(
+            _churn_loop(manager, c, args.churn, args.accept_delay)
+            for c in call_ids[: args.churn_calls]
+        ),
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        **latency_summary(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "relays_per_s": round(len(latencies) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relay latency under join/leave churn")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20, help="relays per call")
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--churn-calls", type=int, default=200)
+    parser.add_argument("--churn", type=int, default=5, help="join/leave rounds")
+    parser.add_argument("--accept-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    emit(
+        "lock_contention",
+        {
+            "params": vars(args),
+            "baseline": asyncio.run(run(BaselineManager, args)),
+            "lock_free": asyncio.run(run(CallConnectionManager, args)),
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
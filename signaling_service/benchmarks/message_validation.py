@@ -0,0 +1,70 @@
+# message_validation.py - CPU cost of checking inbound messages against models.py
+#
+#   cd signaling_service && python -m benchmarks.message_validation
+#
+# For each sample message: decode only (what the relay did before), decode plus
+# check_signaling, and the check alone, in microseconds per message. Also the cost of
+# rejecting an unknown type in strict mode (a set lookup, no validator) and of
+# rejecting an oversized SDP (the validator runs and builds an error).
+import argparse
+import json
+import time
+
+from benchmarks.common import emit
+from benchmarks.relay_codec import sample_messages, sample_sdp
+from codec import JSON
+from config import MAX_SDP_LENGTH
+from models import check_signaling
+
+
+def _per_message_us(fn, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return round((time.process_time() - started) / iterations * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="schema validation CPU per message")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    samples = sample_messages()
+    samples["answer"] = json.dumps(
+        {"type": "answer", "sdp": sample_sdp(), "target": 1, "userData": {"userId": 2}}
+    )
+    samples["peer-ack"] = json.dumps({"type": "peer-ack", "version": 42})
+    samples["call-invite"] = json.dumps({"type": "call-invite", "callId": "42", "from": 1})
+
+    results = {"params": vars(args)}
+    for name, raw in samples.items():
+        data = JSON.decode(raw)
+        assert check_signaling(data) is None, name
+        decode_us = _per_message_us(lambda: JSON.decode(raw), args.iterations)
+        both_us = _per_message_us(
+            lambda: check_signaling(JSON.decode(raw)), args.iterations
+        )
+        results[name] = {
+            "bytes": len(raw),
+            "decode_us": decode_us,
+            "decode_validate_us": both_us,
+            "validate_us": _per_message_us(lambda: check_signaling(data), args.iterations),
+        }
+
+    unknown = {"type": "screen-share-hint", "target": 2}
+    results["unknown/strict_reject_us"] = _per_message_us(
+        lambda: check_signaling(unknown, True), args.iterations
+    )
+    results["unknown/passthrough_us"] = _per_message_us(
+        lambda: check_signaling(unknown), args.iterations
+    )
+    oversized = {"type": "offer", "sdp": "a" * (MAX_SDP_LENGTH + 1), "target": 2}
+    assert check_signaling(oversized) is not None
+    results["oversized_sdp/reject_us"] = _per_message_us(
+        lambda: check_signaling(oversized), args.iterations
+    )
+    emit("message_validation", results)
+
+
+if __name__ == "__main__":
+    main()
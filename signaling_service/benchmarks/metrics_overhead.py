@@ -0,0 +1,147 @@
+# metrics_overhead.py - what the Prometheus instrumentation costs
+#
+#   cd signaling_service && python -m benchmarks.metrics_overhead --calls 2500 --peers 4
+#
+# Three numbers: the cost of each hot-path instrument (and of a flight recorder event)
+# on its own, the CPU of relaying broadcasts through the real manager and writers with
+# the instruments vs no-op stand-ins (best of --repeat alternating runs, next to the
+# overhead the per-instrument costs add up to), and how long one /metrics scrape takes
+# at the given node size.
+import argparse
+import asyncio
+import time
+
+from prometheus_client import generate_latest
+
+import metrics
+from benchmarks.common import FakeWebSocket, emit
+from connection_manager import CallConnectionManager
+from metrics import REGISTRY, SignalingCollector
+
+
+class _NullHistogram:
+    def observe(self, value):
+        pass
+
+
+class _NullCounter(dict):
+    def __missing__(self, key):
+        return 0
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def _us(fn, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return round((time.process_time() - started) / iterations * 1e6, 3)
+
+
+async def _populate(calls: int, peers: int) -> CallConnectionManager:
+    manager = CallConnectionManager()
+    for c in range(calls):
+        for p in range(peers):
+            await manager.connect(f"call-{c}", p, FakeWebSocket())
+    return manager
+
+
+async def _relay_cpu(manager: CallConnectionManager, calls: int, rounds: int) -> float:
+    """CPU seconds for `rounds` broadcasts per call, until every writer is idle."""
+    started = time.process_time()
+    for r in range(rounds):
+        for c in range(calls):
+            metrics.count_relayed("ice-candidate")
+            manager._broadcast_local(
+                f"call-{c}", {"type": "ice-candidate", "candidate": r}, exclude_user=0
+            )
+        await asyncio.sleep(0)
+    while any(
+        c.control or c.data for call in manager.active_calls.values() for c in call.values()
+    ):
+        await asyncio.sleep(0.001)
+    return time.process_time() - started
+
+
+async def run(args) -> dict:
+    results = {"params": vars(args)}
+    manager = await _populate(args.calls, args.peers)
+    results["instrument_us"] = {
+        "count_relayed": _us(lambda: metrics.count_relayed("offer"), args.iterations),
+        "send_seconds.observe": _us(
+            lambda: metrics.SEND_SECONDS.observe(0.0003), args.iterations
+        ),
+        "broadcast_fanout.observe": _us(
+            lambda: metrics.BROADCAST_FANOUT.observe(3), args.iterations
+        ),
+        # flight recorder event, as recorded for every inbound message
+        "manager.record": _us(
+            lambda: manager.record("call-0", "in", "ice-candidate", 280, 1, 2),
+            args.iterations,
+        ),
+    }
+    nulls = {
+        "SEND_SECONDS": _NullHistogram(),
+        "BROADCAST_FANOUT": _NullHistogram(),
+        "MESSAGES_RELAYED": _NullCounter(),
+        "QUEUE_DROPS": _NullCounter(),
+        "SEND_FAILURES": _NullCounter(),
+    }
+    saved = {name: getattr(metrics, name) for name in nulls}
+    # alternate so warm-up and allocator state don't favour either side
+    instrumented = bare = float("inf")
+    for _ in range(args.repeat):
+        instrumented = min(instrumented, await _relay_cpu(manager, args.calls, args.rounds))
+        for name, null in nulls.items():
+            setattr(metrics, name, null)
+        try:
+            bare = min(bare, await _relay_cpu(manager, args.calls, args.rounds))
+        finally:
+            for name, value in saved.items():
+                setattr(metrics, name, value)
+    sends = args.calls * (args.peers - 1) * args.rounds
+    # the end-to-end difference is a few percent of a noisy total, so also add up what
+    # the instruments cost per send: one write observed, plus a share of the broadcast's
+    # relay count and fan-out observation
+    costs = results["instrument_us"]
+    per_send = costs["send_seconds.observe"] + (
+        costs["count_relayed"] + costs["broadcast_fanout.observe"]
+    ) / max(1, args.peers - 1)
+    bare_us = bare / sends * 1e6
+    results["relay"] = {
+        "sends": sends,
+        "instrumented_us_per_send": round(instrumented / sends * 1e6, 3),
+        "bare_us_per_send": round(bare_us, 3),
+        "overhead_percent": round(100 * (instrumented - bare) / bare, 2) if bare else 0.0,
+        "instrument_us_per_send": round(per_send, 3),
+        "estimated_overhead_percent": round(100 * per_send / bare_us, 2) if bare else 0.0,
+    }
+
+    REGISTRY.register(collector := SignalingCollector(manager))
+    try:
+        started = time.perf_counter()
+        body = generate_latest(REGISTRY)
+        results["scrape"] = {
+            "connections": args.calls * args.peers,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            "bytes": len(body),
+        }
+    finally:
+        REGISTRY.unregister(collector)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prometheus instrumentation overhead")
+    parser.add_argument("--calls", type=int, default=2500)
+    parser.add_argument("--peers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20, help="broadcasts per call")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per side, best kept")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    emit("metrics_overhead", asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
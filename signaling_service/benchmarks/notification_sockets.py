@@ -0,0 +1,153 @@
+# notification_sockets.py - sockets and memory per online user, per-chat vs user channel
+#
+#   cd signaling_service && python -m benchmarks.notification_sockets --users 2000 --chats 10
+#
+# Before: the frontend kept a signaling socket open on every chat of the user just to
+# hear call-invite broadcasts (--users x --chats sockets, chats of --members users).
+# After: one /ws/notifications/{user_id} socket per user, invites routed by user id.
+# Each layout runs in its own interpreter so RSS deltas don't leak between them; both
+# report connections, RSS per online user and the latency of --invites call-invites
+# (each chat's first member inviting the rest) through the real app.
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from typing import List
+
+from benchmarks.common import emit, latency_summary, rss_bytes
+from benchmarks.loadgen import Recorder, VirtualPeer
+
+
+class NotificationPeer(VirtualPeer):
+    """A user's notification socket; there is no peer-list, accept means connected."""
+
+    def _scope(self) -> dict:
+        scope = super()._scope()
+        scope["path"] = f"/ws/notifications/{self.user_id}"
+        scope["raw_path"] = scope["path"].encode()
+        return scope
+
+    async def connect(self) -> None:
+        self.connect_started = time.perf_counter()
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(self.app(self._scope(), self.inbox.get, self._send))
+        await self.accepted.wait()
+
+
+def _chats(args) -> List[List[int]]:
+    """--users * --chats memberships grouped into chats of --members distinct users."""
+    rng = random.Random(7)
+    chats = []
+    for _ in range(args.users * args.chats // args.members):
+        chats.append(rng.sample(range(1, args.users + 1), args.members))
+    return chats
+
+
+async def _measure(args) -> dict:
+    from main import app
+    from signaling import manager, notifications
+
+    chats = _chats(args)
+    recorder = Recorder()
+    if args.layout == "per-chat":
+        peers = [
+            VirtualPeer(app, f"chat-{c}", user_id, recorder)
+            for c, members in enumerate(chats)
+            for user_id in members
+        ]
+    else:
+        peers = [NotificationPeer(app, "", u, recorder) for u in range(1, args.users + 1)]
+
+    rss_before = rss_bytes()
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def connect(peer: VirtualPeer):
+        async with gate:
+            await peer.connect()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect(peer) for peer in peers))
+    connect_s = time.perf_counter() - started
+    rss_connected = rss_bytes()
+
+    invited = random.Random(11).sample(range(len(chats)), min(args.invites, len(chats)))
+    by_user = {peer.user_id: peer for peer in peers} if args.layout != "per-chat" else {}
+    expected = 0
+    for c in invited:
+        call_id = f"chat-{c}"
+        inviter = chats[c][0]
+        recorder.invites[call_id] = time.perf_counter()
+        if args.layout == "per-chat":
+            sender = next(p for p in peers if p.call_id == call_id and p.user_id == inviter)
+            sender.send({"type": "call-invite", "callId": call_id})
+        else:
+            by_user[inviter].send(
+                {"type": "call-invite", "callId": call_id, "targets": chats[c][1:]}
+            )
+        expected += args.members - 1
+        await asyncio.sleep(0)
+    completed = await recorder.wait("call-invite", expected, args.timeout)
+
+    result = {
+        "connections": sum(map(len, manager.active_calls.values()))
+        + sum(map(len, notifications.users.values())),
+        "connect_s": round(connect_s, 3),
+        "rss_mb": round(rss_connected / 2**20, 1),
+        "rss_per_user_kb": round((rss_connected - rss_before) / args.users / 1024, 2),
+        "invites_completed": completed,
+        "invite_latency": latency_summary(recorder.latencies["call-invite"]),
+    }
+    for peer in peers:
+        peer.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.gather(*(peer.task for peer in peers))
+    return result
+
+
+def _run_layout(layout: str, argv: List[str]) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.notification_sockets", *argv, "--layout", layout],
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout
+    return json.loads(out)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="per-chat sockets vs a user channel")
+    parser.add_argument("--users", type=int, default=2000, help="online users")
+    parser.add_argument("--chats", type=int, default=10, help="chats per user")
+    parser.add_argument("--members", type=int, default=2, help="users per chat")
+    parser.add_argument("--invites", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=500, help="connects in flight")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--layout", choices=("per-chat", "user-channel"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.layout:
+        emit("notification_sockets", asyncio.run(_measure(args)))
+        return
+
+    argv = sys.argv[1:]
+    before = _run_layout("per-chat", argv)
+    after = _run_layout("user-channel", argv)
+    params = vars(args)
+    del params["layout"]
+    emit(
+        "notification_sockets",
+        {
+            "params": params,
+            "per_chat": before,
+            "user_channel": after,
+            "connections_saved": before["connections"] - after["connections"],
+            "rss_per_user_saved_kb": round(
+                before["rss_per_user_kb"] - after["rss_per_user_kb"], 2
+            ),
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# rate_limit.py - cost of inbound rate limiting and what it buys under a flood
+#
+#   cd signaling_service && python -m benchmarks.rate_limit --flood 20000
+#
+# "check_us" is the per-message cost of ConnectionLimiter.check on the pass and the
+# throttle path. The flood scenario runs the real app through loadgen's virtual
+# peers: one client of an 8-peer call sends --flood untargeted messages (each one is
+# re-broadcast to 7 peers) while a quiet pair in another call trickles timestamped
+# ICE candidates; it reports the quiet pair's relay latency, how much of the
+# flood got relayed and whether the flooder was cut off, with and without limits.
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import emit, latency_summary
+from benchmarks.loadgen import Recorder, VirtualPeer
+from ratelimit import Buckets, ConnectionLimiter, RateLimitPolicy, parse_limits
+
+
+def _check_us(iterations: int, throttled: bool) -> float:
+    limits = parse_limits("other=1000000000:1000000000" if not throttled else "other=0:1")
+    policy = RateLimitPolicy(connection=limits, call={}, strikes=1e12)
+    limiter = ConnectionLimiter(policy, Buckets(policy.call), 0.0)
+    started = time.process_time()
+    for i in range(iterations):
+        limiter.check("other", i * 1e-6)
+    return round((time.process_time() - started) / iterations * 1e6, 3)
+
+
+async def _flood(app, manager, limits, args, tag: str) -> dict:
+    manager.rate_limits = limits
+    recorder = Recorder()
+    flood_call = [VirtualPeer(app, f"flood-{tag}", 1000 + i, recorder) for i in range(8)]
+    quiet = [VirtualPeer(app, f"quiet-{tag}", 2000 + i, recorder) for i in range(2)]
+    for peer in flood_call + quiet:
+        await peer.connect()
+    flooder, sender, receiver = flood_call[0], quiet[0], quiet[1]
+
+    async def flood():
+        for i in range(args.flood):
+            if flooder.closed:
+                break
+            flooder.send({"type": "chat", "n": i})
+            if i % 50 == 0:
+                await asyncio.sleep(0)
+
+    async def quiet_traffic():
+        for _ in range(args.quiet):
+            candidate = {"candidate": "candidate:1 1 udp 1 203.0.113.7 5000 typ host"}
+            sender.send(
+                {
+                    "type": "ice-candidate",
+                    "candidate": dict(candidate, ts=time.perf_counter()),
+                    "target": receiver.user_id,
+                }
+            )
+            await asyncio.sleep(args.quiet_interval)
+
+    started = time.perf_counter()
+    await asyncio.gather(flood(), quiet_traffic())
+    await recorder.wait("candidates", args.quiet, 30)
+    elapsed = time.perf_counter() - started
+    result = {
+        "duration_s": round(elapsed, 3),
+        "flood_relayed": recorder.received["chat"],
+        "flooder_disconnected": flooder.closed,
+        "quiet_latency": latency_summary(recorder.latencies["ice-candidate"]),
+    }
+    for peer in flood_call + quiet:
+        if not peer.task.done():
+            await peer.leave()
+    return result
+
+
+async def run(args) -> dict:
+    from main import app
+    from signaling import manager
+
+    limits = manager.rate_limits
+    return {
+        "params": vars(args),
+        "check_us": {
+            "pass": _check_us(args.iterations, throttled=False),
+            "throttled": _check_us(args.iterations, throttled=True),
+        },
+        "unlimited": await _flood(app, manager, None, args, "off"),
+        "limited": await _flood(app, manager, limits, args, "on"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="inbound rate limiting under a flood")
+    parser.add_argument("--flood", type=int, default=20000, help="messages from the flooder")
+    parser.add_argument("--quiet", type=int, default=100, help="candidates of the quiet pair")
+    parser.add_argument(
+        "--quiet-interval", type=float, default=0.025, help="within the default ice limit"
+    )
+    parser.add_argument("--iterations", type=int, default=500000)
+    args = parser.parse_args()
+    emit("rate_limit", asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
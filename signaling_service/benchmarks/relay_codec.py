@@ -0,0 +1,111 @@
+# relay_codec.py - per-message CPU of the relay path, before and after Frame/relay_frame
+#
+#   cd signaling_service && python -m benchmarks.relay_codec --peers 8
+#
+# "before" is what signaling_ws used to do: receive_json (json.loads), set "from",
+# then send_json (json.dumps) once per recipient. "after" parses with orjson,
+# splices "from" into the received text and shares one Frame across recipients.
+import argparse
+import json
+import time
+
+from benchmarks.common import emit
+from codec import JSON, relay_frame
+
+
+def sample_sdp(media_sections: int = 2) -> str:
+    """A Chrome-like SDP offer of a few KB."""
+    lines = [
+        "v=0",
+        "o=- 4611731400430051336 2 IN IP4 127.0.0.1",
+        "s=-",
+        "t=0 0",
+        "a=group:BUNDLE 0 1",
+        "a=extmap-allow-mixed",
+        "a=msid-semantic: WMS stream",
+    ]
+    for mid in range(media_sections):
+        kind = "audio" if mid == 0 else "video"
+        lines += [
+            f"m={kind} 9 UDP/TLS/RTP/SAVPF 111 63 103 104 9 0 8 106 105 13 110 112 113 126",
+            "c=IN IP4 0.0.0.0",
+            "a=rtcp:9 IN IP4 0.0.0.0",
+            "a=ice-ufrag:8hhY",
+            "a=ice-pwd:asd88fgpdd777uzjYhagZg3p",
+            "a=ice-options:trickle",
+            "a=fingerprint:sha-256 D2:FA:0E:C3:22:59:5E:14:95:69:92:3D:13:B4:84:24:"
+            "2C:C2:A2:C0:3E:FD:34:8E:5E:EA:6F:AF:52:CE:E6:0F",
+            "a=setup:actpass",
+            f"a=mid:{mid}",
+            "a=sendrecv",
+            "a=rtcp-mux",
+        ]
+        for pt in range(96, 124):
+            lines.append(f"a=rtpmap:{pt} VP8/90000")
+            lines.append(f"a=rtcp-fb:{pt} nack pli")
+            lines.append(f"a=fmtp:{pt} apt=96;profile-level-id=42e01f")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def sample_messages() -> dict:
+    offer = {
+        "type": "offer",
+        "sdp": sample_sdp(),
+        "target": 2,
+        "userData": {"userId": 1, "username": "alice"},
+    }
+    ice = {
+        "type": "ice-candidate",
+        "candidate": {
+            "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.7 53462 typ "
+            "srflx raddr 0.0.0.0 rport 0 generation 0 ufrag 8hhY network-cost 999",
+            "sdpMid": "0",
+            "sdpMLineIndex": 0,
+        },
+        "target": 2,
+        "userData": {"userId": 1, "username": "alice"},
+    }
+    return {"offer": json.dumps(offer), "ice-candidate": json.dumps(ice)}
+
+
+def before(raw: str, recipients: int) -> None:
+    data = json.loads(raw)
+    if "from" not in data:
+        data["from"] = 1
+    for _ in range(recipients):
+        json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def after(raw: str, recipients: int) -> None:
+    frame = relay_frame(raw, JSON.decode(raw), 1)
+    for _ in range(recipients):
+        frame.encode(JSON)
+
+
+def _per_message_us(fn, raw: str, recipients: int, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(raw, recipients)
+    return round((time.process_time() - started) / iterations * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relay path CPU per message")
+    parser.add_argument("--peers", type=int, default=8, help="group call size")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    results = {"params": vars(args)}
+    for name, raw in sample_messages().items():
+        # a targeted relay has one recipient, a group broadcast has peers - 1
+        for mode, recipients in (("direct", 1), ("broadcast", args.peers - 1)):
+            results[f"{name}/{mode}"] = {
+                "bytes": len(raw),
+                "before_us": _per_message_us(before, raw, recipients, args.iterations),
+                "after_us": _per_message_us(after, raw, recipients, args.iterations),
+            }
+    emit("relay_codec", results)
+
+
+if __name__ == "__main__":
+    main()
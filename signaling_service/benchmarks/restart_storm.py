@@ -0,0 +1,202 @@
+# restart_storm.py - the reconnect storm after a signaling crash, with and without a snapshot
+#
+#   cd signaling_service && python -m benchmarks.restart_storm --calls 100 --peers 8
+#
+# A real `uvicorn main:app` is started on a free port (admission control and rate
+# limits off) and --calls calls of --peers clients join it over real websockets.
+# Once the registry snapshot has been written the server is killed with SIGKILL and
+# started again on the same port; every client reconnects the moment it is up, with
+# ?resume=<token> as the frontend does. Per mode ("off": no SIGNALING_SNAPSHOT_PATH,
+# the restarted node knows nobody; "on": it restores the snapshot) it reports how
+# many clients resumed or had to rejoin, reconnect latency from restart, membership
+# frames delivered during the storm (peer-list, new-peer, peer-delta, ...) and the
+# server CPU seconds it took to settle. Without a snapshot every rejoin is announced
+# to everyone already back in its call: O(peers²) frames per call.
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.common import emit, latency_summary
+from benchmarks.worker_scaling import _free_port, _wait_ready
+
+MEMBERSHIP = ("peer-list", "session-resumed", "new-peer", "peer-disconnected", "peer-delta")
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _start(port: int, env: dict) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+    _wait_ready(port)
+    return server
+
+
+class Storm:
+    """State shared by every simulated client."""
+
+    def __init__(self, peers: int):
+        self.phase = "join"
+        self.received = {"join": Counter(), "storm": Counter()}
+        self.joined = 0
+        self.back = Counter()
+        self.reconnects = []
+        self.up = asyncio.Event()
+        self.restarted_at = 0.0
+        self.peers = peers
+
+
+async def _client(port: int, call_id: str, user_id: int, args, storm: Storm) -> None:
+    import websockets
+
+    query = f"features={args.features}" if args.features else ""
+    token = None
+    while True:
+        if storm.phase == "storm":
+            await storm.up.wait()
+        url = f"ws://127.0.0.1:{port}/ws/signaling/{call_id}/{user_id}?{query}"
+        if token is not None and storm.phase == "storm":
+            url += f"&resume={token}"
+        try:
+            async with websockets.connect(url, max_queue=None, open_timeout=30) as ws:
+                async for raw in ws:
+                    message = json.loads(raw)
+                    kind = message.get("type")
+                    storm.received[storm.phase][kind] += 1
+                    if kind == "ping":
+                        await ws.send('{"type": "pong"}')
+                    elif kind == "peer-delta":
+                        await ws.send(json.dumps({"type": "peer-ack", "version": message["version"]}))
+                    elif kind in ("peer-list", "session-resumed"):
+                        token = message["resumeToken"]
+                        if storm.phase == "join":
+                            storm.joined += 1
+                        else:
+                            storm.back[kind] += 1
+                            storm.reconnects.append(time.perf_counter() - storm.restarted_at)
+        except (OSError, websockets.ConnectionClosed, asyncio.TimeoutError):
+            pass
+        if storm.phase == "join":
+            # dropped before the crash: only the crash is measured
+            return
+        await asyncio.sleep(0.05)
+
+
+async def _settle(storm: Storm, expected: int, timeout: float) -> bool:
+    """Wait until `expected` clients are back and no membership frame arrived for a while."""
+    deadline = time.perf_counter() + timeout
+    last, quiet_since = None, time.perf_counter()
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0.1)
+        current = sum(storm.received[storm.phase][k] for k in MEMBERSHIP)
+        if current != last:
+            last, quiet_since = current, time.perf_counter()
+        back = sum(storm.back.values()) if storm.phase == "storm" else storm.joined
+        if back >= expected and time.perf_counter() - quiet_since > 0.5:
+            return True
+    return False
+
+
+async def _measure(snapshot: bool, args) -> dict:
+    port = _free_port()
+    path = os.path.join(tempfile.mkdtemp(), "registry.jsonl")
+    env = dict(
+        os.environ,
+        SIGNALING_SHED_MAX_LAG="0",
+        SIGNALING_SHED_MAX_QUEUED="0",
+        SIGNALING_RATE_LIMITS="",
+        SIGNALING_CALL_RATE_LIMITS="",
+        SIGNALING_BUS_URL="",
+        SIGNALING_SNAPSHOT_PATH=path if snapshot else "",
+        SIGNALING_SNAPSHOT_INTERVAL=str(args.interval),
+    )
+    loop = asyncio.get_running_loop()
+    server = await loop.run_in_executor(None, _start, port, env)
+    storm = Storm(args.peers)
+    expected = args.calls * args.peers
+    clients = []
+    try:
+        for c in range(args.calls):
+            for user_id in range(1, args.peers + 1):
+                clients.append(
+                    asyncio.create_task(_client(port, f"storm-{c}", user_id, args, storm))
+                )
+            await asyncio.sleep(0)
+        if not await _settle(storm, expected, args.timeout):
+            raise SystemExit(f"only {storm.joined}/{expected} clients joined")
+        # let the snapshot catch up with the last joins, then crash
+        await asyncio.sleep(args.interval * 2)
+        storm.phase = "storm"
+        server.send_signal(signal.SIGKILL)
+        await loop.run_in_executor(None, server.wait)
+
+        server = await loop.run_in_executor(None, _start, port, env)
+        cpu_before = _cpu_seconds(server.pid)
+        storm.restarted_at = time.perf_counter()
+        storm.up.set()
+        settled = await _settle(storm, expected, args.timeout)
+        elapsed = time.perf_counter() - storm.restarted_at
+        cpu = _cpu_seconds(server.pid) - cpu_before
+    finally:
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        server.terminate()
+        await loop.run_in_executor(None, server.wait)
+    received = storm.received["storm"]
+    return {
+        "settled": settled,
+        "resumed": storm.back["session-resumed"],
+        "rejoined": storm.back["peer-list"],
+        "reconnect": latency_summary(storm.reconnects),
+        "membership_frames": {k: received[k] for k in MEMBERSHIP if received[k]},
+        "membership_frames_total": sum(received[k] for k in MEMBERSHIP),
+        "server_cpu_s": round(cpu, 3),
+        "settle_s": round(elapsed, 3),
+        "snapshot_bytes": os.path.getsize(path) if snapshot and os.path.exists(path) else 0,
+    }
+
+
+async def run(args) -> dict:
+    results = {"params": vars(args)}
+    for mode in args.modes.split(","):
+        results[mode] = await _measure(mode == "on", args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="reconnect storm after a signaling crash")
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--peers", type=int, default=8, help="clients per call")
+    parser.add_argument("--features", default="", help="e.g. peer-delta")
+    parser.add_argument("--modes", default="off,on", help="snapshot off and/or on")
+    parser.add_argument("--interval", type=float, default=0.5, help="snapshot interval")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    emit("restart_storm", asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
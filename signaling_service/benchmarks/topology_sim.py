@@ -0,0 +1,144 @@
+# topology_sim.py - full mesh vs the relay trees topology.py plans for large calls
+#
+#   cd signaling_service && python -m benchmarks.topology_sim --sizes 4,8,16,32,64,128
+#
+# No sockets: peers with random capacity hints (--capacities, "hint:share,...") join a
+# TopologyPlan one by one. For each call size, reported for the full mesh and the
+# plan: peer connections in the call, the most any one peer holds, peers holding more
+# than their hint, media streams the busiest peer uploads (a relay forwards what it
+# receives), and hops between every pair of peers. Then --churn random leaves and
+# joins at that size: how many peers get a new plan per change (a mesh tells
+# everyone else about each one) and the CPU time of one update.
+import argparse
+import random
+import time
+from collections import deque
+from typing import Dict, List
+
+from benchmarks.common import emit
+from topology import TopologyPlan, TopologyPolicy
+
+
+def _capacities(spec: str):
+    hints, weights = [], []
+    for item in spec.split(","):
+        hint, _, share = item.partition(":")
+        hints.append(int(hint))
+        weights.append(float(share or 1))
+    return hints, weights
+
+
+def _hops(links: Dict[int, set]) -> List[int]:
+    """Shortest path length of every ordered pair, by BFS from each peer."""
+    lengths = []
+    for source in links:
+        seen = {source: 0}
+        queue = deque([source])
+        while queue:
+            peer = queue.popleft()
+            for other in links[peer]:
+                if other not in seen:
+                    seen[other] = seen[peer] + 1
+                    queue.append(other)
+        lengths.extend(d for peer, d in seen.items() if peer != source)
+        # unreachable pairs would show up as missing lengths
+        if len(seen) != len(links):
+            lengths.extend([-1] * (len(links) - len(seen)))
+    return lengths
+
+
+def _uplink(plan: TopologyPlan, links: Dict[int, set]) -> Dict[int, int]:
+    """Streams each peer sends: its own to every link, plus what it forwards."""
+    size = len(plan)
+    if not plan.tree:
+        return {peer: size - 1 for peer in links}
+    streams = {}
+    for peer, peers in links.items():
+        if peer in plan.relays:
+            subtree = 1 + len(plan.children[peer])
+            # its leaves get everyone but themselves, other relays get its subtree
+            streams[peer] = len(plan.children[peer]) * (size - 1) + (
+                len(plan.relays) - 1
+            ) * subtree
+        else:
+            streams[peer] = len(peers)
+    return streams
+
+
+def _describe(plan: TopologyPlan) -> dict:
+    links = {peer: plan.links(peer) for peer in plan.capacity}
+    hops = _hops(links)
+    uplink = _uplink(plan, links)
+    return {
+        "connections": sum(len(p) for p in links.values()) // 2,
+        "max_per_peer": max(len(p) for p in links.values()),
+        "over_capacity": sum(1 for peer, p in links.items() if len(p) > plan.capacity[peer]),
+        "max_uplink_streams": max(uplink.values()),
+        "relays": len(plan.relays),
+        "hops_avg": round(sum(hops) / len(hops), 3) if hops else 0.0,
+        "hops_max": max(hops) if hops else 0,
+        "unreachable": hops.count(-1),
+    }
+
+
+def _simulate(size: int, args, rng: random.Random) -> dict:
+    hints, weights = _capacities(args.capacities)
+    policy = TopologyPolicy(min_peers=args.min_peers)
+    mesh = TopologyPlan(TopologyPolicy(min_peers=0))
+    plan = TopologyPlan(policy)
+    for peer in range(1, size + 1):
+        capacity = rng.choices(hints, weights)[0]
+        mesh.add(peer, capacity)
+        plan.add(peer, capacity)
+        plan.settle()
+
+    result = {"mesh": _describe(mesh), "plan": _describe(plan), "tree": plan.tree}
+
+    replanned, cpu = [], 0.0
+    present = list(plan.capacity)
+    next_peer = size + 1
+    for event in range(args.churn):
+        started = time.process_time()
+        if event % 2 == 0:
+            leaving = present.pop(rng.randrange(len(present)))
+            changed = plan.remove(leaving) | plan.settle()
+        else:
+            present.append(next_peer)
+            changed = plan.add(next_peer, rng.choices(hints, weights)[0]) | plan.settle()
+            next_peer += 1
+        cpu += time.process_time() - started
+        replanned.append(len(changed))
+    if args.churn:
+        result["churn"] = {
+            "events": args.churn,
+            "mesh_notified_per_event": size - 1,
+            "replanned_avg": round(sum(replanned) / len(replanned), 2),
+            "replanned_max": max(replanned),
+            "update_us": round(cpu / args.churn * 1e6, 2),
+        }
+        result["after_churn"] = _describe(plan)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relay tree vs full mesh for large calls")
+    parser.add_argument("--sizes", default="4,8,16,32,64,128")
+    parser.add_argument(
+        "--capacities",
+        default="3:0.5,6:0.35,16:0.15",
+        help="capacity hints and their share, e.g. phones 3, laptops 6, desktops 16",
+    )
+    parser.add_argument("--min-peers", type=int, default=6)
+    parser.add_argument("--churn", type=int, default=1000, help="leave/join events per size")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = {"params": vars(args)}
+    for size in (int(s) for s in args.sizes.split(",")):
+        results[str(size)] = _simulate(size, args, rng)
+    emit("topology_sim", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# wire_codecs.py - JSON vs MessagePack frame size and encode/decode cost
+#
+#   cd signaling_service && python -m benchmarks.wire_codecs
+#
+# Uses the SDP/ICE samples from relay_codec plus the system messages of a join,
+# i.e. what one peer of a mesh call sends and receives while connecting.
+import argparse
+import json
+import time
+
+from benchmarks.common import emit
+from benchmarks.relay_codec import sample_messages
+from codec import JSON, MSGPACK
+
+
+def trace() -> dict:
+    samples = {name: json.loads(raw) for name, raw in sample_messages().items()}
+    answer = dict(samples["offer"], type="answer", target=1, **{"from": 2})
+    return {
+        "offer": dict(samples["offer"], **{"from": 1}),
+        "answer": answer,
+        "ice-candidate": dict(samples["ice-candidate"], **{"from": 1}),
+        "peer-list": {"type": "peer-list", "peers": list(range(1, 9)), "from": "system"},
+        "new-peer": {"type": "new-peer", "peerId": 9, "from": "system"},
+    }
+
+
+def _us(fn, arg, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(arg)
+    return round((time.process_time() - started) / iterations * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wire codec comparison")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument(
+        "--ice-per-peer", type=int, default=12, help="candidates in the call trace"
+    )
+    args = parser.parse_args()
+
+    results = {"params": vars(args)}
+    totals = {"json": 0, "msgpack": 0}
+    counts = {"offer": 1, "answer": 1, "ice-candidate": args.ice_per_peer}
+    for name, message in trace().items():
+        row = {}
+        for codec in (JSON, MSGPACK):
+            payload = codec.encode(message)
+            size = len(payload.encode() if isinstance(payload, str) else payload)
+            totals[codec.name] += size * counts.get(name, 1)
+            row[codec.name] = {
+                "bytes": size,
+                "encode_us": _us(codec.encode, message, args.iterations),
+                "decode_us": _us(codec.decode, payload, args.iterations),
+            }
+        results[name] = row
+    results["call_trace_bytes"] = totals
+    emit("wire_codecs", results)
+
+
+if __name__ == "__main__":
+    main()
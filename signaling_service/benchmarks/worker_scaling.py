@@ -0,0 +1,180 @@
+# worker_scaling.py - relay throughput of one host as dispatcher workers are added
+#
+#   cd signaling_service && python -m benchmarks.worker_scaling --workers 1,2,4 --calls 200
+#
+# For each worker count a real `python -m dispatcher` is started on a free port
+# (admission control and rate limits off) and --clients client processes connect
+# --calls calls of two peers over real websockets. Every peer keeps --inflight ICE
+# candidates in flight to its partner: each one it receives is answered with a new
+# one, so the server is always busy and throughput is what it can relay. Reported
+# per worker count: candidates relayed per second over --duration seconds, their
+# p50/p99 latency, and the speedup over the first count. Clients share the host's
+# cores with the workers, so give the run more cores than workers (cores reported).
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import emit, latency_summary
+from benchmarks.relay_codec import sample_messages
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1.0) as s:
+                s.sendall(b"GET /ready HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+                if s.recv(64).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"dispatcher on port {port} never became ready")
+
+
+async def _peer(url: str, partner: int, args, clock: dict) -> None:
+    import websockets
+
+    template = json.loads(sample_messages()["ice-candidate"])
+    template["target"] = partner
+
+    def candidate() -> str:
+        return json.dumps(
+            dict(template, candidate=dict(template["candidate"], ts=time.perf_counter()))
+        )
+
+    async with websockets.connect(url, max_queue=None) as ws:
+        while json.loads(await ws.recv()).get("type") != "peer-list":
+            pass
+        clock["connected"] += 1
+        await clock["go"].wait()
+        warm_until = clock["start"] + args.warmup
+        stop_at = warm_until + args.duration
+        for _ in range(args.inflight):
+            await ws.send(candidate())
+        while True:
+            message = json.loads(await ws.recv())
+            if message.get("type") != "ice-candidate":
+                continue
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            if now >= warm_until:
+                clock["relayed"] += 1
+                clock["latencies"].append(now - message["candidate"]["ts"])
+            await ws.send(candidate())
+
+
+async def _client(port: int, first_call: int, calls: int, start_at: float, args) -> dict:
+    clock = {"connected": 0, "relayed": 0, "latencies": [], "go": asyncio.Event()}
+    tasks = [
+        asyncio.create_task(
+            _peer(f"ws://127.0.0.1:{port}/ws/signaling/scale-{c}/{user}", partner, args, clock)
+        )
+        for c in range(first_call, first_call + calls)
+        for user, partner in ((1, 2), (2, 1))
+    ]
+    # every client process starts sending at the same wall-clock moment
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    if clock["connected"] < len(tasks):
+        failed = [t.exception() for t in tasks if t.done() and t.exception()]
+        raise RuntimeError(
+            f"{clock['connected']}/{len(tasks)} peers connected in time: {failed[:1]}"
+        )
+    clock["start"] = time.perf_counter()
+    clock["go"].set()
+    await asyncio.wait(tasks, timeout=args.warmup + args.duration + 10)
+    for task in tasks:
+        task.cancel()
+    return {"relayed": clock["relayed"], "latencies": clock["latencies"]}
+
+
+def _run_client(job) -> dict:
+    port, first_call, calls, start_at, args = job
+    return asyncio.run(_client(port, first_call, calls, start_at, args))
+
+
+def _measure(workers: int, args) -> dict:
+    port = _free_port()
+    env = dict(
+        os.environ,
+        SIGNALING_SHED_MAX_LAG="0",
+        SIGNALING_SHED_MAX_QUEUED="0",
+        SIGNALING_RATE_LIMITS="",
+        SIGNALING_CALL_RATE_LIMITS="",
+        SIGNALING_BUS_URL="",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "dispatcher",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(port)
+        share = -(-args.calls // args.clients)
+        start_at = time.time() + args.connect_time
+        jobs = [
+            (port, i * share, min(share, args.calls - i * share), start_at, args)
+            for i in range(args.clients)
+            if i * share < args.calls
+        ]
+        with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+            results = pool.map(_run_client, jobs)
+    finally:
+        server.terminate()
+        server.wait()
+    latencies = [sample for r in results for sample in r["latencies"]]
+    relayed = sum(r["relayed"] for r in results)
+    return {
+        "relayed_per_s": round(relayed / args.duration),
+        "latency": latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relay throughput from 1 to N workers")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to compare")
+    parser.add_argument("--calls", type=int, default=200, help="two-peer calls")
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--inflight", type=int, default=4, help="candidates per peer")
+    parser.add_argument("--connect-time", type=float, default=10.0, help="seconds to connect")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    results = {"params": vars(args), "cores": os.cpu_count()}
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        result = _measure(workers, args)
+        baseline = baseline or result["relayed_per_s"] or 1
+        result["speedup"] = round(result["relayed_per_s"] / baseline, 2)
+        results[str(workers)] = result
+    emit("worker_scaling", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# bus.py - inter-node message bus so one call can span several signaling processes
+import asyncio
+import hashlib
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional, Set
+import logging
+
+import aio_pika
+import orjson
+
+logger = logging.getLogger(__name__)
+
+BusHandler = Callable[[dict], Awaitable[None]]
+
+
+def _encode(envelope: dict) -> bytes:
+    # orjson like the websocket codecs; non-str keys (msgpack clients can send
+    # them) are stringified the way json.dumps did
+    return orjson.dumps(envelope, option=orjson.OPT_NON_STR_KEYS)
+
+
+def call_key(call_id: str) -> str:
+    """Routing key of a call's envelopes.
+
+    Call ids come straight from the URL, so they are hashed: a "#", "*" or "." in one
+    can't widen or split a topic binding, and no call id can land on a user's key.
+    """
+    return f"call.{hashlib.sha1(call_id.encode()).hexdigest()}"
+
+
+def user_key(user_id: int) -> str:
+    """Routing key of a user's notification envelopes."""
+    return f"user.{int(user_id)}"
+
+
+class SignalingBus(ABC):
+    """Routes envelopes between nodes by call_id, and notifications by user id.
+
+    A node subscribes to the call_ids it hosts at least one peer of (and the users
+    it holds a notification socket of) and only receives envelopes published for
+    those. Envelopes published by a node are never delivered back to it.
+    Implementations only move envelopes between routing keys; the keys are built here.
+    """
+
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+
+    @abstractmethod
+    async def start(self, handler: BusHandler) -> None: ...
+
+    @abstractmethod
+    async def _bind(self, key: str) -> None: ...
+
+    @abstractmethod
+    async def _unbind(self, key: str) -> None: ...
+
+    @abstractmethod
+    async def _send(self, key: str, envelope: dict) -> None: ...
+
+    @abstractmethod
+    async def close(self) -> None: ...
+
+    async def subscribe(self, call_id: str) -> None:
+        await self._bind(call_key(call_id))
+
+    async def unsubscribe(self, call_id: str) -> None:
+        await self._unbind(call_key(call_id))
+
+    async def publish(self, call_id: str, envelope: dict) -> None:
+        await self._send(call_key(call_id), {**envelope, "callId": call_id})
+
+    async def subscribe_user(self, user_id: int) -> None:
+        await self._bind(user_key(user_id))
+
+    async def unsubscribe_user(self, user_id: int) -> None:
+        await self._unbind(user_key(user_id))
+
+    async def publish_user(self, user_id: int, envelope: dict) -> None:
+        await self._send(user_key(user_id), envelope)
+
+
+class InMemoryBroker:
+    """Process-local stand-in for the RabbitMQ exchange, shared by InMemorySignalingBus nodes."""
+
+    def __init__(self):
+        self.subscriptions: Dict[str, Set["InMemorySignalingBus"]] = {}
+
+
+class InMemorySignalingBus(SignalingBus):
+    """Bus for tests and benchmarks: several managers in one process, no RabbitMQ."""
+
+    def __init__(self, broker: InMemoryBroker, node_id: Optional[str] = None):
+        super().__init__(node_id)
+        self.broker = broker
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._consumer: Optional[asyncio.Task] = None
+
+    async def start(self, handler: BusHandler) -> None:
+        async def consume():
+            while True:
+                body = await self._inbox.get()
+                try:
+                    await handler(orjson.loads(body))
+                except Exception:
+                    logger.exception("bus handler failed")
+
+        self._consumer = asyncio.create_task(consume())
+
+    async def _bind(self, key: str) -> None:
+        self.broker.subscriptions.setdefault(key, set()).add(self)
+
+    async def _unbind(self, key: str) -> None:
+        nodes = self.broker.subscriptions.get(key)
+        if nodes is not None:
+            nodes.discard(self)
+            if not nodes:
+                self.broker.subscriptions.pop(key, None)
+
+    async def _send(self, key: str, envelope: dict) -> None:
+        # serialize like the real transport would, so the stand-in catches the same bugs
+        body = _encode({**envelope, "node": self.node_id})
+        for node in self.broker.subscriptions.get(key, ()):
+            if node is not self:
+                node._inbox.put_nowait(body)
+
+    async def close(self) -> None:
+        for key in list(self.broker.subscriptions):
+            await self._unbind(key)
+        if self._consumer is not None:
+            self._consumer.cancel()
+
+
+class RabbitMQSignalingBus(SignalingBus):
+    """Topic exchange `signaling`, keys `call.<sha1>` / `user.<id>`, one exclusive queue per node."""
+
+    EXCHANGE = "signaling"
+
+    def __init__(self, url: str, node_id: Optional[str] = None):
+        super().__init__(node_id)
+        self.url = url
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self._exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self._queue: Optional[aio_pika.abc.AbstractQueue] = None
+
+    async def start(self, handler: BusHandler) -> None:
+        self._connection = await aio_pika.connect_robust(self.url)
+        channel = await self._connection.channel()
+        self._exchange = await channel.declare_exchange(
+            self.EXCHANGE, aio_pika.ExchangeType.TOPIC
+        )
+        self._queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+
+        async def on_message(message: aio_pika.abc.AbstractIncomingMessage):
+            async with message.process():
+                envelope = orjson.loads(message.body)
+                if envelope.get("node") == self.node_id:
+                    return
+                try:
+                    await handler(envelope)
+                except Exception:
+                    logger.exception("bus handler failed")
+
+        await self._queue.consume(on_message)
+        logger.info(f"signaling bus node {self.node_id} connected")
+
+    async def _bind(self, key: str) -> None:
+        await self._queue.bind(self._exchange, routing_key=key)
+
+    async def _unbind(self, key: str) -> None:
+        await self._queue.unbind(self._exchange, routing_key=key)
+
+    async def _send(self, key: str, envelope: dict) -> None:
+        body = _encode({**envelope, "node": self.node_id})
+        await self._exchange.publish(aio_pika.Message(body=body), routing_key=key)
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
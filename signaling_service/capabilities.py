@@ -0,0 +1,111 @@
+# capabilities.py - codecs every member of a call can use, and how often offers repeat
+from collections import Counter
+from typing import Dict, List, Set
+
+# clients list this in ?features= to publish a "capabilities" message first thing and
+# get "codec-intersection" pushes; they are announced to the call once it arrives
+CAPABILITIES_FEATURE = "capabilities"
+
+MEDIA_KINDS = ("audio", "video")
+
+
+class CallCapabilities:
+    """Codec intersection and offer bookkeeping of one call.
+
+    Every member that published capabilities adds one to `counts` for each of its
+    codecs and its preference position to `ranks`, so a publish or a leave costs
+    the size of one member's list, never a pass over the call's members. A codec is
+    in the intersection when its count equals the number of publishers; the
+    intersection is ordered by summed preference (the call's consensus). It is
+    recomputed once per publish or leave, a single pass over the distinct codecs,
+    and kept in `shared` for the change check and every "codec-intersection" built
+    from it. `version` goes up whenever it changes.
+
+    `offered` maps each sender to the peers it has sent an offer to; another offer
+    along the same direction is a renegotiation.
+    """
+
+    __slots__ = ("members", "counts", "ranks", "shared", "version", "offered")
+
+    def __init__(self):
+        # user_id -> kind -> its codecs, most preferred first
+        self.members: Dict[int, Dict[str, List[str]]] = {}
+        self.counts: Dict[str, Counter] = {kind: Counter() for kind in MEDIA_KINDS}
+        self.ranks: Dict[str, Counter] = {kind: Counter() for kind in MEDIA_KINDS}
+        # the current intersection, as of the last publish or leave
+        self.shared: Dict[str, List[str]] = {kind: [] for kind in MEDIA_KINDS}
+        self.version = 0
+        self.offered: Dict[int, Set[int]] = {}
+
+    def intersection(self) -> Dict[str, List[str]]:
+        publishers = len(self.members)
+        result = {}
+        for kind in MEDIA_KINDS:
+            ranks = self.ranks[kind]
+            shared = [c for c, n in self.counts[kind].items() if n == publishers]
+            result[kind] = sorted(shared, key=lambda c: (ranks[c], c))
+        return result
+
+    def publish(self, user_id: int, codecs: Dict[str, List[str]]) -> bool:
+        """Replace a member's codecs; True if the intersection changed."""
+        self._withdraw(user_id)
+        published = {}
+        for kind in MEDIA_KINDS:
+            # case-insensitive like SDP rtpmap names, first mention wins
+            names = list(dict.fromkeys(name.lower() for name in codecs.get(kind, ())))
+            published[kind] = names
+            self.counts[kind].update(names)
+            for position, name in enumerate(names):
+                self.ranks[kind][name] += position
+        self.members[user_id] = published
+        return self._changed()
+
+    def remove(self, user_id: int) -> bool:
+        """A member left: drop its codecs and offers; True if the intersection changed."""
+        self.offered.pop(user_id, None)
+        for targets in self.offered.values():
+            targets.discard(user_id)
+        if user_id not in self.members:
+            return False
+        self._withdraw(user_id)
+        return self._changed()
+
+    def offer(self, sender: int, target: int) -> bool:
+        """Record an offer; True if `sender` had already sent `target` one."""
+        targets = self.offered.get(sender)
+        if targets is None:
+            targets = self.offered[sender] = set()
+        elif target in targets:
+            return True
+        targets.add(target)
+        return False
+
+    def message(self) -> dict:
+        return {
+            "type": "codec-intersection",
+            **self.shared,
+            "publishers": len(self.members),
+            "version": self.version,
+            "from": "system",
+        }
+
+    def _withdraw(self, user_id: int) -> None:
+        published = self.members.pop(user_id, None)
+        if published is None:
+            return
+        for kind, names in published.items():
+            counts, ranks = self.counts[kind], self.ranks[kind]
+            for position, name in enumerate(names):
+                counts[name] -= 1
+                ranks[name] -= position
+                if counts[name] <= 0:
+                    del counts[name]
+                    del ranks[name]
+
+    def _changed(self) -> bool:
+        shared = self.intersection()
+        if shared == self.shared:
+            return False
+        self.shared = shared
+        self.version += 1
+        return True
@@ -0,0 +1,91 @@
+# coalescing.py - batch trickle ICE candidates per (sender, target) pair
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from outbound import PeerConnection
+
+# clients list this in ?features= to receive "ice-candidates" batch frames
+ICE_BATCH_FEATURE = "ice-batch"
+
+
+class _PendingBatch:
+    __slots__ = ("target", "candidates", "timer")
+
+    def __init__(self, target: PeerConnection):
+        self.target = target
+        self.candidates: List[dict] = []
+        self.timer = None
+
+
+class IceCoalescer:
+    """Buffers ICE candidates for a short window and delivers them as one frame.
+
+    Only used for targets that negotiated ICE_BATCH_FEATURE; everyone else gets the
+    usual one-frame-per-candidate relay. A batch is flushed when its window expires,
+    when the sender relays anything other than an ICE candidate (so an offer/answer
+    never overtakes candidates sent before it), or when the sender leaves.
+    """
+
+    def __init__(self, manager, window: float = 0.02):
+        self.manager = manager
+        self.window = window
+        self._pending: Dict[Tuple[str, int, int], _PendingBatch] = {}
+        self.frames_saved = 0
+        self.batches_sent = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def add(self, sender: int, target: PeerConnection, message: dict) -> None:
+        """Buffer an ice-candidate message from `sender` addressed to `target`."""
+        key = (target.call_id, sender, target.user_id)
+        batch = self._pending.get(key)
+        if batch is None or batch.target is not target:
+            if batch is not None:
+                self._flush(key)
+            batch = self._pending[key] = _PendingBatch(target)
+            batch.timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush, key
+            )
+        batch.candidates.append(message["candidate"])
+
+    def flush_sender(
+        self, call_id: str, sender: int, target: Optional[int] = None
+    ) -> None:
+        """Deliver what `sender` has buffered (for one target, or all of them) right now."""
+        if not self._pending:
+            return
+        if target is not None:
+            self._flush((call_id, sender, target))
+            return
+        for key in [k for k in self._pending if k[0] == call_id and k[1] == sender]:
+            self._flush(key)
+
+    def _flush(self, key: Tuple[str, int, int]) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        if batch.target.closed:
+            return
+        call_id, sender, target = key
+        candidates = batch.candidates
+        if len(candidates) == 1:
+            message = {
+                "type": "ice-candidate",
+                "candidate": candidates[0],
+                "target": target,
+                "from": sender,
+            }
+        else:
+            message = {
+                "type": "ice-candidates",
+                "candidates": candidates,
+                "target": target,
+                "from": sender,
+            }
+            self.frames_saved += len(candidates) - 1
+            self.batches_sent += 1
+            self.manager.stats(call_id).frames_saved += len(candidates) - 1
+        self.manager.deliver(batch.target, message)
@@ -0,0 +1,146 @@
+# codec.py - wire encodings for signaling frames
+import struct
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import msgpack
+import orjson
+
+Payload = Union[str, bytes]
+
+
+class DecodeError(ValueError):
+    """A frame that could not be decoded with the connection's codec."""
+
+
+class Codec:
+    name = ""
+    # binary codecs are sent/received as websocket binary frames
+    binary = False
+
+    def decode(self, payload: Payload) -> Any:
+        raise NotImplementedError
+
+    def encode(self, message: Any) -> Payload:
+        raise NotImplementedError
+
+    def stamp_sender(self, payload: Payload, sender: int) -> Optional[Payload]:
+        """Insert "from": sender into an encoded object without re-encoding it.
+
+        Returns None when the payload can't be patched in place.
+        """
+        return None
+
+
+class JsonCodec(Codec):
+    name = "json"
+
+    def decode(self, payload: Payload) -> Any:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            raise DecodeError(f"invalid json: {e}") from e
+
+    def encode(self, message: Any) -> str:
+        return orjson.dumps(message).decode()
+
+    def stamp_sender(self, payload: Payload, sender: int) -> Optional[str]:
+        if not isinstance(payload, str):
+            return None
+        body = payload.lstrip()[1:].lstrip()
+        if body.startswith("}"):
+            return '{"from":%d}' % sender
+        return '{"from":%d,' % sender + body
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    binary = True
+
+    def decode(self, payload: Payload) -> Any:
+        try:
+            return msgpack.unpackb(payload, raw=False)
+        except Exception as e:
+            raise DecodeError(f"invalid msgpack: {e}") from e
+
+    def encode(self, message: Any) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def stamp_sender(self, payload: Payload, sender: int) -> Optional[bytes]:
+        # bump the map length in the header and put the new pair right after it
+        if not isinstance(payload, bytes) or not payload:
+            return None
+        head = payload[0]
+        if 0x80 <= head < 0x8F:
+            header, rest = bytes([head + 1]), payload[1:]
+        elif head == 0x8F:
+            header, rest = b"\xde\x00\x10", payload[1:]
+        elif head == 0xDE and len(payload) >= 3:
+            (size,) = struct.unpack(">H", payload[1:3])
+            if size == 0xFFFF:
+                return None
+            header, rest = b"\xde" + struct.pack(">H", size + 1), payload[3:]
+        else:
+            return None
+        return header + msgpack.packb("from") + msgpack.packb(sender) + rest
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+
+# websocket subprotocols a client may offer, in server preference order
+SUBPROTOCOLS: Dict[str, Codec] = {
+    "signaling.msgpack": MSGPACK,
+    "signaling.json": JSON,
+}
+
+
+def negotiate(offered: List[str]) -> Tuple[Codec, Optional[str]]:
+    """Pick the codec for a connection and the subprotocol to echo back on accept.
+
+    Clients that offer none of SUBPROTOCOLS get plain JSON with no subprotocol.
+    """
+    for subprotocol, codec in SUBPROTOCOLS.items():
+        if subprotocol in offered:
+            return codec, subprotocol
+    return JSON, None
+
+
+class Frame:
+    """An outbound message, encoded at most once per codec however many peers it goes to.
+
+    `message` stays available as a dict for in-process consumers (lane selection,
+    the bus, coalescing); encodings are produced lazily on first write and shared.
+    """
+
+    __slots__ = ("message", "type", "_encoded")
+
+    def __init__(self, message: dict, encoded: Optional[Dict[str, Payload]] = None):
+        self.message = message
+        self.type = message.get("type")
+        self._encoded = encoded
+
+    def encode(self, codec: Codec) -> Payload:
+        encoded = self._encoded
+        if encoded is None:
+            encoded = self._encoded = {}
+        payload = encoded.get(codec.name)
+        if payload is None:
+            payload = encoded[codec.name] = codec.encode(self.message)
+        return payload
+
+
+def as_frame(message: Union[dict, Frame]) -> Frame:
+    return message if isinstance(message, Frame) else Frame(message)
+
+
+def relay_frame(payload: Payload, message: dict, sender: int, codec: Codec = JSON) -> Frame:
+    """Frame for relaying a client message as received, stamped with its sender.
+
+    Peers using the sender's codec get the client's own payload; when it carries no
+    "from" the field is patched in rather than re-encoding the object.
+    """
+    if "from" in message:
+        return Frame(message, {codec.name: payload})
+    message["from"] = sender
+    stamped = codec.stamp_sender(payload, sender)
+    return Frame(message, {codec.name: stamped} if stamped is not None else None)
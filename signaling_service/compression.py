@@ -0,0 +1,115 @@
+# compression.py - thresholded deflate for large signaling frames
+#
+# Experimental and server-only: no client in this repository decodes these frames
+# (frontend/ never asks for ?features=deflate), so it is for clients that bring
+# their own inflater. Connections that don't opt in pay one `deflater is not None`
+# check per write in outbound.py and hold no context.
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from codec import Payload
+
+# clients list this in ?features= to receive deflated frames
+DEFLATE_FEATURE = "deflate"
+# compressed frames are binary frames starting with this byte (never the first byte
+# of a JSON text or a msgpack map); the rest is a raw deflate stream, sync-flushed,
+# to be fed to one long-lived inflater per connection (zlib wbits=-15)
+DEFLATE_MARKER = b"\xc1"
+
+
+@dataclass(frozen=True)
+class DeflatePolicy:
+    # frames smaller than this go out uncompressed (ICE candidates, control messages)
+    min_size: int = 1024
+    level: int = 6
+    # window / memory level of a per-connection context, see context_bytes
+    wbits: int = 12
+    mem_level: int = 5
+    # node-wide cap on live contexts; past it frames are compressed statelessly
+    max_contexts: int = 2000
+
+    @property
+    def context_bytes(self) -> int:
+        """zlib's documented compressor footprint for these settings."""
+        return (1 << (self.wbits + 2)) + (1 << (self.mem_level + 9))
+
+
+class DeflateStats:
+    __slots__ = ("frames", "skipped", "bytes_in", "bytes_out", "cpu_seconds")
+
+    def __init__(self):
+        self.frames = 0  # frames sent compressed
+        self.skipped = 0  # frames under the size threshold
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    @property
+    def ratio(self) -> float:
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    @property
+    def cpu_us_per_frame(self) -> float:
+        return self.cpu_seconds / self.frames * 1e6 if self.frames else 0.0
+
+
+class Deflater:
+    """Hands out per-connection compression contexts and compresses large frames.
+
+    A context keeps the history window between frames, so repeated SDP boilerplate
+    compresses well. Contexts are capped node-wide by DeflatePolicy.max_contexts;
+    connections past the cap get stateless compression, which the client's single
+    inflater decodes the same way.
+    """
+
+    def __init__(self, policy: Optional[DeflatePolicy] = None):
+        self.policy = policy or DeflatePolicy()
+        self.stats = DeflateStats()
+        self.contexts = 0
+
+    def _compressobj(self):
+        return zlib.compressobj(
+            self.policy.level, zlib.DEFLATED, -self.policy.wbits, self.policy.mem_level
+        )
+
+    def open_context(self):
+        if self.contexts >= self.policy.max_contexts:
+            return None
+        self.contexts += 1
+        return self._compressobj()
+
+    def release_context(self, context) -> None:
+        if context is not None:
+            self.contexts -= 1
+
+    def snapshot(self) -> dict:
+        """Counters for tuning min_size / level against bandwidth and CPU."""
+        stats = self.stats
+        return {
+            "frames": stats.frames,
+            "skipped": stats.skipped,
+            "bytes_in": stats.bytes_in,
+            "bytes_out": stats.bytes_out,
+            "ratio": round(stats.ratio, 4),
+            "cpu_us_per_frame": round(stats.cpu_us_per_frame, 2),
+            "contexts": self.contexts,
+            "context_bytes": self.contexts * self.policy.context_bytes,
+        }
+
+    def compress(self, context, payload: Payload) -> Optional[bytes]:
+        """Deflated frame for `payload`, or None if it is below the threshold."""
+        data = payload.encode() if isinstance(payload, str) else payload
+        if len(data) < self.policy.min_size:
+            self.stats.skipped += 1
+            return None
+        started = time.perf_counter()
+        compressor = context or self._compressobj()
+        out = DEFLATE_MARKER + compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        stats = self.stats
+        stats.cpu_seconds += time.perf_counter() - started
+        stats.frames += 1
+        stats.bytes_in += len(data)
+        stats.bytes_out += len(out)
+        return out
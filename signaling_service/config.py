@@ -0,0 +1,135 @@
+# config.py - signaling_service settings, overridable through the environment
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# seconds a single websocket write may take before the peer counts as too slow
+SEND_TIMEOUT = float(os.getenv("SIGNALING_SEND_TIMEOUT", "5.0"))
+
+# per-connection outbound queues: control messages (peer-list, new-peer, call-*,
+# peer-disconnected) and the droppable ICE/SDP lane, with their overflow policies
+# ("drop-newest", "drop-oldest" or "disconnect")
+CONTROL_QUEUE_LIMIT = int(os.getenv("SIGNALING_CONTROL_QUEUE_LIMIT", "64"))
+DATA_QUEUE_LIMIT = int(os.getenv("SIGNALING_DATA_QUEUE_LIMIT", "256"))
+CONTROL_QUEUE_OVERFLOW = os.getenv("SIGNALING_CONTROL_QUEUE_OVERFLOW", "disconnect")
+DATA_QUEUE_OVERFLOW = os.getenv("SIGNALING_DATA_QUEUE_OVERFLOW", "drop-oldest")
+
+# idle connections are pinged after HEARTBEAT_INTERVAL seconds of silence and
+# evicted if they stay silent for another HEARTBEAT_TIMEOUT seconds
+HEARTBEAT_INTERVAL = float(os.getenv("SIGNALING_HEARTBEAT_INTERVAL", "30.0"))
+HEARTBEAT_TIMEOUT = float(os.getenv("SIGNALING_HEARTBEAT_TIMEOUT", "30.0"))
+
+# AMQP url of the inter-node signaling bus; unset runs a standalone node
+BUS_URL = os.getenv("SIGNALING_BUS_URL")
+
+# seconds trickle ICE candidates are buffered per (sender, target) pair before being
+# delivered as one "ice-candidates" frame to clients that negotiated ?features=ice-batch;
+# 0 disables coalescing
+ICE_COALESCE_WINDOW = float(os.getenv("SIGNALING_ICE_COALESCE_WINDOW", "0.02"))
+
+# (experimental, server-only: the bundled frontend has no inflater and never opts in)
+# clients that negotiate ?features=deflate get frames of at least DEFLATE_MIN_SIZE bytes
+# (SDP offers/answers) as deflated binary frames. Each such connection holds a zlib
+# context of roughly 2**(WBITS+2) + 2**(MEM_LEVEL+9) bytes, at most DEFLATE_MAX_CONTEXTS
+# of them per node; connections past the cap are compressed without a shared window.
+# Run uvicorn with --ws-per-message-deflate false if every client opts in, so those
+# frames are not deflated a second time by the transport
+DEFLATE_MIN_SIZE = int(os.getenv("SIGNALING_DEFLATE_MIN_SIZE", "1024"))
+DEFLATE_LEVEL = int(os.getenv("SIGNALING_DEFLATE_LEVEL", "6"))
+DEFLATE_WBITS = int(os.getenv("SIGNALING_DEFLATE_WBITS", "12"))
+DEFLATE_MEM_LEVEL = int(os.getenv("SIGNALING_DEFLATE_MEM_LEVEL", "5"))
+DEFLATE_MAX_CONTEXTS = int(os.getenv("SIGNALING_DEFLATE_MAX_CONTEXTS", "2000"))
+
+# seconds a connection whose socket dropped without a close frame keeps its place in
+# the call, so a client reconnecting with ?resume=<token> (from its peer-list) gets the
+# messages it missed and peers never see it leave; 0 disables resumption
+RESUME_GRACE = float(os.getenv("SIGNALING_RESUME_GRACE", "15.0"))
+
+# clients that negotiate ?features=peer-delta get joins and leaves collapsed into one
+# versioned "peer-delta" frame per PEER_DELTA_INTERVAL seconds, relative to the last
+# version they acknowledged with "peer-ack", instead of new-peer/peer-disconnected
+PEER_DELTA_INTERVAL = float(os.getenv("SIGNALING_PEER_DELTA_INTERVAL", "0.05"))
+
+# inbound token buckets as "class=rate:burst,..." with classes ice, sdp, call,
+# heartbeat, membership (peer-ack, capacity, capabilities) and other; per connection
+# and per call (all members together). Messages over a limit are dropped with a
+# "throttled" notice; a connection that keeps going past RATE_LIMIT_STRIKES throttled
+# messages (forgiven at RATE_LIMIT_STRIKE_DECAY per second) is closed with 1008. Empty
+# strings disable that level.
+RATE_LIMITS = os.getenv(
+    "SIGNALING_RATE_LIMITS",
+    "ice=50:200,sdp=5:20,call=2:10,heartbeat=5:10,membership=25:50,other=20:50",
+)
+CALL_RATE_LIMITS = os.getenv(
+    "SIGNALING_CALL_RATE_LIMITS", "ice=1000:5000,sdp=200:1000,call=10:50,other=200:500"
+)
+RATE_LIMIT_STRIKES = float(os.getenv("SIGNALING_RATE_LIMIT_STRIKES", "20"))
+RATE_LIMIT_STRIKE_DECAY = float(os.getenv("SIGNALING_RATE_LIMIT_STRIKE_DECAY", "1.0"))
+
+# inbound messages are checked against the schemas in models.py: SDP and ICE
+# candidate strings longer than these are rejected with an error instead of being
+# relayed. Types the node doesn't know are relayed as-is unless STRICT_TYPES is set,
+# which rejects them before any validation runs
+MAX_SDP_LENGTH = int(os.getenv("SIGNALING_MAX_SDP_LENGTH", "65536"))
+MAX_CANDIDATE_LENGTH = int(os.getenv("SIGNALING_MAX_CANDIDATE_LENGTH", "1024"))
+STRICT_TYPES = os.getenv("SIGNALING_STRICT_TYPES", "").lower() in ("1", "true", "yes")
+
+# calls where no connection has sent anything (not even a heartbeat pong) for
+# CALL_IDLE_TTL seconds are evicted by a sweep every REAPER_INTERVAL seconds, which
+# also drops state left behind by ended calls; 0 disables eviction
+CALL_IDLE_TTL = float(os.getenv("SIGNALING_CALL_IDLE_TTL", "600"))
+REAPER_INTERVAL = float(os.getenv("SIGNALING_REAPER_INTERVAL", "60"))
+
+# every call keeps its last FLIGHT_RECORDER_SIZE signaling events (type, size,
+# sender, target, time; never SDP or candidates) for GET /admin/calls/{id}/flight;
+# the recordings of the last FLIGHT_CAPTURES calls that ended with errors are kept
+# for GET /admin/flight. 0 disables either
+FLIGHT_RECORDER_SIZE = int(os.getenv("SIGNALING_FLIGHT_RECORDER_SIZE", "256"))
+FLIGHT_CAPTURES = int(os.getenv("SIGNALING_FLIGHT_CAPTURES", "32"))
+
+# calls of more than TOPOLOGY_MIN_PEERS peers, all negotiating ?features=topology
+# and all on this node, become a relay tree instead of a full mesh: each peer gets a
+# "topology" plan of the peer connections to keep. Clients report how many peer
+# connections they can hold with ?capacity=N or a "capacity" message, else
+# TOPOLOGY_DEFAULT_CAPACITY. 0 disables planning
+TOPOLOGY_MIN_PEERS = int(os.getenv("SIGNALING_TOPOLOGY_MIN_PEERS", "6"))
+TOPOLOGY_DEFAULT_CAPACITY = int(os.getenv("SIGNALING_TOPOLOGY_DEFAULT_CAPACITY", "4"))
+
+# load shedding: while the event loop lags more than SHED_MAX_LAG seconds (smoothed)
+# or more than SHED_MAX_QUEUED frames wait in outbound queues, new joins are closed
+# with 1013 and told to retry after SHED_RETRY_AFTER seconds, at SHED_REDIRECT_URL
+# if set; resumes and migrations still get in. 0 ignores that signal
+SHED_MAX_LAG = float(os.getenv("SIGNALING_SHED_MAX_LAG", "0.1"))
+SHED_MAX_QUEUED = int(os.getenv("SIGNALING_SHED_MAX_QUEUED", "20000"))
+SHED_RETRY_AFTER = float(os.getenv("SIGNALING_SHED_RETRY_AFTER", "5"))
+SHED_REDIRECT_URL = os.getenv("SIGNALING_SHED_REDIRECT_URL")
+
+# worker processes behind `python -m dispatcher`; every connection of a call lands on
+# the same worker (consistent hashing of call_id), so relaying stays in-process.
+# Notifications between users on different workers need SIGNALING_BUS_URL. 1 runs
+# plain uvicorn
+WORKERS = int(os.getenv("SIGNALING_WORKERS", "1"))
+
+# crash recovery: call membership, with resume tokens (so the file is created 0600),
+# is appended to SNAPSHOT_PATH every SNAPSHOT_INTERVAL seconds. A node that starts
+# with the file holds every member's slot for SNAPSHOT_RESTORE_GRACE seconds, so
+# clients resuming after the crash reattach quietly instead of all rejoining; whoever
+# isn't back by then is announced as gone. Calls written more than SNAPSHOT_MAX_AGE
+# seconds before the restart are dropped. Needs RESUME_GRACE; unset disables it.
+# Dispatcher workers each keep SNAPSHOT_PATH.<worker index>
+SNAPSHOT_PATH = os.getenv("SIGNALING_SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL = float(os.getenv("SIGNALING_SNAPSHOT_INTERVAL", "1.0"))
+SNAPSHOT_RESTORE_GRACE = float(os.getenv("SIGNALING_SNAPSHOT_RESTORE_GRACE", "30.0"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SIGNALING_SNAPSHOT_MAX_AGE", "300"))
+
+# drain mode (POST /admin/drain): clients are told to reconnect to
+# DRAIN_RECONNECT_URL (e.g. ws://signaling-2:8000; unset = the same address, for a
+# load balancer to route elsewhere), and whoever is still connected after
+# DRAIN_DEADLINE seconds is closed with 1012
+DRAIN_DEADLINE = float(os.getenv("SIGNALING_DRAIN_DEADLINE", "30.0"))
+DRAIN_RECONNECT_URL = os.getenv("SIGNALING_DRAIN_RECONNECT_URL")
+
+# required in the X-Admin-Token header of /admin/* requests; while unset every admin
+# request is refused
+ADMIN_TOKEN = os.getenv("SIGNALING_ADMIN_TOKEN")
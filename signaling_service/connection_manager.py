@@ -1,141 +1,799 @@
 # connection_manager.py
 import asyncio
-from typing import Dict, Optional
+import secrets
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Deque, Dict, FrozenSet, List, Optional, Union
 from fastapi import WebSocket
 import logging
 
+import metrics
+from bus import SignalingBus
+from capabilities import CAPABILITIES_FEATURE, CallCapabilities
+from codec import JSON, Codec, Frame, as_frame
+from compression import DEFLATE_FEATURE, DeflatePolicy, Deflater
+from flight import FlightRecorder
+from heartbeat import HeartbeatScheduler
+from membership import MEMBERSHIP_TYPES, PEER_DELTA_FEATURE, MembershipLog
+from outbound import OutboundPolicy, PeerConnection, lane_of
+from ratelimit import Buckets, ConnectionLimiter, RateLimitPolicy
+from reaper import IdleCallReaper
+from snapshot import RegistrySnapshot, SnapshotPolicy
+from topology import TOPOLOGY_FEATURE, TopologyPlan, TopologyPolicy
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class CallStats:
+    late_sends: int = 0  # writes that missed the per-peer send deadline
+    dropped_sends: int = 0  # writes that failed outright
+    queue_drops: int = 0  # messages discarded by an outbound queue overflow policy
+    frames_saved: int = 0  # ICE frames avoided by coalescing candidates into batches
+    renegotiations: int = 0  # offers along a direction that already had one
+
+
 class CallConnectionManager:
-    def __init__(self):
-        self.active_calls: Dict[str, Dict[int, WebSocket]] = {}
-        self._lock = asyncio.Lock()
+    def __init__(
+        self,
+        outbound_policy: Optional[OutboundPolicy] = None,
+        heartbeat_interval: float = 30.0,
+        heartbeat_timeout: float = 30.0,
+        heartbeat_tick: float = 1.0,
+        deflate_policy: Optional[DeflatePolicy] = None,
+        resume_grace: float = 0.0,
+        rate_limits: Optional[RateLimitPolicy] = None,
+        peer_delta_interval: float = 0.05,
+        idle_call_ttl: float = 0.0,
+        reaper_interval: float = 60.0,
+        flight_recorder_size: int = 256,
+        flight_captures: int = 32,
+        topology_policy: Optional[TopologyPolicy] = None,
+        snapshot_policy: Optional[SnapshotPolicy] = None,
+    ):
+        # call_id -> {user_id: connection}. The inner dicts are never mutated in place:
+        # every join/leave publishes a fresh copy, so readers (send/broadcast) can grab
+        # the current dict without locking and iterate it safely across awaits.
+        self.active_calls: Dict[str, Dict[int, PeerConnection]] = {}
+        # no lock guards membership changes: the node is one event loop and every
+        # join/leave swaps in its new dict without an await in between, so no other
+        # task can observe (or interleave with) a half-done change. Slow parts (the
+        # websocket handshake, bus calls) run before or after the swap; keep it that way
+        # queue limits, overflow policies and the per-write deadline for every peer
+        self.outbound_policy = outbound_policy or OutboundPolicy()
+        self.call_stats: Dict[str, CallStats] = {}
+        # one liveness scheduler for every connection on the node: idle peers get
+        # pinged, peers silent for another heartbeat_timeout are evicted in batches
+        self.heartbeat = HeartbeatScheduler(
+            self._evict,
+            idle_interval=heartbeat_interval,
+            dead_timeout=heartbeat_timeout,
+            tick=heartbeat_tick,
+        )
+        # optional inter-node bus; remote_peers is call_id -> {user_id: node_id} for
+        # peers of locally hosted calls that are connected to other nodes
+        self.bus: Optional[SignalingBus] = None
+        self.remote_peers: Dict[str, Dict[int, str]] = {}
+        # shared by every connection that negotiated ?features=deflate: size threshold,
+        # context memory cap and the ratio / CPU counters
+        self.deflater = Deflater(deflate_policy)
+        # session resumption: a connection whose socket drops keeps its slot (and keeps
+        # queueing) for resume_grace seconds, and a client that reconnects with its
+        # token picks up where it left off instead of leaving and re-joining the call
+        self.resume_grace = resume_grace
+        self.sessions: Dict[str, PeerConnection] = {}
+        self.resumes = 0
+        self.resume_failures = 0
+        # peer connections that would have been torn down and renegotiated
+        self.renegotiations_avoided = 0
+        # inbound token buckets; the per-call ones are shared by the call's connections
+        self.rate_limits = rate_limits
+        self.call_limits: Dict[str, Buckets] = {}
+        # user-scoped notification sockets (notifications.NotificationHub), if any;
+        # receives "notify" envelopes from the bus
+        self.notifications = None
+        # call_id -> versioned joins/leaves; clients with ?features=peer-delta get
+        # one collapsed delta per peer_delta_interval instead of a frame per change
+        self.memberships: Dict[str, MembershipLog] = {}
+        self.peer_delta_interval = peer_delta_interval
+        self.membership_events = 0
+        self.peer_deltas_sent = 0
+        # call_id -> when its first local peer joined, for /admin/calls
+        self.call_started: Dict[str, float] = {}
+        # evicts calls with no inbound traffic for idle_call_ttl seconds (0 = never)
+        # and per-call state that outlived its call
+        self.reaper = IdleCallReaper(self, ttl=idle_call_ttl, interval=reaper_interval)
+        # call_id -> ring of its last flight_recorder_size events (0 = off); calls
+        # that end with errors leave their recording in flight_captures
+        self.flight_recorder_size = flight_recorder_size
+        self.recorders: Dict[str, FlightRecorder] = {}
+        self.flight_captures: Deque[dict] = deque(maxlen=flight_captures)
+        # call_id -> relay tree for calls past topology_policy.min_peers whose members
+        # all negotiated ?features=topology (None = always a full mesh)
+        self.topology_policy = topology_policy
+        self.topologies: Dict[str, TopologyPlan] = {}
+        self.topology_plans_sent = 0
+        # call_id -> codecs its members published (?features=capabilities) and the
+        # offers sent so far; the intersection is pushed as "codec-intersection"
+        self.capabilities: Dict[str, CallCapabilities] = {}
+        self.intersections_sent = 0
+        self.offers = 0
+        self.renegotiations = 0
+        # call membership appended to local disk (needs resumption), so a restarted
+        # node takes its calls back instead of every client rejoining at once
+        self.snapshot = RegistrySnapshot(self, snapshot_policy)
 
-    async def connect(self, call_id: str, user_id: int, websocket: WebSocket) -> bool:
+    async def attach_bus(self, bus: SignalingBus) -> None:
+        """Start relaying through `bus` so calls can span several nodes."""
+        self.bus = bus
+        await bus.start(self._on_bus_message)
+
+    async def connect(
+        self,
+        call_id: str,
+        user_id: int,
+        websocket: WebSocket,
+        features: FrozenSet[str] = frozenset(),
+        codec: Codec = JSON,
+        subprotocol: Optional[str] = None,
+    ) -> Optional[PeerConnection]:
         """Accept and register a websocket for a call. Allow multiple connections per user."""
-        async with self._lock:
-            if call_id not in self.active_calls:
-                self.active_calls[call_id] = {}
-
-            # Allow multiple connections by using a list or tracking connection purposes
-            if user_id in self.active_calls[call_id]:
-                # Instead of rejecting, we could track multiple connections
-                # For now, let's just allow it for testing
-                logger.warning(
-                    f"user {user_id} already connected to call {call_id}, but allowing multiple connections"
-                )
+        # the handshake happens outside any lock, a slow client only delays itself
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+        except Exception:
+            await self._safe_close(websocket)
+            logger.exception(
+                f"Failed to accept/register websocket for {user_id}@{call_id}"
+            )
+            return None
+
+        connection = PeerConnection(
+            call_id,
+            user_id,
+            websocket,
+            self.outbound_policy,
+            self._on_send_failure,
+            features,
+            codec,
+            self.deflater if DEFLATE_FEATURE in features else None,
+        )
+        if self.resume_grace > 0:
+            connection.resume_token = secrets.token_urlsafe(16)
+            self.sessions[connection.resume_token] = connection
+        connection.start()
+        self.heartbeat.track(connection)
+        peers = self.active_calls.get(call_id, {})
+        previous = peers.get(user_id)
+        if not peers:
+            self.call_started[call_id] = time.monotonic()
+
+        # Allow multiple connections by using a list or tracking connection purposes
+        if user_id in peers:
+            # Instead of rejecting, we could track multiple connections
+            # For now, let's just allow it for testing
+            logger.warning(
+                f"user {user_id} already connected to call {call_id}, but allowing multiple connections"
+            )
+
+        self.active_calls[call_id] = {**peers, user_id: connection}
+        self.record(call_id, "join", sender=user_id)
+        self.snapshot.touch(call_id)
+        if not peers and self.bus is not None:
+            # first local peer of this call, start receiving its traffic. Issued before
+            # anything else can run, so bindings change in the order joins/leaves did
+            await self.bus.subscribe(call_id)
+        self.reaper.start()
+        logger.info(f"user {user_id} connected to call {call_id}")
+        if previous is not None and previous.parked is not None:
+            # came back without (a usable) resume token, the parked slot is obsolete
+            await self.disconnect(call_id, user_id, previous)
+        if self.bus is not None:
+            await self.bus.publish(call_id, {"kind": "join", "user": user_id})
+        return connection
+
+    async def resume(
+        self,
+        call_id: str,
+        user_id: int,
+        websocket: WebSocket,
+        token: str,
+        codec: Codec = JSON,
+        subprotocol: Optional[str] = None,
+    ) -> Optional[PeerConnection]:
+        """Reattach a reconnecting client to the connection its resume token belongs to.
+
+        Peers are not told anything; messages queued while the client was away are
+        delivered first. Returns None (without accepting the socket) when the token is
+        unknown, expired or its replay buffer overflowed, the caller then connects normally.
+        """
+        connection = self.sessions.get(token)
+        if (
+            connection is None
+            or connection.call_id != call_id
+            or connection.user_id != user_id
+            or connection.closed
+            or connection.overflowed
+            or self.get_connection(call_id, user_id) is not connection
+        ):
+            self.resume_failures += 1
+            return None
+
+        # claim the slot before awaiting so the grace timer can't expire it under us
+        if connection.parked is not None:
+            connection.parked.cancel()
+            connection.parked = None
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+        except Exception:
+            logger.exception(f"Failed to accept resumed websocket for {user_id}@{call_id}")
+            if connection.websocket is None:
+                self._start_grace(connection)
+            self.resume_failures += 1
+            return None
+
+        # the old socket may not have noticed it is dead yet (no close, no failed write)
+        stale = connection.websocket
+        if stale is not None:
+            connection.detach()
+        connection.attach(websocket, codec)
+        self.heartbeat.track(connection)
+        if stale is not None:
+            await self._safe_close(stale)
+        self.resumes += 1
+        self.snapshot.claim(token)
+        self.record(call_id, "resume", sender=user_id)
+        self.renegotiations_avoided += len(self.get_peer_ids(call_id, exclude_user=user_id))
+        logger.info(f"user {user_id} resumed its session in call {call_id}")
+        return connection
+
+    async def restore_call(
+        self, call_id: str, version: int, members: List[list], grace: float
+    ) -> int:
+        """Hold the slots a call had before a restart, from its registry snapshot line.
+
+        Every member ([user, token, joinVersion, ackedVersion, features]) gets a parked
+        connection under its old resume token, so a client reconnecting with ?resume=
+        reattaches quietly: its session-resumed lists everyone expected back and nobody
+        is announced as new. The membership log continues at `version` with the same
+        join versions, so delta clients see no change. Members not back within `grace`
+        seconds leave as usual, with a peer-disconnected. Returns the slots restored.
+        """
+        if call_id in self.active_calls or not members:
+            return 0
+        log = MembershipLog()
+        log.version = log.floor = version
+        peers: Dict[int, PeerConnection] = {}
+        for user_id, token, joined, acknowledged, features in members:
+            features = frozenset(features)
+            connection = PeerConnection(
+                call_id,
+                user_id,
+                None,
+                self.outbound_policy,
+                self._on_send_failure,
+                features,
+                JSON,
+                self.deflater if DEFLATE_FEATURE in features else None,
+            )
+            connection.resume_token = token
+            connection.peer_version = min(acknowledged, version)
+            self.sessions[token] = connection
+            self._start_grace(connection, grace)
+            log.members[user_id] = joined
+            peers[user_id] = connection
+        self.active_calls[call_id] = peers
+        self.memberships[call_id] = log
+        self.call_started[call_id] = time.monotonic()
+        self.record(call_id, "restore")
+        if any(c.peer_version < version for c in peers.values()):
+            # a delta the client hadn't acknowledged before the crash: resent on resume
+            log.timer = asyncio.get_running_loop().call_later(
+                self.peer_delta_interval, self._flush_membership, call_id
+            )
+        for connection in peers.values():
+            self.topology_join(connection)
+        self.reaper.start()
+        if self.bus is not None:
+            await self.bus.subscribe(call_id)
+            await self.bus.publish(call_id, {"kind": "members", "users": list(peers)})
+        return len(peers)
 
-            try:
-                await websocket.accept()
-                self.active_calls[call_id][user_id] = websocket
-                logger.info(f"user {user_id} connected to call {call_id}")
-                return True
-            except Exception:
+    async def park(self, connection: PeerConnection) -> bool:
+        """Hold a connection whose socket dropped for resume_grace seconds.
+
+        Returns False when resumption is off or the connection already left, in which
+        case the caller should announce the leave as usual.
+        """
+        if (
+            self.resume_grace <= 0
+            or connection.resume_token is None
+            or connection.closed
+            or self.get_connection(connection.call_id, connection.user_id) is not connection
+        ):
+            return False
+        if connection.parked is None:
+            websocket = connection.websocket
+            connection.detach()
+            self.heartbeat.untrack(connection)
+            self._start_grace(connection)
+            self.record(connection.call_id, "park", sender=connection.user_id)
+            logger.info(
+                f"holding {connection.user_id}@{connection.call_id} for {self.resume_grace}s"
+            )
+            if websocket is not None:
+                # ends the reader loop if the writer noticed the failure first
                 await self._safe_close(websocket)
-                logger.exception(
-                    f"Failed to accept/register websocket for {user_id}@{call_id}"
-                )
-                return False
-
-    async def disconnect(self, call_id: str, user_id: int) -> None:
-        """Remove a connection from the registry and close the socket safely."""
-        websocket = None
-        async with self._lock:
-            if (
-                call_id not in self.active_calls
-                or user_id not in self.active_calls[call_id]
-            ):
-                return
-            websocket = self.active_calls[call_id].pop(user_id, None)
-            if not self.active_calls[call_id]:
+        return True
+
+    def _start_grace(self, connection: PeerConnection, grace: Optional[float] = None) -> None:
+        connection.parked = asyncio.create_task(
+            self._expire_after_grace(connection, self.resume_grace if grace is None else grace)
+        )
+
+    async def _expire_after_grace(self, connection: PeerConnection, grace: float) -> None:
+        await asyncio.sleep(grace)
+        connection.parked = None
+        logger.info(f"resume window for {connection.user_id}@{connection.call_id} expired")
+        await self.leave(connection)
+
+    async def leave(self, connection: PeerConnection) -> None:
+        """Tell the other peers a connection left its call, then remove it."""
+        call_id, user_id = connection.call_id, connection.user_id
+        try:
+            await self.broadcast(
+                call_id,
+                {"type": "peer-disconnected", "peerId": user_id, "from": "system"},
+                exclude_user=user_id,
+            )
+        except Exception:
+            logger.exception("broadcast peer-disconnected failed")
+        await self.disconnect(call_id, user_id, connection)
+
+    async def disconnect(
+        self,
+        call_id: str,
+        user_id: int,
+        connection: Optional[PeerConnection] = None,
+    ) -> None:
+        """Remove a connection from the registry and close the socket safely.
+
+        When `connection` is given, only that exact connection is removed, so a stale
+        socket cleaning up after itself can't evict the user's newer connection.
+        """
+        emptied = False
+        peers = self.active_calls.get(call_id)
+        current = peers.get(user_id) if peers else None
+        if current is None or (connection is not None and current is not connection):
+            current = None
+        else:
+            self.record(call_id, "leave", sender=user_id)
+            self.snapshot.touch(call_id)
+            remaining = {uid: c for uid, c in peers.items() if uid != user_id}
+            if remaining:
+                self.active_calls[call_id] = remaining
+                capabilities = self.capabilities.get(call_id)
+                if capabilities is not None and capabilities.remove(user_id):
+                    self._push_intersection(call_id, capabilities)
+            else:
                 self.active_calls.pop(call_id, None)
-        if websocket:
-            await self._safe_close(websocket)
+                self.remote_peers.pop(call_id, None)
+                emptied = True
+                self.call_limits.pop(call_id, None)
+                self.call_started.pop(call_id, None)
+                self.topologies.pop(call_id, None)
+                self.capabilities.pop(call_id, None)
+                log = self.memberships.pop(call_id, None)
+                if log is not None and log.timer is not None:
+                    log.timer.cancel()
+                stats = self.call_stats.pop(call_id, None)
+                failed = stats is not None and (
+                    stats.late_sends or stats.dropped_sends or stats.queue_drops
+                )
+                if failed:
+                    logger.info(f"call {call_id} ended with {stats}")
+                recorder = self.recorders.pop(call_id, None)
+                if recorder is not None and (failed or recorder.errors):
+                    self.flight_captures.append(
+                        recorder.dump(
+                            call_id,
+                            endedAt=time.time(),
+                            stats=asdict(stats) if stats is not None else None,
+                        )
+                    )
+                    logger.info(f"captured flight recording of call {call_id}")
+        if emptied and self.bus is not None:
+            await self.bus.unsubscribe(call_id)
+
+        # a replaced connection still owns its socket and writer
+        closing = current or connection
+        if closing is None:
+            return
+        closing.stop()
+        if closing.parked is not None:
+            closing.parked.cancel()
+            closing.parked = None
+        self.sessions.pop(closing.resume_token, None)
+        self.heartbeat.untrack(closing)
+        if closing.websocket is not None:
+            await self._safe_close(closing.websocket)
+        if current is not None:
+            plan = self.topologies.get(call_id)
+            if plan is not None:
+                self._replan(call_id, plan, plan.remove(user_id))
             logger.info(f"user {user_id} disconnected from call {call_id}")
+            if self.bus is not None:
+                await self.bus.publish(call_id, {"kind": "leave", "user": user_id})
 
     async def get_peers(
         self, call_id: str, exclude_user: Optional[int] = None
-    ) -> Dict[int, WebSocket]:
+    ) -> Dict[int, PeerConnection]:
         """Return a snapshot copy of peers for a call (safe to iterate)."""
-        async with self._lock:
-            if call_id not in self.active_calls:
-                return {}
-            snapshot = self.active_calls[call_id].copy()
+        peers = self.active_calls.get(call_id)
+        if not peers:
+            return {}
         if exclude_user is not None:
-            return {uid: ws for uid, ws in snapshot.items() if uid != exclude_user}
-        return snapshot
-
-    async def send_to_peer(self, call_id: str, target_user: int, message: dict) -> bool:
-        """Send a JSON message to a specific peer. If sending fails, remove that peer."""
-        websocket = None
-        async with self._lock:
-            if (
-                call_id not in self.active_calls
-                or target_user not in self.active_calls[call_id]
-            ):
-                logger.warning(f"target {target_user} not found in call {call_id}")
-                return False
-            websocket = self.active_calls[call_id][target_user]
+            return {uid: c for uid, c in peers.items() if uid != exclude_user}
+        return dict(peers)
 
-        try:
-            await websocket.send_json(message)
+    def get_connection(self, call_id: str, user_id: int) -> Optional[PeerConnection]:
+        """The local connection of a user in a call, if any."""
+        return self.active_calls.get(call_id, {}).get(user_id)
+
+    def get_peer_ids(
+        self, call_id: str, exclude_user: Optional[int] = None
+    ) -> List[int]:
+        """User ids in a call across all nodes (remote membership may lag slightly)."""
+        ids = set(self.active_calls.get(call_id, ())) | set(
+            self.remote_peers.get(call_id, ())
+        )
+        ids.discard(exclude_user)
+        return sorted(ids)
+
+    async def send_to_peer(
+        self, call_id: str, target_user: int, message: Union[dict, Frame]
+    ) -> bool:
+        """Queue a JSON message for a specific peer, local or on another node.
+
+        Returns False if it wasn't queued or handed to the bus.
+        """
+        connection = self.active_calls.get(call_id, {}).get(target_user)
+        if connection is not None:
+            return self.deliver(connection, message)
+        if self.bus is not None and target_user in self.remote_peers.get(call_id, ()):
+            await self.bus.publish(
+                call_id,
+                {
+                    "kind": "direct",
+                    "target": target_user,
+                    "message": as_frame(message).message,
+                },
+            )
             return True
-        except Exception as e:
-            logger.warning(f"send_to_peer failed for {target_user}@{call_id}: {e}")
-            # remove the socket (disconnect will close it)
-            await self.disconnect(call_id, target_user)
-            return False
+        logger.warning(f"target {target_user} not found in call {call_id}")
+        return False
 
     async def broadcast(
-        self, call_id: str, message: dict, exclude_user: Optional[int] = None
+        self, call_id: str, message: Union[dict, Frame], exclude_user: Optional[int] = None
     ) -> int:
-        """Broadcast a JSON message to all peers (snapshot then send outside lock)."""
-        async with self._lock:
-            if call_id not in self.active_calls:
-                return 0
-            peers_snapshot = {
-                uid: ws
-                for uid, ws in self.active_calls[call_id].items()
-                if uid != exclude_user
-            }
-
-        sent = 0
-        for uid, ws in list(peers_snapshot.items()):
-            try:
-                await ws.send_json(message)
-                sent += 1
-            except Exception as e:
-                logger.warning(f"broadcast send failed to {uid}@{call_id}: {e}")
-                await self.disconnect(call_id, uid)
-        return sent
-
-    async def _safe_close(self, websocket: WebSocket) -> None:
+        """Queue a JSON message for all peers; each peer's writer delivers it independently.
+
+        The message is wrapped in a single Frame, so it is encoded once for everyone.
+
+        With a bus attached the message is also published for other nodes; the return
+        value only counts local peers.
+        """
+        frame = as_frame(message)
+        if self.bus is not None:
+            await self.bus.publish(
+                call_id,
+                {"kind": "broadcast", "message": frame.message, "exclude": exclude_user},
+            )
+        return self._broadcast_local(call_id, frame, exclude_user)
+
+    def _broadcast_local(
+        self, call_id: str, message: Union[dict, Frame], exclude_user: Optional[int] = None
+    ) -> int:
+        peers = self.active_calls.get(call_id)
+        if not peers:
+            return 0
+        message = as_frame(message)
+
+        queued = 0
+        if message.type in MEMBERSHIP_TYPES:
+            # delta clients hear about it in the next peer-delta instead
+            self._record_membership(call_id, message)
+            # legacy clients get a frame per join/leave: a storm of them (everyone
+            # joining, then half leaving) queues up to about twice the call's size
+            headroom = 2 * (len(peers) + len(self.remote_peers.get(call_id, ())))
+            for uid, connection in peers.items():
+                if (
+                    uid != exclude_user
+                    and PEER_DELTA_FEATURE not in connection.features
+                    and self.deliver(connection, message, headroom)
+                ):
+                    queued += 1
+        else:
+            for uid, connection in peers.items():
+                if uid != exclude_user and self.deliver(connection, message):
+                    queued += 1
+        metrics.BROADCAST_FANOUT.observe(queued)
+        return queued
+
+    def _record_membership(self, call_id: str, frame: Frame) -> None:
+        log = self.memberships.get(call_id)
+        if log is None:
+            log = self.memberships[call_id] = MembershipLog(self.get_peer_ids(call_id))
+        log.record(frame.message["peerId"], frame.type == "new-peer")
+        self.membership_events += 1
+        self.snapshot.touch(call_id)
+        if log.timer is None:
+            log.timer = asyncio.get_running_loop().call_later(
+                self.peer_delta_interval, self._flush_membership, call_id
+            )
+
+    def _flush_membership(self, call_id: str) -> None:
+        """Send every delta client what changed since the version it acknowledged.
+
+        Clients acknowledged at the same version share one frame, so a burst of joins
+        costs one encode and one frame per connection per interval, not per join.
+        """
+        log = self.memberships.get(call_id)
+        if log is None:
+            return
+        log.timer = None
+        frames: Dict[int, Frame] = {}
+        acknowledged = log.version
+        for connection in self.active_calls.get(call_id, {}).values():
+            if PEER_DELTA_FEATURE not in connection.features:
+                continue
+            base = connection.peer_version
+            if base < acknowledged:
+                acknowledged = base
+            if base >= log.version:
+                continue
+            frame = frames.get(base)
+            if frame is None:
+                frame = frames[base] = Frame(log.delta(base))
+            if self.deliver(connection, frame):
+                self.peer_deltas_sent += 1
+        log.compact(acknowledged)
+
+    def resync_membership(self, connection: PeerConnection) -> None:
+        """Send a delta client a reset with the next flush, whether or not anything changed.
+
+        A client moving over from a draining node is not announced, so no membership
+        event would otherwise ever send it the members it is waiting for.
+        """
+        call_id = connection.call_id
+        log = self.memberships.get(call_id)
+        if log is None:
+            log = self.memberships[call_id] = MembershipLog(self.get_peer_ids(call_id))
+        else:
+            # the call's other peers already know it from the old node: a member
+            # without a join event, like the ones present when the log was created
+            log.members.setdefault(connection.user_id, 0)
+        # below every version, so the flush treats it as behind and sends a reset
+        connection.peer_version = -1
+        if log.timer is None:
+            log.timer = asyncio.get_running_loop().call_later(
+                self.peer_delta_interval, self._flush_membership, call_id
+            )
+
+    def acknowledge_membership(self, connection: PeerConnection, version) -> None:
+        """Record a client's "peer-ack"; later deltas start from this version."""
+        log = self.memberships.get(connection.call_id)
+        if (
+            log is not None
+            and isinstance(version, int)
+            and connection.peer_version < version <= log.version
+        ):
+            connection.peer_version = version
+            self.snapshot.touch(connection.call_id)
+
+    def record(
+        self,
+        call_id: str,
+        event: str,
+        message_type: Optional[str] = None,
+        size: int = 0,
+        sender: Optional[int] = None,
+        target: Optional[int] = None,
+    ) -> None:
+        """Add an event to the call's flight recorder (only while it has local peers)."""
+        recorder = self.recorders.get(call_id)
+        if recorder is None:
+            if self.flight_recorder_size <= 0 or call_id not in self.active_calls:
+                return
+            recorder = self.recorders[call_id] = FlightRecorder(self.flight_recorder_size)
+        recorder.record(event, message_type, size, sender, target)
+
+    def flight_dump(self, call_id: str) -> Optional[dict]:
+        """The live recording of a call, None if it has none."""
+        recorder = self.recorders.get(call_id)
+        return recorder.dump(call_id) if recorder is not None else None
+
+    def topology_join(self, connection: PeerConnection, capacity: Optional[int] = None) -> None:
+        """Add a newly connected peer to its call's topology plan."""
+        if self.topology_policy is None or self.topology_policy.min_peers <= 0:
+            return
+        call_id = connection.call_id
+        if self.get_connection(call_id, connection.user_id) is not connection:
+            return
+        plan = self.topologies.get(call_id)
+        if plan is None:
+            plan = self.topologies[call_id] = TopologyPlan(self.topology_policy)
+        self._replan(call_id, plan, plan.add(connection.user_id, capacity))
+
+    def topology_capacity(self, connection: PeerConnection, capacity: int) -> None:
+        """Apply a client's "capacity" hint (peer connections it can hold)."""
+        plan = self.topologies.get(connection.call_id)
+        if plan is not None:
+            self._replan(
+                connection.call_id, plan, plan.set_capacity(connection.user_id, capacity)
+            )
+
+    def _replan(self, call_id: str, plan: TopologyPlan, changed) -> None:
+        """Settle the plan's mode and send the peers whose links changed their new plan.
+
+        Calls spanning several nodes, or with a member that can't follow plans, stay
+        (or go back to) a full mesh.
+        """
+        peers = self.active_calls.get(call_id, {})
+        mesh_only = bool(self.remote_peers.get(call_id)) or any(
+            TOPOLOGY_FEATURE not in c.features for c in peers.values()
+        )
+        changed |= plan.settle(mesh_only)
+        if not changed:
+            return
+        plan.version += 1
+        for user_id in changed:
+            connection = peers.get(user_id)
+            if connection is not None and TOPOLOGY_FEATURE in connection.features:
+                if self.deliver(connection, plan.message(user_id)):
+                    self.topology_plans_sent += 1
+
+    def publish_capabilities(self, connection: PeerConnection, codecs: dict) -> None:
+        """Apply a client's "capabilities"; the call hears the intersection if it changed."""
+        capabilities = self.capabilities.get(connection.call_id)
+        if capabilities is None:
+            capabilities = self.capabilities[connection.call_id] = CallCapabilities()
+        if capabilities.publish(connection.user_id, codecs):
+            self._push_intersection(connection.call_id, capabilities)
+
+    def codec_intersection(self, call_id: str) -> Optional[dict]:
+        """The "codec-intersection" for a joiner, None while nobody has published."""
+        capabilities = self.capabilities.get(call_id)
+        if capabilities is None or not capabilities.members:
+            return None
+        return capabilities.message()
+
+    def _push_intersection(self, call_id: str, capabilities: CallCapabilities) -> None:
+        frame = Frame(capabilities.message())
+        for connection in self.active_calls.get(call_id, {}).values():
+            if CAPABILITIES_FEATURE in connection.features and self.deliver(connection, frame):
+                self.intersections_sent += 1
+
+    def record_offer(self, call_id: str, sender: int, target: int) -> None:
+        """Count an offer, and a renegotiation if the sender already made `target` one."""
+        capabilities = self.capabilities.get(call_id)
+        if capabilities is None:
+            capabilities = self.capabilities[call_id] = CallCapabilities()
+        self.offers += 1
+        if capabilities.offer(sender, target):
+            self.renegotiations += 1
+            self.stats(call_id).renegotiations += 1
+
+    def deliver(
+        self, connection: PeerConnection, message: Union[dict, Frame], headroom: int = 0
+    ) -> bool:
+        """Queue a message on a local connection, accounting for overflow drops."""
+        dropped = connection.dropped
+        queued = connection.enqueue(message, headroom)
+        if connection.dropped != dropped:
+            self.stats(connection.call_id).queue_drops += 1
+            metrics.QUEUE_DROPS[lane_of(message)] += 1
+            self.record(
+                connection.call_id,
+                "queue-drop",
+                as_frame(message).type,
+                target=connection.user_id,
+            )
+        return queued
+
+    def limiter(self, call_id: str) -> Optional[ConnectionLimiter]:
+        """Rate limiter for a connection's receive loop, None when limiting is off."""
+        if self.rate_limits is None:
+            return None
+        call = self.call_limits.get(call_id)
+        if call is None:
+            call = self.call_limits[call_id] = Buckets(self.rate_limits.call)
+        return ConnectionLimiter(self.rate_limits, call, time.monotonic())
+
+    def queue_depths(self, call_id: str) -> Dict[int, Dict[str, int]]:
+        """Current outbound queue depth per connection of a call, by lane."""
+        return {
+            uid: c.queue_depth for uid, c in self.active_calls.get(call_id, {}).items()
+        }
+
+    async def _on_send_failure(self, connection: PeerConnection, reason: str) -> None:
+        """Writer callback: account for the failed write and drop the connection."""
+        metrics.SEND_FAILURES[reason] += 1
+        self.record(connection.call_id, "send-failure", reason, target=connection.user_id)
+        stats = self.stats(connection.call_id)
+        if reason == "late":
+            stats.late_sends += 1
+        elif reason == "error":
+            stats.dropped_sends += 1
+            # the socket is gone, not slow: give the client a chance to resume
+            if await self.park(connection):
+                return
+        # remove the socket (disconnect will close it)
+        await self.disconnect(connection.call_id, connection.user_id, connection)
+
+    def stats(self, call_id: str) -> CallStats:
+        stats = self.call_stats.get(call_id)
+        if stats is None:
+            stats = self.call_stats[call_id] = CallStats()
+        return stats
+
+    async def _safe_close(self, websocket: WebSocket, code: int = 1000) -> None:
         """Close a websocket defensively."""
         try:
             state = getattr(websocket, "client_state", None)
             if state is None or getattr(state, "value", 3) < 3:
-                await websocket.close()
+                await websocket.close(code=code)
         except Exception as e:
             logger.debug(f"_safe_close warning: {e}")
 
     def is_connected(self, call_id: str, user_id: int) -> bool:
         """Quick (potentially slightly stale) check if a user is connected."""
-        return call_id in self.active_calls and user_id in self.active_calls[call_id]
-
-    async def cleanup_stale_connections(self, call_id: str) -> int:
-        """Ping peers and drop those that fail to respond (best-effort)."""
-        async with self._lock:
-            if call_id not in self.active_calls:
-                return 0
-            peers_snapshot = self.active_calls[call_id].copy()
-
-        disconnected = 0
-        for uid, ws in list(peers_snapshot.items()):
-            try:
-                await ws.send_json({"type": "ping"})
-            except Exception:
-                logger.warning(f"stale connection detected for {uid}@{call_id}")
-                await self.disconnect(call_id, uid)
-                disconnected += 1
-        return disconnected
+        return user_id in self.active_calls.get(
+            call_id, ()
+        ) or user_id in self.remote_peers.get(call_id, ())
+
+    async def _on_bus_message(self, envelope: dict) -> None:
+        """Apply an envelope published by another node for one of our calls or users."""
+        kind = envelope["kind"]
+        if kind == "notify":
+            if self.notifications is not None:
+                self.notifications.deliver_local(envelope["user"], envelope["message"])
+            return
+        call_id = envelope["callId"]
+        node = envelope["node"]
+        if kind == "broadcast":
+            self._broadcast_local(call_id, envelope["message"], envelope.get("exclude"))
+        elif kind == "direct":
+            connection = self.active_calls.get(call_id, {}).get(envelope["target"])
+            if connection is not None:
+                self.deliver(connection, envelope["message"])
+        elif kind == "join":
+            self.remote_peers.setdefault(call_id, {})[envelope["user"]] = node
+            # tell the joining node who is connected here
+            local = list(self.active_calls.get(call_id, ()))
+            if local:
+                await self.bus.publish(call_id, {"kind": "members", "users": local})
+        elif kind == "members":
+            remote = self.remote_peers.setdefault(call_id, {})
+            for uid in envelope["users"]:
+                remote[uid] = node
+        elif kind == "leave":
+            remote = self.remote_peers.get(call_id, {})
+            if remote.get(envelope["user"]) == node:
+                del remote[envelope["user"]]
+        if kind in ("join", "members", "leave") and call_id in self.topologies:
+            # remote members can't be planned for: a mesh while there are any
+            self._replan(call_id, self.topologies[call_id], set())
+
+    async def _evict(self, connections: List[PeerConnection]) -> None:
+        """Heartbeat callback: drop a batch of connections that stopped answering pings.
+
+        Closing the socket ends each reader loop, which announces peer-disconnected.
+        """
+        for connection in connections:
+            logger.warning(
+                f"stale connection detected for {connection.user_id}@{connection.call_id}"
+            )
+            self.record(connection.call_id, "evicted", sender=connection.user_id)
+            await self.disconnect(connection.call_id, connection.user_id, connection)
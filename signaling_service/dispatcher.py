@@ -0,0 +1,383 @@
+# dispatcher.py - several signaling workers on one host, every call pinned to one
+#
+#   cd signaling_service && python -m dispatcher --host 0.0.0.0 --port 8000 --workers 4
+#
+# The front process owns the listening socket and never speaks HTTP: it accepts a
+# connection, peeks at its request line (MSG_PEEK, nothing is consumed) and passes
+# the socket itself to a worker over a unix socket (SCM_RIGHTS). The worker is a
+# uvicorn server without a listener that adopts the socket and reads the request
+# as if it had accepted it. Routing:
+#   /ws/signaling/{call_id}/...      by call_id, on a consistent hash ring, so every
+#                                    member of a call shares one manager and relaying
+#                                    never leaves the process
+#   /ws/notifications/{user_id}      by user id (invites to users on other workers
+#                                    go through SIGNALING_BUS_URL, as across nodes)
+#   HTTP requests with ?worker=N     worker N: /metrics?worker=N, /admin/...?worker=N
+#                                    (routing is per connection: don't reuse a
+#                                    keep-alive connection for another worker);
+#                                    ignored on /ws/ paths
+#   everything else                  round robin
+# Workers that exit are restarted; while one is down its calls hash to the others.
+# With SIGNALING_SNAPSHOT_PATH each worker keeps its own registry snapshot, so a
+# restarted worker lets the clients of its calls resume.
+# With --workers 1 (SIGNALING_WORKERS unset) this is plain uvicorn.
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+from collections import Counter
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs, unquote
+
+import uvicorn
+
+from config import BUS_URL, SNAPSHOT_PATH, WORKERS
+
+logger = logging.getLogger(__name__)
+
+# a client that hasn't sent its whole request line by then is dropped
+MAX_REQUEST_LINE = 8192
+REQUEST_LINE_TIMEOUT = 10.0
+# points per worker on the hash ring; more spreads calls more evenly
+RING_REPLICAS = 64
+
+
+def _point(key: str) -> int:
+    # stable across processes and restarts, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of routing keys onto workers.
+
+    Every worker owns `replicas` points on the ring and a key belongs to the first
+    point at or after its own hash. Taking a worker out moves only the keys it
+    owned; the other calls stay where they are.
+    """
+
+    def __init__(self, replicas: int = RING_REPLICAS):
+        self.replicas = replicas
+        self.workers: Set[int] = set()
+        self._points: List[int] = []
+        self._owners: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    def add(self, worker: int) -> None:
+        self.workers.add(worker)
+        self._rebuild()
+
+    def remove(self, worker: int) -> None:
+        self.workers.discard(worker)
+        self._rebuild()
+
+    def lookup(self, key: str) -> Optional[int]:
+        if not self._points:
+            return None
+        index = bisect.bisect_left(self._points, _point(key)) % len(self._points)
+        return self._owners[index]
+
+    def _rebuild(self) -> None:
+        ring = sorted(
+            (_point(f"{worker}#{replica}"), worker)
+            for worker in self.workers
+            for replica in range(self.replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [worker for _, worker in ring]
+
+
+def routing_key(request_line: bytes) -> Optional[str]:
+    """What a connection is pinned by, from "GET /path?query HTTP/1.1"; None: any worker."""
+    parts = request_line.split(b" ")
+    if len(parts) != 3:
+        return None
+    path, _, query = parts[1].decode("latin-1").partition("?")
+    segments = path.split("/")
+    if len(segments) >= 2 and segments[1] == "ws":
+        # websockets follow their call / user only: a ?worker=N here would split a
+        # call across workers (and, without a bus, silently in two)
+        if len(segments) >= 4 and segments[3]:
+            if segments[2] == "signaling":
+                return f"call:{unquote(segments[3])}"
+            if segments[2] == "notifications":
+                return f"user:{unquote(segments[3])}"
+        return None
+    worker = parse_qs(query).get("worker")
+    if worker and worker[0].isdigit():
+        return f"worker:{worker[0]}"
+    return None
+
+
+async def _ready(add, remove, sock: socket.socket, timeout: float) -> None:
+    """Wait until `sock` is readable/writable (per add/remove), at most `timeout`."""
+    future = asyncio.get_running_loop().create_future()
+    add(sock.fileno(), lambda: future.done() or future.set_result(None))
+    try:
+        await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        remove(sock.fileno())
+
+
+async def peek_request_line(conn: socket.socket, timeout: float) -> Optional[bytes]:
+    """The request line of a fresh connection, left unread for the worker."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            head = conn.recv(MAX_REQUEST_LINE, socket.MSG_PEEK)
+        except BlockingIOError:
+            head = None
+        else:
+            if not head:
+                return None
+            end = head.find(b"\r\n")
+            if end >= 0:
+                return head[:end]
+            if len(head) >= MAX_REQUEST_LINE:
+                return None
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        if head is None:
+            await _ready(loop.add_reader, loop.remove_reader, conn, remaining)
+        else:
+            # a partial line stays buffered, so the socket keeps polling readable
+            await asyncio.sleep(0.005)
+
+
+class Dispatcher:
+    """Accepts on the shared port and hands every connection to a worker process."""
+
+    def __init__(self, host: str, port: int, workers: int, log_level: str = "info"):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.log_level = log_level
+        self.ring = HashRing()
+        # worker index -> our end of its unix socket, and its process
+        self.channels: Dict[int, socket.socket] = {}
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self.handed_off: Counter = Counter()
+        self.dropped = 0
+        self.restarts = 0
+        self._round_robin = 0
+        self._stopping = False
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        listener = socket.create_server((self.host, self.port), backlog=2048)
+        listener.setblocking(False)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        for index in range(self.workers):
+            self._spawn(index)
+        if not BUS_URL:
+            logger.warning(
+                "no SIGNALING_BUS_URL: notifications only reach users on the same worker"
+            )
+        logger.info(f"dispatching {self.host}:{self.port} to {self.workers} workers")
+
+        acceptor = asyncio.create_task(self._accept(listener))
+        supervisor = asyncio.create_task(self._supervise())
+        await stop.wait()
+
+        self._stopping = True
+        acceptor.cancel()
+        supervisor.cancel()
+        listener.close()
+        for process in self.processes.values():
+            process.terminate()
+        for index, process in self.processes.items():
+            await loop.run_in_executor(None, process.wait)
+            self.channels[index].close()
+        logger.info(
+            f"dispatcher stopped: {dict(self.handed_off)} handed off, "
+            f"{self.dropped} dropped, {self.restarts} worker restarts"
+        )
+
+    def _spawn(self, index: int) -> None:
+        front, back = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        front.setblocking(False)
+        self.processes[index] = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "dispatcher",
+                "--worker",
+                str(index),
+                "--channel",
+                str(back.fileno()),
+                "--log-level",
+                self.log_level,
+            ],
+            pass_fds=[back.fileno()],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=self._worker_env(index),
+        )
+        back.close()
+        self.channels[index] = front
+        self.ring.add(index)
+
+    def _worker_env(self, index: int) -> Dict[str, str]:
+        env = dict(os.environ)
+        if SNAPSHOT_PATH:
+            # a restarted worker gets the same calls back, so it reads its own file
+            env["SIGNALING_SNAPSHOT_PATH"] = f"{SNAPSHOT_PATH}.{index}"
+        return env
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            for index, process in list(self.processes.items()):
+                if process.poll() is None or self._stopping:
+                    continue
+                logger.warning(f"worker {index} exited with {process.returncode}, restarting")
+                self.ring.remove(index)
+                self.channels.pop(index).close()
+                self.restarts += 1
+                self._spawn(index)
+
+    async def _accept(self, listener: socket.socket) -> None:
+        loop = asyncio.get_running_loop()
+        pending = set()
+        while True:
+            conn, _ = await loop.sock_accept(listener)
+            conn.setblocking(False)
+            task = asyncio.create_task(self._dispatch(conn))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+    def _pick(self, key: Optional[str]) -> Optional[int]:
+        if key is not None and key.startswith("worker:"):
+            worker = int(key[7:])
+            return worker if worker in self.ring.workers else None
+        if key is not None:
+            return self.ring.lookup(key)
+        live = sorted(self.ring.workers)
+        if not live:
+            return None
+        self._round_robin += 1
+        return live[self._round_robin % len(live)]
+
+    async def _dispatch(self, conn: socket.socket) -> None:
+        try:
+            line = await peek_request_line(conn, REQUEST_LINE_TIMEOUT)
+            if line is None:
+                self.dropped += 1
+                return
+            key = routing_key(line)
+            # a worker that just died is taken off the ring: its calls go elsewhere
+            for _ in range(2):
+                worker = self._pick(key)
+                if worker is None:
+                    break
+                if await self._hand_off(worker, conn):
+                    self.handed_off[worker] += 1
+                    return
+            self.dropped += 1
+        except Exception:
+            logger.exception("dispatching a connection failed")
+        finally:
+            # the worker holds its own copy of the descriptor now
+            conn.close()
+
+    async def _hand_off(self, worker: int, conn: socket.socket) -> bool:
+        loop = asyncio.get_running_loop()
+        channel = self.channels[worker]
+        while True:
+            try:
+                socket.send_fds(channel, [b"\0"], [conn.fileno()])
+                return True
+            except BlockingIOError:
+                # the worker is behind on adopting sockets
+                await _ready(loop.add_writer, loop.remove_writer, channel, 1.0)
+            except OSError as e:
+                logger.warning(f"worker {worker} unreachable: {e}")
+                self.ring.remove(worker)
+                return False
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn without a listening socket, serving the sockets the dispatcher sends."""
+
+    def __init__(self, config: uvicorn.Config, channel: socket.socket, index: int):
+        super().__init__(config)
+        self.channel = channel
+        self.index = index
+        self._adopting = set()
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=[])
+        asyncio.get_running_loop().add_reader(self.channel.fileno(), self._adopt)
+        logger.info(f"worker {self.index} ({os.getpid()}) serving dispatched connections")
+
+    async def shutdown(self, sockets=None) -> None:
+        asyncio.get_running_loop().remove_reader(self.channel.fileno())
+        await super().shutdown(sockets)
+
+    def _protocol(self):
+        config = self.config
+        return config.http_protocol_class(
+            config=config, server_state=self.server_state, app_state=self.lifespan.state
+        )
+
+    def _adopt(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            _, fds, _, _ = socket.recv_fds(self.channel, 1, 1)
+        except BlockingIOError:
+            return
+        if not fds:
+            # the dispatcher is gone, no more connections will come
+            loop.remove_reader(self.channel.fileno())
+            self.should_exit = True
+            return
+        sock = socket.socket(fileno=fds[0])
+        sock.setblocking(False)
+        task = loop.create_task(
+            loop.connect_accepted_socket(self._protocol, sock, ssl=self.config.ssl)
+        )
+        self._adopting.add(task)
+        task.add_done_callback(self._adopting.discard)
+
+
+def run_worker(index: int, channel_fd: int, log_level: str) -> None:
+    channel = socket.socket(fileno=channel_fd)
+    channel.setblocking(False)
+    config = uvicorn.Config("main:app", log_level=log_level)
+    WorkerServer(config, channel, index).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="signaling workers behind one port")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--log-level", default="info")
+    # set by the dispatcher when it starts a worker
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--channel", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.channel is not None:
+        run_worker(args.worker, args.channel, args.log_level)
+    elif args.workers <= 1:
+        uvicorn.run("main:app", host=args.host, port=args.port, log_level=args.log_level)
+    else:
+        logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s: %(message)s")
+        asyncio.run(Dispatcher(args.host, args.port, args.workers, args.log_level).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# drain.py - move every client off this node before it is stopped
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from fastapi import WebSocket
+
+from codec import JSON, Codec
+from outbound import PeerConnection
+
+logger = logging.getLogger(__name__)
+
+# "service restart": what the connections still here at the deadline are closed with
+RESTART_CLOSE_CODE = 1012
+# a client closes its old socket with this once it is connected to the new node;
+# its peers are not told it left (it didn't), so nobody renegotiates
+MIGRATED_CLOSE_CODE = 4001
+
+
+class NodeDrain:
+    """Drain mode for rolling restarts and scale-downs.
+
+    Once started the node refuses new sockets with a {"type": "reconnect"} hint
+    and sends the same hint to everyone connected. Clients reconnect to `url`
+    (or the same address, for a load balancer to route elsewhere) with ?migrate=1,
+    which joins without new-peer, then close the old socket with
+    MIGRATED_CLOSE_CODE, which leaves without peer-disconnected. Relays keep
+    flowing on old sockets until then; at the deadline whatever is left gets up to
+    one send timeout to flush its queue and is closed with RESTART_CLOSE_CODE.
+    """
+
+    def __init__(self, manager, notifications=None, poll: float = 0.1):
+        self.manager = manager
+        self.notifications = notifications
+        self.poll = poll
+        self.active = False
+        self.url: Optional[str] = None
+        self.started_at = 0.0
+        self.deadline = 0.0
+        self.done = False
+        self.refused = 0
+        self.migrated = 0
+        self.closed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def hint(self) -> dict:
+        return {"type": "reconnect", "url": self.url, "from": "system"}
+
+    def start(self, url: Optional[str], deadline: float) -> bool:
+        """Enter drain mode. Returns False if a drain is already running."""
+        if self.active:
+            return False
+        self.active = True
+        self.done = False
+        self.url = url
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + deadline
+        self._task = asyncio.create_task(self._run())
+        logger.warning(
+            f"draining node: {len(self._connections())} connections, {deadline}s deadline"
+        )
+        return True
+
+    def cancel(self) -> bool:
+        """Accept connections again; clients already told to move keep moving."""
+        if not self.active:
+            return False
+        self.active = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        logger.warning("drain cancelled")
+        return True
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "draining": self.active,
+            "done": self.done,
+            "url": self.url,
+            "elapsed_s": round(now - self.started_at, 3) if self.active else 0.0,
+            "remaining_s": round(max(0.0, self.deadline - now), 3) if self.active else 0.0,
+            "connections": len(self._connections()),
+            "queued": sum(len(c.control) + len(c.data) for c in self._connections()),
+            "refused": self.refused,
+            "migrated": self.migrated,
+            "closed": self.closed,
+        }
+
+    async def refuse(
+        self, websocket: WebSocket, codec: Codec = JSON, subprotocol: Optional[str] = None
+    ) -> None:
+        """Turn a new socket away with the reconnect hint."""
+        self.refused += 1
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+            payload = codec.encode(self.hint())
+            if codec.binary:
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+        except Exception as e:
+            logger.debug(f"refusing socket during drain: {e}")
+        await self.manager._safe_close(websocket, code=RESTART_CLOSE_CODE)
+
+    def _connections(self) -> List[PeerConnection]:
+        connections = [
+            c for call in self.manager.active_calls.values() for c in call.values()
+        ]
+        if self.notifications is not None:
+            connections.extend(c for user in self.notifications.users.values() for c in user)
+        return connections
+
+    async def _run(self) -> None:
+        hint = self.hint()
+        for connection in self._connections():
+            connection.enqueue(hint)
+
+        # clients move at their own pace; done early once the last one is gone
+        while self._connections() and time.monotonic() < self.deadline:
+            await asyncio.sleep(self.poll)
+
+        remaining = self._connections()
+        flush_deadline = time.monotonic() + self.manager.outbound_policy.send_timeout
+        while (
+            any(c.websocket is not None and (c.control or c.data) for c in remaining)
+            and time.monotonic() < flush_deadline
+        ):
+            await asyncio.sleep(self.poll / 10)
+        hub = self.notifications
+        for connection in remaining:
+            if connection.websocket is not None:
+                self.closed += 1
+                await self.manager._safe_close(
+                    connection.websocket, code=RESTART_CLOSE_CODE
+                )
+            # don't wait for the readers to notice; quietly, like a migration
+            if hub is not None and connection in hub.users.get(connection.user_id, ()):
+                await hub.disconnect(connection)
+            else:
+                await self.manager.disconnect(
+                    connection.call_id, connection.user_id, connection
+                )
+        self.done = True
+        logger.warning(f"drain done: {self.migrated} migrated, {self.closed} closed")
@@ -0,0 +1,67 @@
+# flight.py - per-call flight recorder: the last N signaling events of a call
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+# events that mean something went wrong; a call that recorded any of them has its
+# recorder captured when it ends
+ERROR_EVENTS = frozenset(
+    {"invalid", "throttled", "send-failure", "queue-drop", "evicted", "reaped"}
+)
+
+# (monotonic time, event, message type, bytes, sender, target)
+Event = Tuple[float, str, Optional[str], int, Optional[int], Optional[int]]
+
+
+class FlightRecorder:
+    """Fixed-size ring of what happened in one call, cheap enough to always be on.
+
+    Only metadata is kept (event, message type, size, sender, target, time), never
+    message bodies, so SDP and candidates don't end up in dumps. Recording is a
+    tuple and a deque append; nothing is formatted until dump().
+    """
+
+    __slots__ = ("events", "started", "started_wall", "recorded", "errors")
+
+    def __init__(self, size: int = 256):
+        self.events: Deque[Event] = deque(maxlen=size)
+        self.started = time.monotonic()
+        self.started_wall = time.time()
+        self.recorded = 0
+        self.errors = 0
+
+    def record(
+        self,
+        event: str,
+        message_type: Optional[str] = None,
+        size: int = 0,
+        sender: Optional[int] = None,
+        target: Optional[int] = None,
+    ) -> None:
+        self.events.append((time.monotonic(), event, message_type, size, sender, target))
+        self.recorded += 1
+        if event in ERROR_EVENTS:
+            self.errors += 1
+
+    def dump(self, call_id: str, **extra) -> dict:
+        started = self.started
+        return {
+            "callId": call_id,
+            "startedAt": self.started_wall,
+            "recorded": self.recorded,
+            # events that fell off the ring
+            "overwritten": self.recorded - len(self.events),
+            "errors": self.errors,
+            **extra,
+            "events": [
+                {
+                    "t_ms": round((t - started) * 1000, 3),
+                    "event": event,
+                    "type": message_type,
+                    "bytes": size,
+                    "from": sender,
+                    "target": target,
+                }
+                for t, event, message_type, size, sender, target in self.events
+            ],
+        }
@@ -0,0 +1,104 @@
+# heartbeat.py - node-wide liveness tracking on a hashed timing wheel
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+import logging
+
+from outbound import PeerConnection
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatScheduler:
+    """One task checks liveness for every connection on the node.
+
+    Connections sit in the wheel slot of their next deadline. Receiving a message
+    only bumps `connection.last_seen` (no wheel operation). When a slot comes due,
+    each connection in it is either rescheduled (it was active), pinged (idle for
+    `idle_interval`), or collected as dead (pinged and silent for `dead_timeout`).
+    Dead connections of one tick are handed to `on_dead` as a single batch.
+    """
+
+    def __init__(
+        self,
+        on_dead: Callable[[List[PeerConnection]], Awaitable[None]],
+        idle_interval: float = 30.0,
+        dead_timeout: float = 30.0,
+        tick: float = 1.0,
+    ):
+        self.on_dead = on_dead
+        self.idle_interval = idle_interval
+        self.dead_timeout = dead_timeout
+        self.tick = tick
+        # enough slots that no deadline wraps around the wheel
+        size = math.ceil(max(idle_interval, dead_timeout) / tick) + 2
+        self._wheel: List[Set[PeerConnection]] = [set() for _ in range(size)]
+        self._cursor = 0
+        self._cursor_time = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self.pings_sent = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._wheel)
+
+    def track(self, connection: PeerConnection) -> None:
+        if self._task is None or self._task.done():
+            self._cursor_time = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+        connection.touch()
+        self._schedule(connection, connection.last_seen + self.idle_interval)
+
+    def untrack(self, connection: PeerConnection) -> None:
+        if connection.wheel_slot is not None:
+            self._wheel[connection.wheel_slot].discard(connection)
+            connection.wheel_slot = None
+
+    def _schedule(self, connection: PeerConnection, deadline: float) -> None:
+        ticks = max(1, math.ceil((deadline - self._cursor_time) / self.tick))
+        ticks = min(ticks, len(self._wheel) - 1)
+        slot = (self._cursor + ticks) % len(self._wheel)
+        self.untrack(connection)
+        self._wheel[slot].add(connection)
+        connection.wheel_slot = slot
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            # catch up on every slot that came due, even if the loop was late
+            while self._cursor_time + self.tick <= time.monotonic():
+                try:
+                    await self._advance()
+                except Exception:
+                    logger.exception("heartbeat tick failed")
+
+    async def _advance(self) -> None:
+        self._cursor = (self._cursor + 1) % len(self._wheel)
+        self._cursor_time += self.tick
+        due = self._wheel[self._cursor]
+        if not due:
+            return
+        self._wheel[self._cursor] = set()
+
+        now = time.monotonic()
+        dead = []
+        for connection in due:
+            connection.wheel_slot = None
+            if connection.closed:
+                continue
+            if now - connection.last_seen < self.idle_interval:
+                # active since it was scheduled, just move it along
+                self._schedule(connection, connection.last_seen + self.idle_interval)
+            elif connection.pinged_at <= connection.last_seen:
+                connection.pinged_at = now
+                self.pings_sent += 1
+                connection.enqueue({"type": "ping"})
+                self._schedule(connection, now + self.dead_timeout)
+            else:
+                dead.append(connection)
+
+        if dead:
+            self.evicted += len(dead)
+            logger.info(f"evicting {len(dead)} unresponsive connections")
+            await self.on_dead(dead)
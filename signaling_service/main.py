@@ -1,10 +1,16 @@
-from fastapi import FastAPI
-from signaling import router
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from signaling import coalescer, drain, manager, router, shedder
 from dotenv import load_dotenv
-from fastapi import FastAPI
 
 from fastapi.middleware.cors import CORSMiddleware
 
+from admin import router as admin_router
+from bus import RabbitMQSignalingBus
+from config import BUS_URL
+from metrics import REGISTRY, SignalingCollector
+
 load_dotenv()
 
 
@@ -16,7 +22,24 @@ origins = [
 ]
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: join the other signaling nodes if a bus is configured
+    if BUS_URL:
+        await manager.attach_bus(RabbitMQSignalingBus(BUS_URL))
+    # take back the calls this node had before it crashed or restarted
+    await manager.snapshot.restore()
+
+    yield
+
+    # Shutdown: connections closed by the server are parked by now, so they are
+    # written too and the next start lets their clients resume
+    await manager.snapshot.close()
+    if manager.bus is not None:
+        await manager.bus.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -27,3 +50,21 @@ app.add_middleware(
 
 
 app.include_router(router)
+app.include_router(admin_router)
+
+REGISTRY.register(SignalingCollector(manager, coalescer, shedder))
+
+
+@app.get("/ready")
+async def readiness():
+    """503 while draining or shedding, so the load balancer sends new clients elsewhere."""
+    if drain.active:
+        return Response("draining", status_code=503)
+    if shedder.shedding is not None:
+        return Response("overloaded", status_code=503)
+    return Response("ok")
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,84 @@
+# membership.py - versioned membership log of a call, for incremental peer-list deltas
+from collections import deque
+from typing import Deque, Dict, Iterable, Tuple
+
+# clients list this in ?features= to get "peer-delta" frames instead of a
+# peer-list snapshot on join plus a new-peer / peer-disconnected per change
+PEER_DELTA_FEATURE = "peer-delta"
+
+# broadcasts that change membership; recorded in the log, not sent to delta clients
+MEMBERSHIP_TYPES = frozenset({"new-peer", "peer-disconnected"})
+
+
+class MembershipLog:
+    """Who is in a call, as a monotonically versioned log of joins and leaves.
+
+    Every join or leave bumps `version`. `members` maps each present user to the
+    version of their join, so a client can tell a rejoin (new version, needs a new
+    RTCPeerConnection) from a delta it has already applied. Entries at or below
+    `floor` have been compacted away; a client acknowledged below it gets a reset.
+    """
+
+    __slots__ = ("version", "floor", "members", "entries", "max_entries", "timer")
+
+    def __init__(self, present: Iterable[int] = (), max_entries: int = 4096):
+        self.version = 0
+        self.floor = 0
+        # users already in the call when the log was created count as joined at 0
+        self.members: Dict[int, int] = dict.fromkeys(present, 0)
+        self.entries: Deque[Tuple[int, int, bool]] = deque()
+        self.max_entries = max_entries
+        # pending flush of the next delta frame, owned by the manager
+        self.timer = None
+
+    def record(self, user_id: int, joined: bool) -> int:
+        self.version += 1
+        if joined:
+            self.members[user_id] = self.version
+        else:
+            self.members.pop(user_id, None)
+        self.entries.append((self.version, user_id, joined))
+        if len(self.entries) > self.max_entries:
+            self.floor = self.entries.popleft()[0]
+        return self.version
+
+    def compact(self, acknowledged: int) -> None:
+        """Forget entries every client has acknowledged."""
+        entries = self.entries
+        while entries and entries[0][0] <= acknowledged:
+            self.floor = entries.popleft()[0]
+
+    def delta(self, base: int) -> dict:
+        """A "peer-delta" taking a client from version `base` to the current one.
+
+        Applying it twice, or on top of a later version than `base`, is harmless.
+        `added` holds [peerId, joinVersion] pairs (a reset one lists every member,
+        so it stays compact), `removed` peer ids. With "reset" the client replaces
+        its peers with `added` instead of merging.
+        """
+        if base <= 0 or base < self.floor:
+            return {
+                "type": "peer-delta",
+                "base": base,
+                "version": self.version,
+                "reset": True,
+                "added": [[u, v] for u, v in self.members.items()],
+                "removed": [],
+                "from": "system",
+            }
+        # the last event per user since `base` decides which side they end up on
+        last: Dict[int, bool] = {}
+        for version, user_id, joined in reversed(self.entries):
+            if version <= base:
+                break
+            if user_id not in last:
+                last[user_id] = joined
+        return {
+            "type": "peer-delta",
+            "base": base,
+            "version": self.version,
+            "reset": False,
+            "added": [[u, self.members[u]] for u, joined in last.items() if joined],
+            "removed": [u for u, joined in last.items() if not joined],
+            "from": "system",
+        }
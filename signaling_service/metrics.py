@@ -0,0 +1,368 @@
+# metrics.py - Prometheus instrumentation for the signaling node
+#
+# The node is a single asyncio thread, so the hot path records into plain ints,
+# dicts and EventHistograms (no locks, no label lookups); prometheus_client is only
+# used to format them on scrape. Anything that is a current state (calls, peers per
+# call, queue depth, heartbeat and compression counters) is read from the manager at
+# scrape time by SignalingCollector, so it costs nothing between scrapes.
+import bisect
+from collections import Counter
+from typing import Dict, Optional, Sequence
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily,
+)
+
+REGISTRY = CollectorRegistry()
+
+
+class EventHistogram:
+    """Fixed-bucket histogram for the event loop thread: observe is a bisect and two adds."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def family(self, name: str, documentation: str) -> HistogramMetricFamily:
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets.append((repr(float(bound)), cumulative))
+        buckets.append(("+Inf", cumulative + self.counts[-1]))
+        return HistogramMetricFamily(
+            name, documentation, buckets=buckets, sum_value=self.sum
+        )
+
+
+# client message types that get their own label; anything else counts as "other" so
+# a misbehaving client can't create series
+RELAYED_TYPES = frozenset(
+    {
+        "offer",
+        "answer",
+        "ice-candidate",
+        "join-call",
+        "call-invite",
+        "call-accept",
+        "call-decline",
+    }
+)
+
+# client messages relayed, by type; every label is there from the start, so counting
+# is one dict lookup and no Counter.__missing__ on the per-message path
+MESSAGES_RELAYED: Dict[str, int] = dict.fromkeys((*RELAYED_TYPES, "other"), 0)
+# local recipients of one broadcast
+BROADCAST_FANOUT = EventHistogram((0, 1, 2, 3, 4, 6, 8, 12, 16, 32, 64, 128))
+# duration of one websocket write
+SEND_SECONDS = EventHistogram(
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+# connections dropped because a write failed, by reason (late, error, overflow)
+SEND_FAILURES: Counter = Counter()
+# messages discarded by an outbound queue overflow policy, by lane
+QUEUE_DROPS: Counter = Counter()
+# inbound messages dropped by rate limiting, by message class
+THROTTLED: Counter = Counter()
+# connections closed for exceeding their rate limits, by the class that tripped it
+RATE_LIMIT_DISCONNECTS: Counter = Counter()
+# inbound messages rejected by their schema (models.py), by type
+INVALID_MESSAGES: Dict[str, int] = dict.fromkeys((*RELAYED_TYPES, "peer-ack", "other"), 0)
+
+
+def count_relayed(message_type: Optional[str]) -> None:
+    MESSAGES_RELAYED[message_type if message_type in MESSAGES_RELAYED else "other"] += 1
+
+
+def count_invalid(message_type: Optional[str]) -> None:
+    INVALID_MESSAGES[message_type if message_type in INVALID_MESSAGES else "other"] += 1
+
+
+def _labelled(name: str, documentation: str, label: str, counts: Dict[str, int]):
+    family = CounterMetricFamily(name, documentation, labels=[label])
+    for value, count in sorted(counts.items()):
+        family.add_metric([value], count)
+    return family
+
+
+PEERS_PER_CALL_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32, 64, 128)
+
+
+class SignalingCollector:
+    """Scrape-time view of a CallConnectionManager (and optionally its IceCoalescer
+    and LoadShedder)."""
+
+    def __init__(self, manager, coalescer=None, shedder=None):
+        self.manager = manager
+        self.coalescer = coalescer
+        self.shedder = shedder
+
+    def collect(self):
+        yield _labelled(
+            "signaling_messages_relayed",
+            "Client messages relayed to peers, by type",
+            "type",
+            MESSAGES_RELAYED,
+        )
+        yield BROADCAST_FANOUT.family(
+            "signaling_broadcast_fanout", "Local recipients of one broadcast"
+        )
+        yield SEND_SECONDS.family(
+            "signaling_send_seconds", "Duration of one websocket write"
+        )
+        yield _labelled(
+            "signaling_send_failures",
+            "Connections dropped because a write failed, by reason",
+            "reason",
+            SEND_FAILURES,
+        )
+        yield _labelled(
+            "signaling_queue_drops",
+            "Messages discarded by an outbound queue overflow policy, by lane",
+            "lane",
+            QUEUE_DROPS,
+        )
+        yield _labelled(
+            "signaling_throttled",
+            "Inbound messages dropped by rate limiting, by message class",
+            "class",
+            THROTTLED,
+        )
+        yield _labelled(
+            "signaling_rate_limit_disconnects",
+            "Connections closed for exceeding their rate limits, by message class",
+            "class",
+            RATE_LIMIT_DISCONNECTS,
+        )
+        yield _labelled(
+            "signaling_invalid_messages",
+            "Inbound messages rejected by schema validation, by type",
+            "type",
+            INVALID_MESSAGES,
+        )
+
+        manager = self.manager
+        calls = manager.active_calls
+
+        yield GaugeMetricFamily(
+            "signaling_active_calls", "Calls with at least one local peer", value=len(calls)
+        )
+
+        sizes = EventHistogram(PEERS_PER_CALL_BUCKETS)
+        peers = control = data = deepest = 0
+        for call in calls.values():
+            sizes.observe(len(call))
+            peers += len(call)
+            for connection in call.values():
+                depth = len(connection.control) + len(connection.data)
+                control += len(connection.control)
+                data += len(connection.data)
+                if depth > deepest:
+                    deepest = depth
+        yield sizes.family("signaling_peers_per_call", "Local peers per active call")
+        yield GaugeMetricFamily(
+            "signaling_connections", "Local websocket connections", value=peers
+        )
+
+        depth = GaugeMetricFamily(
+            "signaling_outbound_queue_depth",
+            "Messages waiting in outbound queues, by lane",
+            labels=["lane"],
+        )
+        depth.add_metric(["control"], control)
+        depth.add_metric(["data"], data)
+        yield depth
+        yield GaugeMetricFamily(
+            "signaling_outbound_queue_depth_max",
+            "Deepest outbound queue of any connection",
+            value=deepest,
+        )
+
+        heartbeat = manager.heartbeat
+        yield CounterMetricFamily(
+            "signaling_heartbeat_pings",
+            "Pings sent to idle connections",
+            value=heartbeat.pings_sent,
+        )
+        yield CounterMetricFamily(
+            "signaling_stale_evictions",
+            "Connections evicted for not answering pings",
+            value=heartbeat.evicted,
+        )
+
+        yield CounterMetricFamily(
+            "signaling_resumes", "Sessions resumed on a new socket", value=manager.resumes
+        )
+        yield CounterMetricFamily(
+            "signaling_resume_failures",
+            "Resume attempts that fell back to a fresh join",
+            value=manager.resume_failures,
+        )
+        yield CounterMetricFamily(
+            "signaling_renegotiations_avoided",
+            "Peer connections kept alive by resumed sessions",
+            value=manager.renegotiations_avoided,
+        )
+        yield GaugeMetricFamily(
+            "signaling_parked_connections",
+            "Connections waiting for their client to resume",
+            value=sum(1 for c in manager.sessions.values() if c.parked is not None),
+        )
+
+        reaper = manager.reaper
+        yield CounterMetricFamily(
+            "signaling_idle_calls_reaped",
+            "Calls evicted after receiving nothing for the idle TTL",
+            value=reaper.calls_reaped,
+        )
+        yield CounterMetricFamily(
+            "signaling_idle_connections_reaped",
+            "Connections evicted with their idle calls",
+            value=reaper.connections_reaped,
+        )
+        yield CounterMetricFamily(
+            "signaling_orphans_swept",
+            "Per-call entries and resume tokens left behind by ended calls",
+            value=reaper.orphans_swept,
+        )
+
+        yield CounterMetricFamily(
+            "signaling_membership_events",
+            "Joins and leaves recorded in call membership logs",
+            value=manager.membership_events,
+        )
+        yield CounterMetricFamily(
+            "signaling_peer_deltas_sent",
+            "Collapsed peer-delta frames queued for delta clients",
+            value=manager.peer_deltas_sent,
+        )
+        yield GaugeMetricFamily(
+            "signaling_topology_tree_calls",
+            "Calls running as a relay tree instead of a full mesh",
+            value=sum(1 for plan in manager.topologies.values() if plan.tree),
+        )
+        yield CounterMetricFamily(
+            "signaling_topology_plans_sent",
+            "Topology plans queued for clients whose peer connections changed",
+            value=manager.topology_plans_sent,
+        )
+
+        yield CounterMetricFamily(
+            "signaling_offers", "Targeted offers relayed", value=manager.offers
+        )
+        yield CounterMetricFamily(
+            "signaling_renegotiations",
+            "Offers along a sender->target direction that already had one",
+            value=manager.renegotiations,
+        )
+        yield CounterMetricFamily(
+            "signaling_codec_intersections_sent",
+            "codec-intersection frames queued for clients publishing capabilities",
+            value=manager.intersections_sent,
+        )
+
+        snapshot = manager.snapshot
+        yield CounterMetricFamily(
+            "signaling_snapshot_bytes",
+            "Bytes appended to the registry snapshot (compactions included)",
+            value=snapshot.bytes_written,
+        )
+        yield CounterMetricFamily(
+            "signaling_snapshot_compactions",
+            "Rewrites of the registry snapshot down to one line per call",
+            value=snapshot.compactions,
+        )
+        yield GaugeMetricFamily(
+            "signaling_snapshot_restored_sessions",
+            "Sessions taken back from the registry snapshot at startup",
+            value=snapshot.restored_sessions,
+        )
+        yield CounterMetricFamily(
+            "signaling_snapshot_restored_resumes",
+            "Restored sessions whose client came back and resumed",
+            value=snapshot.restored_resumes,
+        )
+
+        hub = manager.notifications
+        if hub is not None:
+            yield GaugeMetricFamily(
+                "signaling_notification_users",
+                "Users with a notification socket on this node",
+                value=len(hub.users),
+            )
+            yield GaugeMetricFamily(
+                "signaling_notification_connections",
+                "Local notification websocket connections",
+                value=sum(len(c) for c in hub.users.values()),
+            )
+            yield CounterMetricFamily(
+                "signaling_notifications_delivered",
+                "Notifications queued on local notification sockets",
+                value=hub.delivered,
+            )
+
+        stats = manager.deflater.stats
+        yield CounterMetricFamily(
+            "signaling_deflate_frames", "Frames sent deflated", value=stats.frames
+        )
+        yield CounterMetricFamily(
+            "signaling_deflate_input_bytes",
+            "Bytes before compression",
+            value=stats.bytes_in,
+        )
+        yield CounterMetricFamily(
+            "signaling_deflate_output_bytes",
+            "Bytes after compression",
+            value=stats.bytes_out,
+        )
+        yield CounterMetricFamily(
+            "signaling_deflate_cpu_seconds",
+            "CPU time spent compressing",
+            value=stats.cpu_seconds,
+        )
+
+        if self.coalescer is not None:
+            yield CounterMetricFamily(
+                "signaling_ice_frames_saved",
+                "ICE frames avoided by batching candidates",
+                value=self.coalescer.frames_saved,
+            )
+
+        shedder = self.shedder
+        if shedder is not None:
+            yield GaugeMetricFamily(
+                "signaling_loop_lag_seconds",
+                "Smoothed event loop lag the load shedder acts on",
+                value=shedder.lag,
+            )
+            yield shedder.lag_samples.family(
+                "signaling_loop_lag_sample_seconds", "Event loop lag per probe"
+            )
+            shedding = GaugeMetricFamily(
+                "signaling_shedding",
+                "1 while new joins are being shed, by reason",
+                labels=["reason"],
+            )
+            for reason in ("lag", "queue"):
+                shedding.add_metric([reason], 1 if shedder.shedding == reason else 0)
+            yield shedding
+            yield CounterMetricFamily(
+                "signaling_joins_admitted",
+                "New joins let in by admission control",
+                value=shedder.admitted,
+            )
+            yield _labelled(
+                "signaling_joins_shed",
+                "New joins closed with 1013 while overloaded, by reason",
+                "reason",
+                shedder.shed,
+            )
@@ -0,0 +1,206 @@
+# models.py - schemas of the messages clients send, validated on the hot path
+#
+# TypedDicts rather than BaseModels: the compiled validator only checks the decoded
+# dict (no model instance is built) and the relay keeps forwarding the raw frame.
+# Fields not listed here (userData, from, ...) pass through untouched.
+from typing import List, Literal, Optional, Union
+
+from pydantic import Field, TypeAdapter, ValidationError
+from typing_extensions import Annotated, NotRequired, TypedDict
+
+from config import MAX_CANDIDATE_LENGTH, MAX_SDP_LENGTH
+
+# a call id is a chat/call identifier, not a payload
+CallId = Union[Annotated[str, Field(min_length=1, max_length=128)], int]
+# a peer or user id; numeric strings are accepted the way int(target) used to
+PeerId = int
+# most targets of one invite (a group chat's members)
+MAX_INVITE_TARGETS = 256
+# largest capacity hint a client may report
+MAX_CAPACITY = 64
+# codecs per media kind in one "capabilities" message, and the longest name
+MAX_CODECS = 32
+MAX_CODEC_NAME = 64
+
+
+class Ping(TypedDict):
+    type: Literal["ping"]
+
+
+class Pong(TypedDict):
+    type: Literal["pong"]
+
+
+class PeerAck(TypedDict):
+    type: Literal["peer-ack"]
+    version: Annotated[int, Field(strict=True, ge=0)]
+
+
+class Offer(TypedDict):
+    type: Literal["offer"]
+    sdp: Annotated[str, Field(max_length=MAX_SDP_LENGTH)]
+    target: NotRequired[PeerId]
+
+
+class Answer(TypedDict):
+    type: Literal["answer"]
+    sdp: Annotated[str, Field(max_length=MAX_SDP_LENGTH)]
+    target: NotRequired[PeerId]
+
+
+class Candidate(TypedDict):
+    # RTCIceCandidate.toJSON(); an empty candidate marks the end of gathering
+    candidate: Annotated[str, Field(max_length=MAX_CANDIDATE_LENGTH)]
+    sdpMid: NotRequired[Optional[Annotated[str, Field(max_length=32)]]]
+    sdpMLineIndex: NotRequired[Optional[int]]
+    usernameFragment: NotRequired[Optional[Annotated[str, Field(max_length=256)]]]
+
+
+class IceCandidate(TypedDict):
+    type: Literal["ice-candidate"]
+    candidate: Candidate
+    target: NotRequired[PeerId]
+
+
+class Capacity(TypedDict):
+    type: Literal["capacity"]
+    # peer connections the client can hold, for topology plans
+    maxPeers: Annotated[int, Field(strict=True, ge=1, le=MAX_CAPACITY)]
+
+
+# codec names (RTCRtpCodec mimeType subtypes: "opus", "VP9", ...), most preferred first
+CodecList = Annotated[
+    List[Annotated[str, Field(min_length=1, max_length=MAX_CODEC_NAME)]],
+    Field(max_length=MAX_CODECS),
+]
+
+
+class Capabilities(TypedDict):
+    type: Literal["capabilities"]
+    audio: NotRequired[CodecList]
+    video: NotRequired[CodecList]
+
+
+class JoinCall(TypedDict):
+    type: Literal["join-call"]
+
+
+class CallInvite(TypedDict):
+    type: Literal["call-invite"]
+    callId: CallId
+
+
+class CallAccept(TypedDict):
+    type: Literal["call-accept"]
+    callId: CallId
+
+
+class CallDecline(TypedDict):
+    type: Literal["call-decline"]
+    callId: CallId
+
+
+SignalingMessage = Annotated[
+    Union[
+        Ping,
+        Pong,
+        PeerAck,
+        Capacity,
+        Capabilities,
+        Offer,
+        Answer,
+        IceCandidate,
+        JoinCall,
+        CallInvite,
+        CallAccept,
+        CallDecline,
+    ],
+    Field(discriminator="type"),
+]
+
+
+class NotificationInvite(TypedDict):
+    type: Literal["call-invite"]
+    callId: CallId
+    targets: Annotated[List[PeerId], Field(max_length=MAX_INVITE_TARGETS)]
+
+
+class NotificationReply(TypedDict):
+    type: Literal["call-accept", "call-decline"]
+    callId: CallId
+    target: PeerId
+
+
+NotificationMessage = Annotated[
+    Union[Ping, Pong, NotificationInvite, NotificationReply],
+    Field(discriminator="type"),
+]
+
+# built once at import; validate_python on a dict is the whole per-message cost
+SIGNALING_ADAPTER = TypeAdapter(SignalingMessage)
+NOTIFICATION_ADAPTER = TypeAdapter(NotificationMessage)
+
+SIGNALING_TYPES = frozenset(
+    {
+        "ping",
+        "pong",
+        "peer-ack",
+        "capacity",
+        "capabilities",
+        "offer",
+        "answer",
+        "ice-candidate",
+        "join-call",
+        "call-invite",
+        "call-accept",
+        "call-decline",
+    }
+)
+NOTIFICATION_TYPES = frozenset({"ping", "pong", "call-invite", "call-accept", "call-decline"})
+
+
+def _describe(error: ValidationError) -> str:
+    """First problem only, e.g. "sdp: String should have at most 65536 characters"."""
+    first = error.errors(include_url=False, include_context=False, include_input=False)[0]
+    # drop the union tag pydantic puts first ("offer.sdp" -> "sdp")
+    loc = ".".join(str(part) for part in first["loc"][1:]) or "message"
+    return f"{loc}: {first['msg']}"
+
+
+def _check(adapter: TypeAdapter, known: frozenset, message, strict: bool) -> Optional[str]:
+    if not isinstance(message, dict):
+        return "invalid message format"
+    message_type = message.get("type")
+    if not isinstance(message_type, str):
+        # before the set lookup, which a list or dict "type" would break
+        return "type: Input should be a valid string"
+    if message_type not in known:
+        # a set lookup, before any validator runs
+        return f"unsupported type {message_type}" if strict else None
+    try:
+        adapter.validate_python(message)
+    except ValidationError as e:
+        return _describe(e)
+    return None
+
+
+def check_signaling(message, strict: bool = False) -> Optional[str]:
+    """Validate a decoded signaling message; returns an error for the client or None.
+
+    Types this node doesn't know are relayed untouched unless `strict`, so clients
+    can add their own without a server release. Their "target" is still checked: the
+    relay routes every message on int(target).
+    """
+    if isinstance(message, dict):
+        target = message.get("target")
+        if target is not None and type(target) is not int:
+            try:
+                int(target)
+            except (TypeError, ValueError, OverflowError):
+                return "target: Input should be a valid integer"
+    return _check(SIGNALING_ADAPTER, SIGNALING_TYPES, message, strict)
+
+
+def check_notification(message) -> Optional[str]:
+    """Validate a decoded notification-socket message; unknown types are errors."""
+    return _check(NOTIFICATION_ADAPTER, NOTIFICATION_TYPES, message, strict=True)
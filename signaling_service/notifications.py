@@ -0,0 +1,124 @@
+# notifications.py - user-scoped channel for call invites, accepts and declines
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import WebSocket
+
+from codec import JSON
+from heartbeat import HeartbeatScheduler
+from outbound import OutboundPolicy, PeerConnection
+from ratelimit import Buckets, ConnectionLimiter
+
+logger = logging.getLogger(__name__)
+
+# call_id of a user's notification sockets (logs, flight recorder); on the bus they
+# have their own "user.<id>" keys, apart from every call's
+USER_CHANNEL_PREFIX = "user:"
+
+
+def user_channel(user_id: int) -> str:
+    return f"{USER_CHANNEL_PREFIX}{user_id}"
+
+
+class NotificationHub:
+    """Routes call notifications to users rather than to calls.
+
+    Every online user keeps one socket (one per tab) on /ws/notifications/{user_id},
+    indexed here by user id, instead of a signaling socket per chat just to hear
+    call-invite broadcasts. Connections reuse PeerConnection's queue and writer;
+    their call_id is the user's bus channel. With a bus attached to the manager,
+    notifications for users connected to other nodes travel as "notify" envelopes.
+    """
+
+    def __init__(
+        self,
+        manager,
+        outbound_policy: Optional[OutboundPolicy] = None,
+        heartbeat_interval: float = 30.0,
+        heartbeat_timeout: float = 30.0,
+    ):
+        self.manager = manager
+        manager.notifications = self
+        self.outbound_policy = outbound_policy or manager.outbound_policy
+        # user_id -> that user's sockets; tuples are replaced, never mutated
+        self.users: Dict[int, Tuple[PeerConnection, ...]] = {}
+        self.heartbeat = HeartbeatScheduler(
+            self._evict, idle_interval=heartbeat_interval, dead_timeout=heartbeat_timeout
+        )
+        self.delivered = 0
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> Optional[PeerConnection]:
+        try:
+            await websocket.accept()
+        except Exception:
+            logger.exception(f"Failed to accept notification socket for {user_id}")
+            return None
+        connection = PeerConnection(
+            user_channel(user_id),
+            user_id,
+            websocket,
+            self.outbound_policy,
+            self._on_send_failure,
+            codec=JSON,
+        )
+        connection.start()
+        self.heartbeat.track(connection)
+        current = self.users.get(user_id, ())
+        self.users[user_id] = current + (connection,)
+        if not current and self.manager.bus is not None:
+            await self.manager.bus.subscribe_user(user_id)
+        return connection
+
+    async def disconnect(self, connection: PeerConnection) -> None:
+        user_id = connection.user_id
+        current = self.users.get(user_id, ())
+        if connection in current:
+            remaining = tuple(c for c in current if c is not connection)
+            if remaining:
+                self.users[user_id] = remaining
+            else:
+                del self.users[user_id]
+                if self.manager.bus is not None:
+                    await self.manager.bus.unsubscribe_user(user_id)
+        connection.stop()
+        self.heartbeat.untrack(connection)
+        await self.manager._safe_close(connection.websocket)
+
+    def limiter(self) -> Optional[ConnectionLimiter]:
+        """The manager's per-connection limits; there is no call to share buckets with."""
+        policy = self.manager.rate_limits
+        if policy is None:
+            return None
+        return ConnectionLimiter(policy, Buckets({}), time.monotonic())
+
+    def deliver_local(self, user_id: int, message: dict) -> int:
+        """Queue a notification on every local socket of a user."""
+        queued = 0
+        for connection in self.users.get(user_id, ()):
+            if connection.enqueue(message):
+                queued += 1
+        self.delivered += queued
+        return queued
+
+    async def notify(self, user_ids: Iterable[int], message: dict) -> int:
+        """Send a notification to users wherever they are connected.
+
+        Returns the number of local sockets it was queued on.
+        """
+        queued = 0
+        bus = self.manager.bus
+        for user_id in user_ids:
+            queued += self.deliver_local(user_id, message)
+            if bus is not None:
+                await bus.publish_user(
+                    user_id, {"kind": "notify", "user": user_id, "message": message}
+                )
+        return queued
+
+    async def _on_send_failure(self, connection: PeerConnection, reason: str) -> None:
+        await self.disconnect(connection)
+
+    async def _evict(self, connections: List[PeerConnection]) -> None:
+        for connection in connections:
+            logger.warning(f"stale notification socket for {connection.user_id}")
+            await self.disconnect(connection)
@@ -0,0 +1,285 @@
+# outbound.py - per-connection outbound queues and writer task
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, FrozenSet, Optional, Tuple, Union
+from fastapi import WebSocket
+import logging
+
+import metrics
+from codec import JSON, Codec, Frame, as_frame
+from compression import Deflater
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(str, Enum):
+    DROP_NEWEST = "drop-newest"  # refuse the message that does not fit
+    DROP_OLDEST = "drop-oldest"  # evict the oldest queued message to make room
+    DISCONNECT = "disconnect"  # the peer can't keep up, drop the connection
+
+
+# membership / call-control messages must never sit behind a burst of ICE or SDP
+CONTROL_TYPES = frozenset(
+    {
+        "peer-list",
+        "new-peer",
+        "peer-disconnected",
+        "session-resumed",
+        "peer-delta",
+        "topology",
+        "codec-intersection",
+        "throttled",
+        "reconnect",
+        "call-invite",
+        "call-accept",
+        "call-decline",
+        "ping",
+        "pong",
+    }
+)
+
+
+# an idle connection's lanes: every empty lane shares this instead of holding its
+# own deque (~760 bytes each), a deque is only allocated while frames are queued
+EMPTY_LANE: Tuple[()] = ()
+
+Lane = Union[Deque[Frame], Tuple[()]]
+
+
+def lane_of(message: Union[dict, Frame]) -> str:
+    return "control" if as_frame(message).type in CONTROL_TYPES else "data"
+
+
+@dataclass(frozen=True)
+class OutboundPolicy:
+    control_limit: int = 64
+    data_limit: int = 256
+    control_overflow: OverflowPolicy = OverflowPolicy.DISCONNECT
+    data_overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST
+    # seconds a single websocket write may take before the peer counts as too slow
+    send_timeout: float = 5.0
+
+
+class PeerConnection:
+    """One registered websocket plus its prioritized outbound queue.
+
+    Relaying coroutines only enqueue; a writer task drains the control lane
+    before the data lane, so a flood of ICE candidates never delays a call-accept
+    or peer-disconnected. The writer only exists while something is queued: it is
+    started by the enqueue that finds it absent and exits once both lanes are
+    empty, so an idle connection holds no task, event or deque. Write failures
+    (deadline missed, socket error, DISCONNECT overflow) are reported once through
+    `on_failure` and stop the writer.
+    """
+
+    __slots__ = (
+        "call_id",
+        "user_id",
+        "websocket",
+        "policy",
+        "features",
+        "codec",
+        "deflater",
+        "deflate_context",
+        "control",
+        "data",
+        "dropped",
+        "closed",
+        "last_seen",
+        "pinged_at",
+        "wheel_slot",
+        "resume_token",
+        "parked",
+        "peer_version",
+        "_on_failure",
+        "_overflowed",
+        "_writer",
+    )
+
+    def __init__(
+        self,
+        call_id: str,
+        user_id: int,
+        websocket: WebSocket,
+        policy: OutboundPolicy,
+        on_failure: Callable[["PeerConnection", str], Awaitable[None]],
+        features: FrozenSet[str] = frozenset(),
+        codec: Codec = JSON,
+        deflater: Optional[Deflater] = None,
+    ):
+        self.call_id = call_id
+        self.user_id = user_id
+        self.websocket = websocket
+        self.policy = policy
+        # optional protocol extensions the client negotiated at connect time
+        self.features = features
+        # wire encoding negotiated through the websocket subprotocol
+        self.codec = codec
+        # set when the client negotiated ?features=deflate
+        self.deflater = deflater
+        self.deflate_context = deflater.open_context() if deflater is not None else None
+        self.control: Lane = EMPTY_LANE
+        self.data: Lane = EMPTY_LANE
+        self.dropped = 0
+        self.closed = False
+        # liveness bookkeeping owned by heartbeat.HeartbeatScheduler
+        self.last_seen = time.monotonic()
+        self.pinged_at = 0.0
+        self.wheel_slot: Optional[int] = None
+        # session resumption, owned by the manager: the token a client reconnects with
+        # and the grace timer task while the socket is gone (queues keep filling meanwhile)
+        self.resume_token: Optional[str] = None
+        self.parked: Optional[asyncio.Task] = None
+        # last membership version the client acknowledged (peer-delta feature)
+        self.peer_version = 0
+        self._on_failure = on_failure
+        self._overflowed = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Send whatever queued up; from here on enqueue() starts the writer itself."""
+        if self.control or self.data or self._overflowed:
+            self._wake()
+
+    def _wake(self) -> None:
+        # no writer while parked (websocket None): queues fill for a resume
+        if self._writer is None and self.websocket is not None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def detach(self) -> None:
+        """Stop writing to the current socket but keep the queued messages for a resume."""
+        self.websocket = None
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._writer = None
+
+    def attach(self, websocket: WebSocket, codec: Codec) -> None:
+        """Continue on a new socket; whatever queued up since detach() is sent first."""
+        self.websocket = websocket
+        self.codec = codec
+        if self.deflater is not None:
+            # the client starts a fresh inflater on the new socket
+            self.deflater.release_context(self.deflate_context)
+            self.deflate_context = self.deflater.open_context()
+        self.last_seen = time.monotonic()
+        self.pinged_at = 0.0
+        self.start()
+
+    def touch(self) -> None:
+        """Record inbound activity; cheap enough to call for every message."""
+        self.last_seen = time.monotonic()
+
+    @property
+    def overflowed(self) -> bool:
+        return self._overflowed
+
+    @property
+    def queue_depth(self) -> Dict[str, int]:
+        return {"control": len(self.control), "data": len(self.data)}
+
+    def enqueue(self, message: Union[dict, Frame], headroom: int = 0) -> bool:
+        """Queue a message for the writer. Returns False if it was not accepted.
+
+        `headroom` raises the control lane's limit for this message: membership
+        broadcasts pass one sized from the call, so a join storm in a large call
+        doesn't read as a client that can't keep up.
+        """
+        if self.closed or self._overflowed:
+            return False
+        frame = as_frame(message)
+        if frame.type in CONTROL_TYPES:
+            lane, limit, overflow = (
+                self.control,
+                self.policy.control_limit + headroom,
+                self.policy.control_overflow,
+            )
+            if lane is EMPTY_LANE:
+                lane = self.control = deque()
+        else:
+            lane, limit, overflow = (
+                self.data,
+                self.policy.data_limit,
+                self.policy.data_overflow,
+            )
+            if lane is EMPTY_LANE:
+                lane = self.data = deque()
+
+        if len(lane) >= limit:
+            self.dropped += 1
+            if overflow is OverflowPolicy.DROP_NEWEST:
+                return False
+            if overflow is OverflowPolicy.DROP_OLDEST:
+                lane.popleft()
+            else:
+                # let the writer report it, enqueue can't await the disconnect
+                self._overflowed = True
+                self._wake()
+                return False
+        lane.append(frame)
+        self._wake()
+        return True
+
+    async def _write_loop(self) -> None:
+        try:
+            await self._drain()
+        finally:
+            # detach() or a resume may already have replaced this task
+            if self._writer is asyncio.current_task():
+                self._writer = None
+
+    async def _drain(self) -> None:
+        while True:
+            if self._overflowed:
+                logger.warning(
+                    f"outbound queue overflow for {self.user_id}@{self.call_id}"
+                )
+                await self._on_failure(self, "overflow")
+                return
+
+            lane = self.control if self.control else self.data
+            if not lane:
+                # idle: give back the deques, the next enqueue starts a new writer
+                self.control = self.data = EMPTY_LANE
+                return
+            frame = lane.popleft()
+            try:
+                # asyncio.timeout rather than wait_for: wait_for can swallow a
+                # cancellation that races with the write, leaving the writer unkillable
+                payload = frame.encode(self.codec)
+                # only for clients that opted into the experimental deflate feature
+                if self.deflater is not None:
+                    compressed = self.deflater.compress(self.deflate_context, payload)
+                    if compressed is not None:
+                        payload = compressed
+                started = time.perf_counter()
+                async with asyncio.timeout(self.policy.send_timeout):
+                    if self.codec.binary or isinstance(payload, bytes):
+                        await self.websocket.send_bytes(payload)
+                    else:
+                        await self.websocket.send_text(payload)
+                metrics.SEND_SECONDS.observe(time.perf_counter() - started)
+            except TimeoutError:
+                logger.warning(
+                    f"send to {self.user_id}@{self.call_id} missed the {self.policy.send_timeout}s deadline"
+                )
+                await self._on_failure(self, "late")
+                return
+            except Exception as e:
+                logger.warning(f"send failed to {self.user_id}@{self.call_id}: {e}")
+                # most likely never reached the client, keep it for a resumed session
+                lane.appendleft(frame)
+                await self._on_failure(self, "error")
+                return
+
+    def stop(self) -> None:
+        """Stop accepting messages and cancel the writer. Safe to call twice."""
+        self.closed = True
+        if self.deflater is not None:
+            self.deflater.release_context(self.deflate_context)
+            self.deflate_context = None
+        # the writer itself may be the one tearing the connection down
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
@@ -0,0 +1,138 @@
+# ratelimit.py - token buckets for inbound signaling messages
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+# message type -> class that shares a bucket; anything unlisted is "other"
+MESSAGE_CLASSES = {
+    "ice-candidate": "ice",
+    "offer": "sdp",
+    "answer": "sdp",
+    "call-invite": "call",
+    "call-accept": "call",
+    "call-decline": "call",
+    "ping": "heartbeat",
+    "pong": "heartbeat",
+    "peer-ack": "membership",
+    "capacity": "membership",
+    "capabilities": "membership",
+}
+
+# class -> (tokens per second, burst)
+Limits = Dict[str, Tuple[float, float]]
+
+
+def message_class(message_type: Optional[str]) -> str:
+    return MESSAGE_CLASSES.get(message_type, "other")
+
+
+def parse_limits(spec: str) -> Limits:
+    """Parse "ice=50:200,sdp=5:20" into {"ice": (50.0, 200.0), "sdp": (5.0, 20.0)}."""
+    limits = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    # per connection and per call (all its members together), by message class;
+    # classes missing from a mapping are not limited at that level
+    connection: Limits = field(default_factory=dict)
+    call: Limits = field(default_factory=dict)
+    # throttled messages a connection may accumulate before it is disconnected,
+    # forgiven at strike_decay per second
+    strikes: float = 20.0
+    strike_decay: float = 1.0
+    # at most one "throttled" notice per connection per this many seconds
+    notice_interval: float = 1.0
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next token, as of the last take()."""
+        return max(0.0, 1.0 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class Buckets:
+    """Lazily created buckets of one owner (a connection or a call), by message class."""
+
+    __slots__ = ("limits", "buckets")
+
+    def __init__(self, limits: Limits):
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def take(self, cls: str, now: float) -> Optional[TokenBucket]:
+        """None if the message may pass, else the bucket that refused it."""
+        bucket = self.buckets.get(cls)
+        if bucket is None:
+            limit = self.limits.get(cls)
+            if limit is None:
+                return None
+            bucket = self.buckets[cls] = TokenBucket(limit[0], limit[1], now)
+        return None if bucket.take(now) else bucket
+
+
+class ConnectionLimiter:
+    """Enforcement for one connection's receive loop.
+
+    check() returns None for a message that may pass, "throttled" when it must be
+    dropped, or "disconnect" once the connection ran out of strikes. Per-call buckets
+    are shared with every other connection of the call, but only a connection's own
+    bucket costs it strikes, so a busy call doesn't get its quiet members kicked.
+    """
+
+    __slots__ = ("policy", "own", "call", "strikes", "next_notice", "refused")
+
+    def __init__(self, policy: RateLimitPolicy, call: Buckets, now: float):
+        self.policy = policy
+        self.own = Buckets(policy.connection)
+        self.call = call
+        self.strikes = TokenBucket(policy.strike_decay, policy.strikes, now)
+        self.next_notice = 0.0
+        self.refused: Optional[TokenBucket] = None
+
+    def check(self, cls: str, now: float) -> Optional[str]:
+        refused = self.own.take(cls, now)
+        if refused is not None:
+            self.refused = refused
+            return "throttled" if self.strikes.take(now) else "disconnect"
+        refused = self.call.take(cls, now)
+        if refused is not None:
+            self.refused = refused
+            return "throttled"
+        return None
+
+    def notice(self, cls: str, now: float) -> Optional[dict]:
+        """The "throttled" message to send back, unless one went out recently."""
+        if now < self.next_notice:
+            return None
+        self.next_notice = now + self.policy.notice_interval
+        return {
+            "type": "throttled",
+            "messageClass": cls,
+            "retryAfter": round(self.refused.retry_after(), 3) if self.refused else 1.0,
+            "from": "system",
+        }
@@ -0,0 +1,113 @@
+# reaper.py - evict calls nobody has been heard from in a long time
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from accounting import call_footprint
+
+logger = logging.getLogger(__name__)
+
+
+class IdleCallReaper:
+    """Background sweep of a CallConnectionManager for calls that should be gone.
+
+    A call only disappears when its last connection disconnects cleanly. A
+    half-open socket whose heartbeat stopped firing (or never started) keeps its
+    call in active_calls forever. Healthy clients answer heartbeat pings, so a call
+    where no connection has received anything for `ttl` seconds is dead; its
+    connections are disconnected without peer-disconnected (nobody is listening).
+
+    The sweep also drops per-call state left behind for calls that no longer have
+    local peers (stats, rate-limit buckets, membership logs, codec capabilities,
+    remote peers) and resume tokens of connections that already closed.
+    """
+
+    def __init__(self, manager, ttl: float = 600.0, interval: float = 60.0):
+        self.manager = manager
+        self.ttl = ttl
+        self.interval = interval
+        self.calls_reaped = 0
+        self.connections_reaped = 0
+        self.orphans_swept = 0
+        self.last_sweep = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def start(self) -> None:
+        """Start sweeping unless disabled or already running; cheap to call on every join."""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def status(self) -> dict:
+        return {
+            "ttl_s": self.ttl,
+            "interval_s": self.interval,
+            "calls_reaped": self.calls_reaped,
+            "connections_reaped": self.connections_reaped,
+            "orphans_swept": self.orphans_swept,
+            "last_sweep_s": round(time.monotonic() - self.last_sweep, 3)
+            if self.last_sweep
+            else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("idle call sweep failed")
+
+    async def sweep(self) -> int:
+        """One pass; returns how many calls were reaped."""
+        manager = self.manager
+        now = self.last_sweep = time.monotonic()
+        idle = [
+            call_id
+            for call_id, peers in manager.active_calls.items()
+            if now - max(c.last_seen for c in peers.values()) > self.ttl
+        ]
+        for call_id in idle:
+            peers = manager.active_calls.get(call_id)
+            if not peers:
+                continue
+            logger.warning(f"reaping idle call {call_id}: {call_footprint(manager, call_id, now)}")
+            self.calls_reaped += 1
+            self.connections_reaped += len(peers)
+            manager.record(call_id, "reaped")
+            for user_id, connection in peers.items():
+                await manager.disconnect(call_id, user_id, connection)
+        self._sweep_orphans()
+        return len(idle)
+
+    def _sweep_orphans(self) -> None:
+        manager = self.manager
+        calls = manager.active_calls
+        swept = 0
+        for registry in (
+            manager.call_stats,
+            manager.call_limits,
+            manager.remote_peers,
+            manager.call_started,
+            manager.recorders,
+            manager.topologies,
+            manager.capabilities,
+        ):
+            for call_id in [c for c in registry if c not in calls]:
+                del registry[call_id]
+                swept += 1
+        for call_id in [c for c in manager.memberships if c not in calls]:
+            log = manager.memberships.pop(call_id)
+            if log.timer is not None:
+                log.timer.cancel()
+            swept += 1
+        for token in [t for t, c in manager.sessions.items() if c.closed]:
+            del manager.sessions[token]
+            swept += 1
+        if swept:
+            logger.info(f"swept {swept} leftover entries of ended calls")
+            self.orphans_swept += swept
@@ -1,14 +1,161 @@
 # signaling.py (or whatever module where you register router)
-import asyncio
-import json
 import logging
+from typing import Dict, FrozenSet, Optional
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from config import (
+    CALL_IDLE_TTL,
+    CALL_RATE_LIMITS,
+    CONTROL_QUEUE_LIMIT,
+    CONTROL_QUEUE_OVERFLOW,
+    DATA_QUEUE_LIMIT,
+    DATA_QUEUE_OVERFLOW,
+    DEFLATE_LEVEL,
+    DEFLATE_MAX_CONTEXTS,
+    DEFLATE_MEM_LEVEL,
+    DEFLATE_MIN_SIZE,
+    DEFLATE_WBITS,
+    FLIGHT_CAPTURES,
+    FLIGHT_RECORDER_SIZE,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TIMEOUT,
+    ICE_COALESCE_WINDOW,
+    PEER_DELTA_INTERVAL,
+    RATE_LIMIT_STRIKE_DECAY,
+    RATE_LIMIT_STRIKES,
+    RATE_LIMITS,
+    REAPER_INTERVAL,
+    RESUME_GRACE,
+    SEND_TIMEOUT,
+    SHED_MAX_LAG,
+    SHED_MAX_QUEUED,
+    SHED_REDIRECT_URL,
+    SHED_RETRY_AFTER,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_MAX_AGE,
+    SNAPSHOT_PATH,
+    SNAPSHOT_RESTORE_GRACE,
+    STRICT_TYPES,
+    TOPOLOGY_DEFAULT_CAPACITY,
+    TOPOLOGY_MIN_PEERS,
+)
+import metrics
+from admission import AdmissionPolicy, LoadShedder
+from capabilities import CAPABILITIES_FEATURE
+from codec import JSON, DecodeError, negotiate, relay_frame
+from coalescing import ICE_BATCH_FEATURE, IceCoalescer
+from compression import DeflatePolicy
 from connection_manager import CallConnectionManager
+from drain import MIGRATED_CLOSE_CODE, NodeDrain
+from membership import PEER_DELTA_FEATURE
+from models import MAX_CAPACITY, SIGNALING_TYPES, check_notification, check_signaling
+from notifications import NotificationHub
+from outbound import OutboundPolicy, OverflowPolicy
+from ratelimit import RateLimitPolicy, message_class, parse_limits
+from snapshot import SnapshotPolicy
+from topology import TopologyPolicy
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-manager = CallConnectionManager()
+manager = CallConnectionManager(
+    outbound_policy=OutboundPolicy(
+        control_limit=CONTROL_QUEUE_LIMIT,
+        data_limit=DATA_QUEUE_LIMIT,
+        control_overflow=OverflowPolicy(CONTROL_QUEUE_OVERFLOW),
+        data_overflow=OverflowPolicy(DATA_QUEUE_OVERFLOW),
+        send_timeout=SEND_TIMEOUT,
+    ),
+    heartbeat_interval=HEARTBEAT_INTERVAL,
+    heartbeat_timeout=HEARTBEAT_TIMEOUT,
+    deflate_policy=DeflatePolicy(
+        min_size=DEFLATE_MIN_SIZE,
+        level=DEFLATE_LEVEL,
+        wbits=DEFLATE_WBITS,
+        mem_level=DEFLATE_MEM_LEVEL,
+        max_contexts=DEFLATE_MAX_CONTEXTS,
+    ),
+    resume_grace=RESUME_GRACE,
+    rate_limits=RateLimitPolicy(
+        connection=parse_limits(RATE_LIMITS),
+        call=parse_limits(CALL_RATE_LIMITS),
+        strikes=RATE_LIMIT_STRIKES,
+        strike_decay=RATE_LIMIT_STRIKE_DECAY,
+    ),
+    peer_delta_interval=PEER_DELTA_INTERVAL,
+    idle_call_ttl=CALL_IDLE_TTL,
+    reaper_interval=REAPER_INTERVAL,
+    flight_recorder_size=FLIGHT_RECORDER_SIZE,
+    flight_captures=FLIGHT_CAPTURES,
+    topology_policy=TopologyPolicy(
+        min_peers=TOPOLOGY_MIN_PEERS, default_capacity=TOPOLOGY_DEFAULT_CAPACITY
+    ),
+    snapshot_policy=SnapshotPolicy(
+        path=SNAPSHOT_PATH,
+        interval=SNAPSHOT_INTERVAL,
+        restore_grace=SNAPSHOT_RESTORE_GRACE,
+        max_age=SNAPSHOT_MAX_AGE,
+    ),
+)
+coalescer = IceCoalescer(manager, window=ICE_COALESCE_WINDOW)
+notifications = NotificationHub(
+    manager, heartbeat_interval=HEARTBEAT_INTERVAL, heartbeat_timeout=HEARTBEAT_TIMEOUT
+)
+drain = NodeDrain(manager, notifications)
+shedder = LoadShedder(
+    manager,
+    AdmissionPolicy(
+        max_lag=SHED_MAX_LAG,
+        max_queued=SHED_MAX_QUEUED,
+        retry_after=SHED_RETRY_AFTER,
+        redirect_url=SHED_REDIRECT_URL,
+    ),
+)
+
+# raw ?features= value -> its parsed set. Clients send a handful of distinct values,
+# so connections share one frozenset each instead of holding their own copy
+_FEATURE_SETS: Dict[str, FrozenSet[str]] = {}
+_MAX_FEATURE_SETS = 64
+
+
+def parse_features(raw: str) -> FrozenSet[str]:
+    features = _FEATURE_SETS.get(raw)
+    if features is None:
+        features = frozenset(f for f in raw.split(",") if f)
+        if len(_FEATURE_SETS) < _MAX_FEATURE_SETS:
+            _FEATURE_SETS[raw] = features
+    return features
+
+
+# close codes of a client that meant to leave; anything else (1006 above all) is a
+# dropped socket and the connection is held for a resume (drain.MIGRATED_CLOSE_CODE:
+# the client moved to another node)
+LEAVE_CLOSE_CODES = frozenset({1000, 1001, 1005})
+
+
+@router.get("/signaling/compression")
+async def compression_stats():
+    """Compression ratio and CPU cost of the deflate feature on this node."""
+    return manager.deflater.snapshot()
+
+
+def flight_type(message_type: Optional[str]) -> Optional[str]:
+    """A message type as the flight recorder keeps it: types clients invent are "other"."""
+    if message_type is None or message_type in SIGNALING_TYPES:
+        return message_type
+    return "other"
+
+
+async def announce(call_id: str, user_id: int) -> None:
+    """Tell the other peers about a newcomer (they will initiate offers to it)."""
+    try:
+        await manager.broadcast(
+            call_id,
+            {"type": "new-peer", "peerId": user_id, "from": "system"},
+            exclude_user=user_id,
+        )
+    except Exception as e:
+        logger.exception(f"failed to broadcast new-peer for {user_id}@{call_id}: {e}")
 
 
 @router.websocket("/ws/signaling/{call_id}/{user_id}")
@@ -21,70 +168,179 @@ async def signaling_ws(websocket: WebSocket, call_id: str, user_id: int):
         await websocket.close(code=1003)
         return
 
-    # 1) Register connection (accept happens inside manager.connect)
-    if not await manager.connect(call_id, user_id, websocket):
-        logger.warning(f"connect refused for {user_id}@{call_id}")
-        await websocket.close(code=1008)
+    # optional protocol extensions, e.g. ?features=ice-batch,deflate
+    features = parse_features(websocket.query_params.get("features", ""))
+
+    # wire encoding: JSON text frames unless the client offers signaling.msgpack
+    codec, subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+
+    # draining for a restart: point the client at another node instead
+    if drain.active:
+        await drain.refuse(websocket, codec, subprotocol)
         return
 
-    # 2) Send the new client the current peer-list (exclude itself)
-    try:
-        peers_snapshot = list(
-            (await manager.get_peers(call_id, exclude_user=user_id)).keys()
+    # 0) A client whose socket dropped comes back with ?resume=<token> and keeps its
+    #    slot: no peer-list / new-peer, peers keep their RTCPeerConnections
+    token = websocket.query_params.get("resume")
+
+    # saturated: new joins wait (or go elsewhere) so the calls already here don't
+    # all slow down together; members coming back or moving in are let through
+    shedder.start()
+    if not token and not websocket.query_params.get("migrate"):
+        reason = shedder.admit()
+        if reason is not None:
+            await shedder.refuse(websocket, reason, codec, subprotocol)
+            return
+    connection = None
+    # set while the other peers haven't been told about this client yet
+    unannounced = False
+    if token:
+        connection = await manager.resume(
+            call_id, user_id, websocket, token, codec, subprotocol
         )
-        await websocket.send_json(
-            {"type": "peer-list", "peers": peers_snapshot, "from": "system"}
+    if connection is not None:
+        connection.enqueue(
+            {
+                "type": "session-resumed",
+                "peers": manager.get_peer_ids(call_id, exclude_user=user_id),
+                "resumeToken": connection.resume_token,
+                "from": "system",
+            }
         )
-    except Exception as e:
-        logger.exception(f"failed to send peer-list to {user_id}@{call_id}: {e}")
-
-    # 3) Notify other peers about the newcomer (they will initiate offers to the newcomer)
-    try:
-        await manager.broadcast(
-            call_id,
-            {"type": "new-peer", "peerId": user_id, "from": "system"},
-            exclude_user=user_id,
+    else:
+        # 1) Register connection (accept happens inside manager.connect)
+        connection = await manager.connect(
+            call_id, user_id, websocket, features, codec, subprotocol
         )
-    except Exception as e:
-        logger.exception(f"failed to broadcast new-peer for {user_id}@{call_id}: {e}")
+        if connection is None:
+            logger.warning(f"connect refused for {user_id}@{call_id}")
+            await websocket.close(code=1008)
+            return
 
-    # 4) Start heartbeat task for this call (optional)
-    async def heartbeat_task():
+        # 2) Send the new client the current peer-list (exclude itself). Delta clients
+        #    start from version 0; the members arrive with the next peer-delta, built
+        #    once for everyone who joined in the same interval. Clients that publish
+        #    capabilities get the call's codec intersection first, for their offers
         try:
-            while True:
-                await asyncio.sleep(30)
-                try:
-                    disconnected = await manager.cleanup_stale_connections(call_id)
-                    if disconnected:
-                        logger.info(
-                            f"cleaned {disconnected} stale connections in {call_id}"
-                        )
-                except Exception:
-                    logger.exception("cleanup_stale_connections error")
-        except asyncio.CancelledError:
-            return
+            if CAPABILITIES_FEATURE in features:
+                intersection = manager.codec_intersection(call_id)
+                if intersection is not None:
+                    connection.enqueue(intersection)
+            if PEER_DELTA_FEATURE in features:
+                peer_list = {"type": "peer-list", "peers": [], "version": 0}
+            else:
+                peers_snapshot = manager.get_peer_ids(call_id, exclude_user=user_id)
+                peer_list = {"type": "peer-list", "peers": peers_snapshot}
+            peer_list["resumeToken"] = connection.resume_token
+            peer_list["from"] = "system"
+            connection.enqueue(peer_list)
+        except Exception as e:
+            logger.exception(f"failed to send peer-list to {user_id}@{call_id}: {e}")
+
+        # 3) Notify other peers about the newcomer, unless it is moving over from a
+        #    draining node and they already have it. A client that publishes
+        #    capabilities is announced once they arrive (or with its first other
+        #    message), so the offers peers make to it already use the new intersection
+        if not websocket.query_params.get("migrate"):
+            if CAPABILITIES_FEATURE in features:
+                unannounced = True
+            else:
+                await announce(call_id, user_id)
+        elif PEER_DELTA_FEATURE in features:
+            manager.resync_membership(connection)
 
-    hb = asyncio.create_task(heartbeat_task())
+        # 4) Large calls: where this peer sits in the relay tree (and whoever moved
+        #    to make room for it), for clients that follow ?features=topology
+        capacity = websocket.query_params.get("capacity", "")
+        manager.topology_join(
+            connection,
+            min(int(capacity), MAX_CAPACITY) if capacity.isdigit() and int(capacity) else None,
+        )
 
+    # inbound token buckets for this connection (and its share of the call's)
+    limiter = manager.limiter(call_id)
+    close_code = None
     try:
         while True:
             try:
-                data = await asyncio.wait_for(websocket.receive_json(), timeout=60.0)
+                # liveness is tracked by manager.heartbeat, no per-connection timer here
+                if codec.binary:
+                    raw = await websocket.receive_bytes()
+                else:
+                    raw = await websocket.receive_text()
+                connection.touch()
+                data = codec.decode(raw)
+                if not isinstance(data, dict):
+                    connection.enqueue({"error": "invalid message format"})
+                    continue
                 message_type = data.get("type")
+                if not isinstance(message_type, str):
+                    # refused by the schema check below; until then nothing may hash it
+                    message_type = None
+
+                if limiter is not None:
+                    cls = message_class(message_type)
+                    verdict = limiter.check(cls, connection.last_seen)
+                    if verdict is not None:
+                        metrics.THROTTLED[cls] += 1
+                        manager.record(
+                            call_id, "throttled", flight_type(message_type), sender=user_id
+                        )
+                        if verdict == "disconnect":
+                            logger.warning(
+                                f"closing {user_id}@{call_id}: kept exceeding the {cls} rate limit"
+                            )
+                            metrics.RATE_LIMIT_DISCONNECTS[cls] += 1
+                            await websocket.close(code=1008, reason="rate limit exceeded")
+                            break
+                        notice = limiter.notice(cls, connection.last_seen)
+                        if notice is not None:
+                            connection.enqueue(notice)
+                        continue
 
                 # heartbeat messages
                 if message_type == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    connection.enqueue({"type": "pong"})
                     continue
                 if message_type == "pong":
                     continue
 
-                if not isinstance(data, dict):
-                    await websocket.send_json({"error": "invalid message format"})
+                # before anything indexes it or it is relayed to peers
+                error = check_signaling(data, STRICT_TYPES)
+                if error is not None:
+                    metrics.count_invalid(message_type)
+                    manager.record(call_id, "invalid", flight_type(message_type), sender=user_id)
+                    connection.enqueue({"error": error})
                     continue
+                # recorded once valid: the flight ring keeps ids and known type names only
+                target = data.get("target")
+                if target is not None:
+                    target = int(target)
+                manager.record(
+                    call_id, "in", flight_type(message_type), len(raw), user_id, target
+                )
 
-                if "from" not in data:
-                    data["from"] = user_id
+                if message_type == "capabilities":
+                    manager.publish_capabilities(connection, data)
+                    if unannounced:
+                        unannounced = False
+                        await announce(call_id, user_id)
+                    continue
+                if unannounced:
+                    # sent something else first: announce it without capabilities
+                    unannounced = False
+                    await announce(call_id, user_id)
+
+                if message_type == "peer-ack":
+                    manager.acknowledge_membership(connection, data["version"])
+                    continue
+                if message_type == "capacity":
+                    manager.topology_capacity(connection, data["maxPeers"])
+                    continue
+
+                # relayed as received, with "from" spliced in rather than re-encoded
+                frame = relay_frame(raw, data, user_id, codec)
+                metrics.count_relayed(message_type)
 
                 if message_type == "call-invite":
                     cid = data["callId"]
@@ -118,40 +374,133 @@ async def signaling_ws(websocket: WebSocket, call_id: str, user_id: int):
                     )
                     continue
 
-                target = data.get("target")
                 if target is not None:
+                    if message_type == "offer":
+                        manager.record_offer(call_id, user_id, target)
+                    if message_type == "ice-candidate" and coalescer.enabled:
+                        peer = manager.get_connection(call_id, target)
+                        if peer is not None and ICE_BATCH_FEATURE in peer.features:
+                            coalescer.add(user_id, peer, data)
+                            continue
+                    else:
+                        # candidates sent before an offer/answer must arrive first
+                        coalescer.flush_sender(call_id, user_id, target)
                     # forward to specific peer
-                    await manager.send_to_peer(call_id, int(target), data)
+                    await manager.send_to_peer(call_id, target, frame)
                 else:
+                    coalescer.flush_sender(call_id, user_id)
                     # broadcast to all others
-                    await manager.broadcast(call_id, data, exclude_user=user_id)
-
-            except asyncio.TimeoutError:
-                # try ping; if send fails, break to cleanup
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except Exception:
-                    break
-            except WebSocketDisconnect:
-                logger.info(f"WebSocketDisconnect for {user_id}@{call_id}")
+                    await manager.broadcast(call_id, frame, exclude_user=user_id)
+
+            except WebSocketDisconnect as e:
+                logger.info(f"WebSocketDisconnect ({e.code}) for {user_id}@{call_id}")
+                close_code = e.code
                 break
-            except json.JSONDecodeError:
-                await websocket.send_json({"error": "invalid json"})
+            except DecodeError:
+                connection.enqueue({"error": f"invalid {codec.name}"})
             except Exception as e:
                 logger.exception(
                     f"unexpected error in signaling loop for {user_id}@{call_id}: {e}"
                 )
                 break
     finally:
-        hb.cancel()
-        # notify others and remove socket from registry
-        try:
-            await manager.broadcast(
-                call_id,
-                {"type": "peer-disconnected", "peerId": user_id, "from": "system"},
-                exclude_user=user_id,
-            )
-        except Exception:
-            logger.exception("broadcast peer-disconnected failed")
-        await manager.disconnect(call_id, user_id)
-        logger.info(f"cleanup complete for {user_id}@{call_id}")
+        coalescer.flush_sender(call_id, user_id)
+        # anything but a deliberate close (1006 above all) is a dropped socket
+        dropped = close_code is not None and close_code not in LEAVE_CLOSE_CODES
+        if connection.websocket is not websocket:
+            # resumed on another socket or already held for a resume, not ours anymore
+            logger.info(f"reader for {user_id}@{call_id} handed off")
+        elif close_code == MIGRATED_CLOSE_CODE or (
+            drain.active and close_code not in LEAVE_CLOSE_CODES
+        ):
+            # reconnected to another node, or about to: peers keep their connections
+            if close_code == MIGRATED_CLOSE_CODE:
+                drain.migrated += 1
+            await manager.disconnect(call_id, user_id, connection)
+            logger.info(f"{user_id}@{call_id} moved to another node")
+        elif not (dropped and await manager.park(connection)):
+            # notify others and remove socket from registry
+            await manager.leave(connection)
+            logger.info(f"cleanup complete for {user_id}@{call_id}")
+
+
+@router.websocket("/ws/notifications/{user_id}")
+async def notifications_ws(websocket: WebSocket, user_id: int):
+    """One socket per online user for call-invite / call-accept / call-decline.
+
+    Replaces keeping a signaling socket open on every chat just to hear invites:
+    invites name their targets and are routed by user id, wherever they're connected.
+    """
+    if drain.active:
+        await drain.refuse(websocket)
+        return
+    connection = await notifications.connect(user_id, websocket)
+    if connection is None:
+        return
+    limiter = notifications.limiter()
+    try:
+        while True:
+            try:
+                raw = await websocket.receive_text()
+                connection.touch()
+                data = JSON.decode(raw)
+                if not isinstance(data, dict):
+                    connection.enqueue({"error": "invalid message format"})
+                    continue
+                message_type = data.get("type")
+                if not isinstance(message_type, str):
+                    # refused by the schema check below; until then nothing may hash it
+                    message_type = None
+
+                if limiter is not None:
+                    cls = message_class(message_type)
+                    verdict = limiter.check(cls, connection.last_seen)
+                    if verdict is not None:
+                        metrics.THROTTLED[cls] += 1
+                        if verdict == "disconnect":
+                            metrics.RATE_LIMIT_DISCONNECTS[cls] += 1
+                            await websocket.close(code=1008, reason="rate limit exceeded")
+                            break
+                        notice = limiter.notice(cls, connection.last_seen)
+                        if notice is not None:
+                            connection.enqueue(notice)
+                        continue
+
+                if message_type == "ping":
+                    connection.enqueue({"type": "pong"})
+                    continue
+                if message_type == "pong":
+                    continue
+
+                error = check_notification(data)
+                if error is not None:
+                    metrics.count_invalid(message_type)
+                    connection.enqueue({"error": error})
+                    continue
+
+                # {"type": "call-invite", "callId": ..., "targets": [ids]}
+                if message_type == "call-invite":
+                    targets = {int(t) for t in data["targets"]} - {user_id}
+                    await notifications.notify(
+                        targets,
+                        {"type": "call-invite", "callId": data["callId"], "from": user_id},
+                    )
+                # {"type": "call-accept" | "call-decline", "callId": ..., "target": inviter}
+                elif message_type in ("call-accept", "call-decline"):
+                    await notifications.notify(
+                        (int(data["target"]),),
+                        {"type": message_type, "callId": data["callId"], "from": user_id},
+                    )
+                metrics.count_relayed(message_type)
+
+            except WebSocketDisconnect:
+                break
+            except DecodeError:
+                connection.enqueue({"error": "invalid json"})
+            except (KeyError, TypeError, ValueError):
+                connection.enqueue({"error": "invalid message format"})
+            except Exception as e:
+                logger.exception(f"unexpected error in notification loop for {user_id}: {e}")
+                break
+    finally:
+        await notifications.disconnect(connection)
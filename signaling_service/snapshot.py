@@ -0,0 +1,233 @@
+# snapshot.py - call membership on local disk, so a restarted node recognizes its peers
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# the file is rewritten with one line per live call once it holds more than
+# COMPACT_MIN_LINES + COMPACT_FACTOR lines per live call
+COMPACT_MIN_LINES = 1024
+COMPACT_FACTOR = 4
+
+
+@dataclass(frozen=True)
+class SnapshotPolicy:
+    # file the membership is appended to; empty disables snapshots
+    path: str = ""
+    # seconds between appends (a crash loses at most the last interval)
+    interval: float = 1.0
+    # seconds a restored member's slot is held for its client to resume
+    restore_grace: float = 30.0
+    # calls last written longer ago than this are not restored
+    max_age: float = 300.0
+
+
+class RegistrySnapshot:
+    """Call membership of a CallConnectionManager, kept in an append-only file.
+
+    Calls whose membership changed are marked with touch(); every `interval`
+    seconds each of them gets one line with its membership version and, per
+    member, the resume token, join version, acknowledged version and features.
+    The last line of a call wins and an empty member list ends it, so a burst of
+    joins costs one line per call per interval. Once the file holds far more
+    lines than there are live calls it is rewritten with one line per call (to a
+    temp file renamed over it).
+
+    restore() replays the file at startup: every member gets its slot back as a
+    parked connection under its old resume token (see
+    CallConnectionManager.restore_call), so the reconnect storm after a crash is
+    resumes, not joins announced to everyone already in the call.
+    """
+
+    def __init__(self, manager, policy: Optional[SnapshotPolicy] = None):
+        self.manager = manager
+        self.policy = policy or SnapshotPolicy()
+        # calls to write with the next append
+        self.dirty: Set[str] = set()
+        self.lines = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.compactions = 0
+        self.restored_calls = 0
+        self.restored_sessions = 0
+        self.restored_resumes = 0
+        # resume tokens of restored slots nobody has claimed yet
+        self.pending: Set[str] = set()
+        self.last_write = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.policy.path) and self.manager.resume_grace > 0
+
+    def touch(self, call_id: str) -> None:
+        """Write the call's membership with the next append; cheap to call on every change."""
+        if not self.enabled:
+            return
+        self.dirty.add(call_id)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def claim(self, token: str) -> None:
+        """A client resumed: count it if its slot came from the snapshot."""
+        if token in self.pending:
+            self.pending.discard(token)
+            self.restored_resumes += 1
+
+    def status(self) -> dict:
+        return {
+            "path": self.policy.path,
+            "enabled": self.enabled,
+            "interval_s": self.policy.interval,
+            "lines": self.lines,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "compactions": self.compactions,
+            "restored_calls": self.restored_calls,
+            "restored_sessions": self.restored_sessions,
+            "restored_resumes": self.restored_resumes,
+            "awaiting_resume": len(self.pending),
+            "last_write_s": round(time.monotonic() - self.last_write, 3)
+            if self.last_write
+            else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.policy.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("writing the registry snapshot failed")
+
+    async def flush(self) -> int:
+        """Append the calls touched since the last flush (or compact); returns lines written."""
+        async with self._lock:
+            if not self.dirty:
+                return 0
+            calls, self.dirty = self.dirty, set()
+            now = time.time()
+            live = self.manager.active_calls
+            loop = asyncio.get_running_loop()
+            if self.lines + len(calls) > COMPACT_MIN_LINES + COMPACT_FACTOR * len(live):
+                lines = [self._line(call_id, now) for call_id in live]
+                await loop.run_in_executor(None, self._replace, b"".join(lines))
+                self.lines = len(lines)
+                self.compactions += 1
+            else:
+                lines = [self._line(call_id, now) for call_id in calls]
+                await loop.run_in_executor(None, self._append, b"".join(lines))
+                self.lines += len(lines)
+            self.writes += 1
+            self.bytes_written += sum(len(line) for line in lines)
+            self.last_write = time.monotonic()
+            return len(lines)
+
+    async def close(self) -> None:
+        """Stop appending, after writing what changed since the last append."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.enabled:
+            await self.flush()
+
+    def _line(self, call_id: str, now: float) -> bytes:
+        manager = self.manager
+        log = manager.memberships.get(call_id)
+        members = []
+        for user_id, connection in manager.active_calls.get(call_id, {}).items():
+            if connection.resume_token is None or connection.closed:
+                continue
+            members.append(
+                [
+                    user_id,
+                    connection.resume_token,
+                    log.members.get(user_id, 0) if log is not None else 0,
+                    connection.peer_version,
+                    sorted(connection.features),
+                ]
+            )
+        return orjson.dumps(
+            {
+                "call": call_id,
+                "time": now,
+                "version": log.version if log is not None else 0,
+                "members": members,
+            }
+        ) + b"\n"
+
+    def _open(self, path: str, flags: int):
+        # resume tokens are credentials: owner only
+        return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | flags, 0o600), "wb")
+
+    def _append(self, payload: bytes) -> None:
+        with self._open(self.policy.path, os.O_APPEND) as f:
+            f.write(payload)
+
+    def _replace(self, payload: bytes) -> None:
+        temp = f"{self.policy.path}.tmp"
+        with self._open(temp, os.O_TRUNC) as f:
+            f.write(payload)
+        os.replace(temp, self.policy.path)
+
+    def load(self) -> Dict[str, dict]:
+        """The last state of every call in the file that is recent enough to restore."""
+        calls: Dict[str, dict] = {}
+        try:
+            with open(self.policy.path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # the crash cut the last append short
+                        logger.warning(f"skipping a torn line in {self.policy.path}")
+                        continue
+                    calls[entry["call"]] = entry
+        except FileNotFoundError:
+            return {}
+        cutoff = time.time() - self.policy.max_age
+        return {
+            call_id: entry
+            for call_id, entry in calls.items()
+            if entry["members"] and entry["time"] >= cutoff
+        }
+
+    async def restore(self) -> int:
+        """Hold the slots of every call in the snapshot; returns how many were restored.
+
+        Run once at startup, before clients are let in.
+        """
+        if not self.enabled:
+            return 0
+        started = time.perf_counter()
+        calls = self.load()
+        grace = self.policy.restore_grace
+        for call_id, entry in calls.items():
+            restored = await self.manager.restore_call(
+                call_id, entry["version"], entry["members"], grace
+            )
+            if restored:
+                self.restored_calls += 1
+                self.restored_sessions += restored
+                self.pending.update(
+                    c.resume_token for c in self.manager.active_calls[call_id].values()
+                )
+        if self.pending:
+            asyncio.get_running_loop().call_later(grace, self.pending.clear)
+        # start the file over with what was restored
+        now = time.time()
+        lines = [self._line(call_id, now) for call_id in self.manager.active_calls]
+        self._replace(b"".join(lines))
+        self.lines = len(lines)
+        logger.info(
+            f"restored {self.restored_sessions} sessions in {self.restored_calls} calls "
+            f"from {self.policy.path} in {time.perf_counter() - started:.3f}s"
+        )
+        return self.restored_sessions
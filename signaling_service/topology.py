@@ -0,0 +1,219 @@
+# topology.py - which peers of a large call connect to which, instead of a full mesh
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Set
+
+# clients list this in ?features= to receive "topology" plans and follow them
+# instead of offering to every new-peer
+TOPOLOGY_FEATURE = "topology"
+
+
+@dataclass(frozen=True)
+class TopologyPolicy:
+    # calls up to this size stay a full mesh; 0 disables planning
+    min_peers: int = 6
+    # a tree goes back to a mesh once the call shrinks this far below min_peers, so a
+    # call hovering around the threshold doesn't renegotiate everything on each join
+    hysteresis: int = 2
+    # peer connections a client can hold when it sent no capacity hint
+    default_capacity: int = 4
+
+
+class TopologyPlan:
+    """Relay tree of one call, maintained incrementally as peers come and go.
+
+    Relays (the peers with the most capacity) are fully meshed with each other and
+    each serves a set of leaves. A leaf holds a single peer connection, to its relay,
+    which forwards the leaf's media to its other leaves and to the other relays, and
+    forwards everything it receives from the other relays to its leaves. Any two
+    peers are at most three hops apart (leaf, relay, relay, leaf).
+
+    Joins attach to the relay with the most spare capacity, promoting the
+    highest-capacity leaf when none has room; a relay that leaves has its leaves
+    placed again, and relays left without leaves go back to being leaves. Every
+    mutation returns the peers whose links or role changed, which are the only ones
+    that need a new plan.
+    """
+
+    __slots__ = ("policy", "capacity", "relays", "parent", "children", "tree", "version")
+
+    def __init__(self, policy: TopologyPolicy):
+        self.policy = policy
+        # user -> peer connections it can hold (its capacity hint)
+        self.capacity: Dict[int, int] = {}
+        self.relays: Set[int] = set()
+        # leaf -> its relay, relay -> its leaves
+        self.parent: Dict[int, int] = {}
+        self.children: Dict[int, Set[int]] = {}
+        # False: full mesh, clients connect to everyone as they always did
+        self.tree = False
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.capacity)
+
+    def add(self, user_id: int, capacity: Optional[int] = None) -> Set[int]:
+        changed: Set[int] = set()
+        if user_id in self.capacity:
+            # a second connection of the same user: same place, resend its plan
+            self.capacity[user_id] = capacity or self.capacity[user_id]
+            if self.tree:
+                changed.add(user_id)
+            return changed
+        self.capacity[user_id] = capacity or self.policy.default_capacity
+        if self.tree:
+            self._place(user_id, changed)
+        return changed
+
+    def remove(self, user_id: int) -> Set[int]:
+        changed: Set[int] = set()
+        if self.capacity.pop(user_id, None) is None:
+            return changed
+        if user_id in self.relays:
+            self.relays.discard(user_id)
+            orphans = self.children.pop(user_id)
+            changed |= self.relays
+            for orphan in orphans:
+                del self.parent[orphan]
+            for orphan in sorted(orphans, key=self._rank):
+                self._place(orphan, changed)
+        elif user_id in self.parent:
+            self._detach(user_id, changed)
+        if self.tree:
+            self._prune(changed)
+        changed.discard(user_id)
+        return changed
+
+    def set_capacity(self, user_id: int, capacity: int) -> Set[int]:
+        """Apply a new capacity hint; an overloaded relay hands leaves to others."""
+        changed: Set[int] = set()
+        if user_id not in self.capacity:
+            return changed
+        self.capacity[user_id] = capacity
+        if self.tree and user_id in self.relays:
+            children = self.children[user_id]
+            while children and self._spare(user_id) < 0:
+                leaf = max(children)
+                self._detach(leaf, changed)
+                self._place(leaf, changed, avoid=user_id)
+        return changed
+
+    def settle(self, mesh_only: bool = False) -> Set[int]:
+        """Switch between mesh and tree if the call size calls for it.
+
+        `mesh_only` forces a mesh, e.g. while a member can't follow plans. Returns
+        everyone when the mode flips, nothing otherwise.
+        """
+        size = len(self.capacity)
+        policy = self.policy
+        if self.tree:
+            flip = mesh_only or size <= policy.min_peers - policy.hysteresis
+        else:
+            flip = not mesh_only and policy.min_peers > 0 and size > policy.min_peers
+        if not flip:
+            return set()
+        self.tree = not self.tree
+        self.relays.clear()
+        self.parent.clear()
+        self.children.clear()
+        if self.tree:
+            scratch: Set[int] = set()
+            for user_id in sorted(self.capacity, key=self._rank):
+                self._place(user_id, scratch)
+        return set(self.capacity)
+
+    def links(self, user_id: int) -> Set[int]:
+        """Peers `user_id` should hold a peer connection with."""
+        if not self.tree:
+            return set(self.capacity) - {user_id}
+        if user_id in self.relays:
+            return (self.relays - {user_id}) | self.children[user_id]
+        parent = self.parent.get(user_id)
+        return {parent} if parent is not None else set()
+
+    def message(self, user_id: int) -> dict:
+        """The "topology" frame for one peer.
+
+        In a tree, `peers` are the only peer connections the client should keep and
+        it offers to the ones in `offer` (the lower id of a pair offers). A "mesh"
+        plan means back to connecting with everyone on new-peer.
+        """
+        if not self.tree:
+            return {
+                "type": "topology",
+                "version": self.version,
+                "mode": "mesh",
+                "from": "system",
+            }
+        peers = sorted(self.links(user_id))
+        return {
+            "type": "topology",
+            "version": self.version,
+            "mode": "tree",
+            "role": "relay" if user_id in self.relays else "leaf",
+            "peers": peers,
+            "offer": [p for p in peers if p > user_id],
+            "from": "system",
+        }
+
+    def _rank(self, user_id: int):
+        # most capacity first, lowest id on ties so plans are deterministic
+        return (-self.capacity[user_id], user_id)
+
+    def _spare(self, relay: int) -> int:
+        return self.capacity[relay] - (len(self.relays) - 1) - len(self.children[relay])
+
+    def _detach(self, leaf: int, changed: Set[int]) -> None:
+        relay = self.parent.pop(leaf)
+        self.children[relay].discard(leaf)
+        changed.add(leaf)
+        changed.add(relay)
+
+    def _promote(self, user_id: int, changed: Set[int]) -> None:
+        if user_id in self.parent:
+            self._detach(user_id, changed)
+        self.relays.add(user_id)
+        self.children[user_id] = set()
+        # every relay gains a link to the new one
+        changed |= self.relays
+
+    def _place(self, user_id: int, changed: Set[int], avoid: Optional[int] = None) -> None:
+        changed.add(user_id)
+        candidates: Iterable[int] = (r for r in self.relays if r != avoid)
+        best = max(candidates, key=lambda r: (self._spare(r), -r), default=None)
+        if best is not None and self._spare(best) > 0:
+            self.parent[user_id] = best
+            self.children[best].add(user_id)
+            changed.add(best)
+            return
+        # no relay has room: promote whoever has the most capacity, this peer included,
+        # if it can hold a link to every relay and still serve a leaf. Otherwise the
+        # call has outgrown its capacity and the roomiest relay takes one more
+        promoted = min(
+            (u for u in self.parent.keys() | {user_id} if u != avoid),
+            key=self._rank,
+        )
+        if best is not None and self.capacity[promoted] <= len(self.relays):
+            promoted = best
+        else:
+            self._promote(promoted, changed)
+        if promoted != user_id:
+            self.parent[user_id] = promoted
+            self.children[promoted].add(user_id)
+            changed.add(promoted)
+
+    def _prune(self, changed: Set[int]) -> None:
+        """Turn relays left without leaves back into leaves while others have room.
+
+        One relay fewer frees a link on every other relay, so the tree stays as
+        shallow as the call's capacity allows instead of keeping every relay it
+        ever promoted.
+        """
+        for relay in sorted(self.relays, key=self._rank, reverse=True):
+            if len(self.relays) < 2 or self.children[relay]:
+                continue
+            if not any(self._spare(r) >= 0 for r in self.relays if r != relay):
+                continue
+            self.relays.discard(relay)
+            del self.children[relay]
+            changed |= self.relays
+            self._place(relay, changed)